@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the client against tuya_bulb_control.testing.MockTuyaServer.
+
+Reports for every workload the API requests per operation, the latency
+percentiles and the throughput. Latency is added by the mock server to every
+response, to model the round trip to the Tuya cloud.
+
+Usage:
+    python benchmarks/run.py --latency 0.05 --devices 100 --iterations 20
+"""
+
+import argparse
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tuya_bulb_control import Bulb  # noqa: E402
+from tuya_bulb_control.testing import MockTuyaServer  # noqa: E402
+
+
+def _devices(count: int) -> dict:
+    return {
+        f"bench{index:05d}": {
+            "switch_led": False,
+            "work_mode": "white",
+            "bright_value_v2": 500,
+            "temp_value_v2": 0,
+            "colour_data_v2": '{"h":0,"s":0,"v":0}',
+            "countdown_1": 0,
+        }
+        for index in range(count)
+    }
+
+
+def _percentile(values: list, percent: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+
+    return values[index]
+
+
+def _workloads(bulb: Bulb, device_ids: list) -> list:
+    """
+    :return: list of (name, function(iteration))
+    """
+    snapshot = bulb.snapshot(device_ids)
+
+    return [
+        ("turn_on", lambda index: bulb.turn_on()),
+        ("set_colour_v2", lambda index: bulb.set_colour_v2((index % 256, 0, 255))),
+        ("state", lambda index: bulb.state()),
+        ("current_value", lambda index: bulb.current_value("switch_led")),
+        ("states", lambda index: bulb.states(device_ids)),
+        (
+            "apply_states",
+            lambda index: bulb.apply_states(
+                {"switch": True, "brightness": index % 100 + 1}, device_ids
+            ),
+        ),
+        ("snapshot", lambda index: bulb.snapshot(device_ids)),
+        ("restore", lambda index: bulb.restore(snapshot, device_ids)),
+    ]
+
+
+def run(latency: float, devices: int, iterations: int, workers: int) -> list:
+    """
+    :return: list of result dicts, one per workload
+    """
+    results = []
+
+    with MockTuyaServer(devices=_devices(devices), latency=latency) as server:
+        bulb = Bulb(
+            server.client_id,
+            server.secret_key,
+            "eu",
+            "bench00000",
+            max_workers=workers,
+            base_url=server.base_url,
+        )
+        device_ids = sorted(server.devices)
+
+        for name, function in _workloads(bulb, device_ids):
+            # Warm up the token and the functions cache
+            function(0)
+            server.reset_stats()
+
+            timings = []
+            started = perf_counter()
+            for index in range(iterations):
+                start = perf_counter()
+                function(index + 1)
+                timings.append(perf_counter() - start)
+            elapsed = perf_counter() - started
+
+            results.append(
+                {
+                    "name": name,
+                    "requests": server.total_requests / iterations,
+                    "p50": _percentile(timings, 50) * 1000,
+                    "p99": _percentile(timings, 99) * 1000,
+                    "ops": iterations / elapsed,
+                }
+            )
+
+        bulb.close()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="seconds added to every response"
+    )
+    parser.add_argument("--devices", type=int, default=50, help="devices of the fleet")
+    parser.add_argument(
+        "--iterations", type=int, default=20, help="operations per workload"
+    )
+    parser.add_argument("--workers", type=int, default=8, help="client threads")
+    args = parser.parse_args()
+
+    results = run(args.latency, args.devices, args.iterations, args.workers)
+
+    print(
+        f"latency {args.latency * 1000:.0f} ms, {args.devices} devices, "
+        f"{args.iterations} iterations, {args.workers} workers"
+    )
+    print(f"{'workload':<16}{'req/op':>10}{'p50 ms':>10}{'p99 ms':>10}{'ops/s':>10}")
+    for item in results:
+        print(
+            f"{item['name']:<16}{item['requests']:>10.1f}{item['p50']:>10.1f}"
+            f"{item['p99']:>10.1f}{item['ops']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
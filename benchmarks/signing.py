@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of request signing: the reference functions of _signing
+against Signer, per request and in batches.
+
+Usage:
+    python benchmarks/signing.py --number 20000
+"""
+
+import argparse
+import json
+import os
+import sys
+from timeit import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tuya_bulb_control._signing import (  # noqa: E402
+    Signer,
+    request_headers,
+    token_headers,
+)
+
+CLIENT_ID = "bench_client_id_0000"
+SECRET_KEY = "bench_secret_key_0000000000000000"
+ACCESS_TOKEN = "bench_access_token_00000000000000"
+STATUS_URL = "/v1.0/devices/bench_device_id/status"
+COMMANDS_URL = "/v1.0/devices/bench_device_id/commands"
+BODY = json.dumps({"commands": [{"code": "switch_led", "value": True}]})
+BATCH_SIZE = 100
+
+
+def _cases(signer: Signer) -> list:
+    """
+    :return: list of (name, reference function, signer function, requests per call)
+    """
+    batch = [("POST", COMMANDS_URL, BODY)] * BATCH_SIZE
+
+    return [
+        (
+            "token request",
+            lambda: token_headers(CLIENT_ID, SECRET_KEY, "/v1.0/token?grant_type=1"),
+            lambda: signer.token_headers("/v1.0/token?grant_type=1"),
+            1,
+        ),
+        (
+            "GET, empty body",
+            lambda: request_headers(
+                CLIENT_ID, SECRET_KEY, ACCESS_TOKEN, "GET", STATUS_URL
+            ),
+            lambda: signer.request_headers(ACCESS_TOKEN, "GET", STATUS_URL),
+            1,
+        ),
+        (
+            "POST, commands",
+            lambda: request_headers(
+                CLIENT_ID, SECRET_KEY, ACCESS_TOKEN, "POST", COMMANDS_URL, BODY
+            ),
+            lambda: signer.request_headers(ACCESS_TOKEN, "POST", COMMANDS_URL, BODY),
+            1,
+        ),
+        (
+            f"POST, batch of {BATCH_SIZE}",
+            lambda: [
+                request_headers(CLIENT_ID, SECRET_KEY, ACCESS_TOKEN, method, url, body)
+                for method, url, body in batch
+            ],
+            lambda: signer.sign_batch(ACCESS_TOKEN, batch),
+            BATCH_SIZE,
+        ),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--number", type=int, default=20000, help="signed requests per case"
+    )
+    args = parser.parse_args()
+
+    signer = Signer(CLIENT_ID, SECRET_KEY)
+
+    print(f"{'case':<22}{'reference us':>14}{'Signer us':>12}{'speedup':>10}")
+    for name, reference, fast, size in _cases(signer):
+        number = max(1, args.number // size)
+        reference_time = timeit(reference, number=number) / (number * size)
+        fast_time = timeit(fast, number=number) / (number * size)
+        print(
+            f"{name:<22}{reference_time * 1e6:>14.2f}{fast_time * 1e6:>12.2f}"
+            f"{reference_time / fast_time:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
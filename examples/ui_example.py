@@ -9,13 +9,15 @@ import colorsys
 import json
 from typing import NoReturn
 from tkinter import Tk, Button, colorchooser
-from tuya_bulb_control import Bulb
+from tuya_bulb_control import Bulb, StateCache
 
 bulb = Bulb(
     client_id="121121212",
     secret_key="1212121212",
     device_id="121212212121212",
     region_key="eu",
+    # Serve repeated reads and toggles locally for 30 seconds
+    state_cache=StateCache(ttl=30),
 )
 
 
@@ -44,7 +44,13 @@ setup(
         "Programming Language :: Python :: 3.8",
     ],
     zip_safe=False,
-    packages=find_packages(),
+    packages=find_packages(exclude=["tests", "tests.*"]),
     install_requires=install_requires,
+    extras_require={
+        "async": ["aiohttp>=3.7"],
+        "events": ["cryptography", "websocket-client"],
+        "local": ["cryptography"],
+        "numpy": ["numpy"],
+    },
     include_package_data=True,
 )
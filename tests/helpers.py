@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from tuya_bulb_control import Bulb
+from tuya_bulb_control.testing import MockTuyaServer
+from tuya_bulb_control.tokens import MemoryTokenStore
+
+
+def mock_server(device_ids=("d1", "d2"), **kwargs) -> MockTuyaServer:
+    """
+    Start a mock server with switched off devices.
+
+    :param device_ids: device ids
+    :param kwargs: tuya_bulb_control.testing.MockTuyaServer arguments
+    :return: running server, stop() it when done
+    """
+    devices = {device_id: {"switch_led": False} for device_id in device_ids}
+
+    server = MockTuyaServer(devices=devices, **kwargs)
+    server.start()
+
+    return server
+
+
+def mock_bulb(server: MockTuyaServer, device_id: str = "d1", **kwargs) -> Bulb:
+    """
+    :param server: running mock server
+    :param device_id: default device id
+    :param kwargs: tuya_bulb_control.Bulb arguments
+    :return: bulb with its own token store
+    """
+    kwargs.setdefault("token_store", MemoryTokenStore())
+
+    return Bulb(
+        server.client_id,
+        server.secret_key,
+        "eu",
+        device_id,
+        base_url=server.base_url,
+        **kwargs,
+    )
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import unittest
+from tuya_bulb_control import AsyncBulb
+from tuya_bulb_control.exceptions import ValueNotInRange
+from tuya_bulb_control.testing import MOCK_FUNCTIONS
+from tests.helpers import mock_bulb, mock_server
+
+V1_FUNCTIONS = MOCK_FUNCTIONS + [
+    {
+        "code": "bright_value",
+        "type": "Integer",
+        "values": json.dumps({"min": 25, "max": 255, "scale": 0, "step": 1}),
+    },
+    {
+        "code": "temp_value",
+        "type": "Integer",
+        "values": json.dumps({"min": 25, "max": 255, "scale": 0, "step": 1}),
+    },
+    {
+        "code": "colour_data",
+        "type": "Json",
+        "values": json.dumps(
+            {
+                "h": {"min": 0, "max": 360, "scale": 0, "step": 1},
+                "s": {"min": 0, "max": 255, "scale": 0, "step": 1},
+                "v": {"min": 0, "max": 255, "scale": 0, "step": 1},
+            }
+        ),
+    },
+]
+
+
+class AsyncBulbTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mock_server(device_ids=("d1", "d2"), functions=V1_FUNCTIONS)
+        self.addCleanup(self.server.stop)
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def run_bulb(self, coroutine_function, **kwargs):
+        async def run():
+            async with AsyncBulb(
+                self.server.client_id,
+                self.server.secret_key,
+                "eu",
+                "d1",
+                base_url=self.server.base_url,
+                **kwargs,
+            ) as bulb:
+                return await coroutine_function(bulb)
+
+        return self.loop.run_until_complete(run())
+
+    def test_v1_setters(self):
+        async def run(bulb):
+            await bulb.set_colour((255, 0, 0))
+            await bulb.set_bright(100)
+            await bulb.set_colour_temp(200)
+            await bulb.set_toggle_timer(2)
+            with self.assertRaises(ValueNotInRange):
+                await bulb.set_bright(10)
+
+        self.run_bulb(run)
+
+        values = self.server.devices["d1"]
+        self.assertEqual(
+            json.loads(values["colour_data"]), {"h": 0, "s": 255, "v": 255}
+        )
+        self.assertEqual(values["bright_value"], 100)
+        self.assertEqual(values["temp_value"], 200)
+        self.assertEqual(values["countdown_1"], 120)
+
+    def test_percent_matches_bulb(self):
+        narrow = [
+            (
+                dict(item, values=json.dumps({"min": 0, "max": 255, "step": 1}))
+                if item["code"] == "bright_value_v2"
+                else item
+            )
+            for item in V1_FUNCTIONS
+        ]
+        self.server.functions = narrow
+
+        async def run(bulb):
+            await bulb.functions()
+            await bulb.set_bright_v2(50, check=False)
+
+        self.run_bulb(run)
+        async_value = self.server.devices["d1"]["bright_value_v2"]
+
+        bulb = mock_bulb(self.server, device_id="d2")
+        self.addCleanup(bulb.close)
+        bulb.functions()
+        bulb.set_bright_v2(50, check=False)
+
+        # 50% of the schema range, not of the default 10-1000
+        self.assertEqual(async_value, 128)
+        self.assertEqual(self.server.devices["d2"]["bright_value_v2"], async_value)
+
+    def test_states_chunks(self):
+        device_ids = [f"d{index}" for index in range(45)]
+        self.server.devices.update(
+            {device_id: {"switch_led": False} for device_id in device_ids}
+        )
+
+        async def run(bulb):
+            return await bulb.states(device_ids)
+
+        states = self.run_bulb(run)
+
+        # 20 + 20 + 5 devices
+        self.assertEqual(self.server.requests["GET /devices/status"], 3)
+        self.assertEqual(sorted(states), sorted(device_ids))
+
+
+if __name__ == "__main__":
+    unittest.main()
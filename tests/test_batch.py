@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from tuya_bulb_control.exceptions import ArgumentError
+from tests.helpers import mock_bulb, mock_server
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mock_server(device_ids=("d1", "d2"))
+        self.addCleanup(self.server.stop)
+        self.bulb = mock_bulb(self.server)
+        self.addCleanup(self.bulb.close)
+
+    def test_one_request_per_device(self):
+        with self.bulb.batch():
+            self.bulb.turn_on()
+            self.bulb.set_work_mode("colour")
+            self.bulb.set_colour_v2((255, 0, 0))
+
+        self.assertEqual(self.server.requests["POST /devices/{device_id}/commands"], 1)
+        self.assertIs(self.server.devices["d1"]["switch_led"], True)
+        self.assertEqual(self.server.devices["d1"]["work_mode"], "colour")
+
+    def test_latest_value_wins(self):
+        with self.bulb.batch() as batch:
+            self.bulb.turn_on(check=False)
+            self.bulb.turn_off(check=False)
+            self.assertEqual(len(batch), 1)
+
+        self.assertIs(self.server.devices["d1"]["switch_led"], False)
+
+    def test_batch_device_id(self):
+        with self.bulb.batch(device_id="d2") as batch:
+            self.bulb.turn_on()
+
+        self.assertEqual(list(batch.responses), ["d2"])
+        self.assertIs(self.server.devices["d2"]["switch_led"], True)
+        self.assertIs(self.server.devices["d1"]["switch_led"], False)
+
+    def test_batch_device_id_without_default(self):
+        bulb = mock_bulb(self.server, device_id=None)
+        self.addCleanup(bulb.close)
+
+        with bulb.batch(device_id="d2"):
+            bulb.set_work_mode("white")
+
+        self.assertEqual(self.server.devices["d2"]["work_mode"], "white")
+        with self.assertRaises(ArgumentError):
+            bulb.turn_on()
+
+    def test_command_device_id_overrides_batch(self):
+        with self.bulb.batch(device_id="d2") as batch:
+            self.bulb.turn_on(device_id="d1")
+            self.bulb.turn_on()
+
+        self.assertEqual(sorted(batch.responses), ["d1", "d2"])
+
+    def test_exception_drops_commands(self):
+        with self.assertRaises(RuntimeError):
+            with self.bulb.batch():
+                self.bulb.turn_on(check=False)
+                raise RuntimeError
+
+        self.assertEqual(self.server.requests["POST /devices/{device_id}/commands"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
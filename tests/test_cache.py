@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from tuya_bulb_control import FileTokenStore, FunctionsCache, StateCache
+from tuya_bulb_control.testing import MOCK_FUNCTIONS
+from tuya_bulb_control.tokens import Token
+from tests.helpers import mock_bulb, mock_server
+
+MONOTONIC = "tuya_bulb_control.cache.monotonic"
+STATUS = "GET /devices/{device_id}/status"
+
+
+class FunctionsCacheTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+
+    def test_disk_round_trip(self):
+        FunctionsCache(path=self.path).set("d1", MOCK_FUNCTIONS)
+
+        # A new process reads the schema from disk
+        self.assertEqual(FunctionsCache(path=self.path).get("d1"), MOCK_FUNCTIONS)
+        self.assertIsNone(FunctionsCache(path=self.path).get("d2"))
+
+    def test_ttl(self):
+        cache = FunctionsCache(ttl=60, path=self.path)
+
+        with mock.patch("tuya_bulb_control.cache.time", return_value=1000.0):
+            cache.set("d1", MOCK_FUNCTIONS)
+        with mock.patch("tuya_bulb_control.cache.time", return_value=1060.0):
+            self.assertEqual(cache.get("d1"), MOCK_FUNCTIONS)
+            self.assertEqual(FunctionsCache(path=self.path).get("d1"), MOCK_FUNCTIONS)
+        with mock.patch("tuya_bulb_control.cache.time", return_value=1061.0):
+            self.assertIsNone(cache.get("d1"))
+            # The time of the fetch is stored on disk too
+            self.assertIsNone(FunctionsCache(ttl=60, path=self.path).get("d1"))
+            self.assertEqual(
+                FunctionsCache(ttl=None, path=self.path).get("d1"), MOCK_FUNCTIONS
+            )
+
+    def test_invalidate_device(self):
+        cache = FunctionsCache(path=self.path)
+        cache.set("d1", MOCK_FUNCTIONS)
+        cache.set("d2", MOCK_FUNCTIONS)
+
+        cache.invalidate("d1")
+
+        self.assertIsNone(FunctionsCache(path=self.path).get("d1"))
+        self.assertEqual(FunctionsCache(path=self.path).get("d2"), MOCK_FUNCTIONS)
+
+    def test_invalidate_keeps_other_files(self):
+        tokens = FileTokenStore(self.path)
+        key = ("client_id", "eu", "https://openapi.tuyaeu.com/v1.0")
+        tokens.set(key, Token("access", "refresh", expire_at=7200.0))
+        with open(os.path.join(self.path, "notes.json"), "w") as file:
+            file.write("{}")
+        cache = FunctionsCache(path=self.path)
+        cache.set("d1", MOCK_FUNCTIONS)
+
+        cache.invalidate()
+
+        self.assertIsNone(FunctionsCache(path=self.path).get("d1"))
+        self.assertEqual(tokens.get(key).access_token, "access")
+        self.assertTrue(os.path.exists(os.path.join(self.path, "notes.json")))
+
+
+class StateCacheTest(unittest.TestCase):
+    def test_fetch_policy(self):
+        cache = StateCache(ttl=5, ttls={"switch_led": 30})
+
+        with mock.patch(MONOTONIC, return_value=100.0):
+            cache.update("d1", {"switch_led": True, "work_mode": "white"})
+        with mock.patch(MONOTONIC, return_value=105.0):
+            self.assertEqual(cache.get("d1", "work_mode"), "white")
+            self.assertEqual(
+                cache.get_all("d1"), {"switch_led": True, "work_mode": "white"}
+            )
+        with mock.patch(MONOTONIC, return_value=106.0):
+            # Stale, but the switch has its own ttl
+            self.assertIsNone(cache.get("d1", "work_mode"))
+            self.assertEqual(cache.get("d1", "work_mode", default="-"), "-")
+            self.assertEqual(cache.get_all("d1"), {"switch_led": True})
+        with mock.patch(MONOTONIC, return_value=131.0):
+            self.assertEqual(cache.get_all("d1"), {})
+
+    def test_serve_stale_policy(self):
+        cache = StateCache(ttl=5, policy=StateCache.SERVE_STALE)
+
+        with mock.patch(MONOTONIC, return_value=100.0):
+            cache.update("d1", {"switch_led": True})
+        with mock.patch(MONOTONIC, return_value=10000.0):
+            self.assertIs(cache.get("d1", "switch_led"), True)
+            self.assertEqual(cache.get_all("d1"), {"switch_led": True})
+            # Never seen
+            self.assertIsNone(cache.get("d1", "work_mode"))
+            self.assertEqual(cache.get_all("d2"), {})
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            StateCache(policy="never")
+
+    def test_invalidate(self):
+        cache = StateCache()
+        cache.update("d1", {"switch_led": True, "work_mode": "white"})
+        cache.update("d2", {"switch_led": True})
+
+        cache.invalidate("d1", "work_mode")
+        self.assertEqual(cache.get_all("d1"), {"switch_led": True})
+        cache.invalidate("d1")
+        self.assertEqual(cache.get_all("d1"), {})
+        self.assertEqual(cache.get_all("d2"), {"switch_led": True})
+        cache.invalidate()
+        self.assertEqual(cache.get_all("d2"), {})
+
+
+class BulbStateCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mock_server(device_ids=("d1",))
+        self.addCleanup(self.server.stop)
+
+    def bulb(self, cache: StateCache):
+        bulb = mock_bulb(self.server, state_cache=cache)
+        self.addCleanup(bulb.close)
+
+        return bulb
+
+    def test_fetch_when_stale(self):
+        bulb = self.bulb(StateCache(ttl=5))
+
+        with mock.patch(MONOTONIC, return_value=100.0):
+            self.assertIs(bulb.current_value("switch_led"), False)
+            # Commands update the cache
+            bulb.set_toggle()
+            self.assertIs(bulb.current_value("switch_led"), True)
+        self.assertEqual(self.server.requests[STATUS], 1)
+
+        self.server.devices["d1"]["switch_led"] = False
+        with mock.patch(MONOTONIC, return_value=106.0):
+            self.assertIs(bulb.current_value("switch_led"), False)
+        self.assertEqual(self.server.requests[STATUS], 2)
+
+    def test_serve_stale(self):
+        bulb = self.bulb(StateCache(ttl=5, policy=StateCache.SERVE_STALE))
+
+        with mock.patch(MONOTONIC, return_value=100.0):
+            bulb.current_value("switch_led")
+        self.server.devices["d1"]["switch_led"] = True
+        with mock.patch(MONOTONIC, return_value=10000.0):
+            self.assertIs(bulb.current_value("switch_led"), False)
+        self.assertEqual(self.server.requests[STATUS], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from tuya_bulb_control import CoalescingDispatcher
+from tests.helpers import mock_bulb, mock_server
+
+
+class CoalescingDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mock_server(device_ids=("d1", "d2"))
+        self.addCleanup(self.server.stop)
+        self.bulb = mock_bulb(self.server)
+        self.addCleanup(self.bulb.close)
+
+    def test_newest_value_wins(self):
+        with CoalescingDispatcher(self.bulb, max_rate=1000) as dispatcher:
+            for value in range(10, 101, 10):
+                dispatcher.submit("bright_value_v2", value * 10)
+
+        self.assertEqual(self.server.devices["d1"]["bright_value_v2"], 1000)
+        self.assertLessEqual(dispatcher.sent, dispatcher.submitted)
+
+    def test_capture_device_id(self):
+        with CoalescingDispatcher(self.bulb, max_rate=1000) as dispatcher:
+            with dispatcher.capture(device_id="d2"):
+                self.bulb.turn_on(check=False)
+
+        self.assertIs(self.server.devices["d2"]["switch_led"], True)
+        self.assertIs(self.server.devices["d1"]["switch_led"], False)
+
+    def test_failing_callback(self):
+        def on_result(device_id, result):
+            raise RuntimeError
+
+        dispatcher = CoalescingDispatcher(self.bulb, max_rate=1000, on_result=on_result)
+        dispatcher.submit("switch_led", True)
+        self.assertTrue(dispatcher.flush(timeout=5))
+        dispatcher.submit("switch_led", False, device_id="d2")
+        self.assertTrue(dispatcher.flush(timeout=5))
+        dispatcher.close()
+
+        self.assertEqual(dispatcher.callback_errors, 2)
+        self.assertIs(self.server.devices["d2"]["switch_led"], False)
+        self.assertIs(self.server.devices["d1"]["switch_led"], True)
+
+
+if __name__ == "__main__":
+    unittest.main()
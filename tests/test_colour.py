@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+from tuya_bulb_control import colour
+from tuya_bulb_control.colour import (
+    colour_commands,
+    hsv_to_rgb,
+    kelvin_to_temp,
+    rgb_to_hsv,
+)
+from tuya_bulb_control.schema import Schema
+
+RGBS = [
+    (r, g, b)
+    for r in range(0, 256, 15)
+    for g in range(0, 256, 15)
+    for b in range(0, 256, 15)
+]
+
+
+def temp_function(code_name: str, **values) -> dict:
+    return {"code": code_name, "type": "Integer", "values": json.dumps(values)}
+
+
+class ColourTest(unittest.TestCase):
+    def test_rgb_to_hsv(self):
+        self.assertEqual(
+            rgb_to_hsv([(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 128, 0)]),
+            [(0, 1000, 1000), (120, 1000, 1000), (240, 1000, 1000), (30, 1000, 1000)],
+        )
+        self.assertEqual(
+            rgb_to_hsv([(255, 255, 255), (0, 0, 0)]), [(0, 0, 1000), (0, 0, 0)]
+        )
+        self.assertEqual(rgb_to_hsv([(255, 128, 0)], version=1), [(30, 255, 255)])
+
+    def test_round_trip(self):
+        for version in (1, 2):
+            with self.subTest(version=version):
+                back = hsv_to_rgb(rgb_to_hsv(RGBS, version), version)
+
+                # Hue is kept in whole degrees
+                self.assertLessEqual(
+                    max(
+                        abs(a - b)
+                        for rgb, item in zip(RGBS, back)
+                        for a, b in zip(rgb, item)
+                    ),
+                    2,
+                )
+
+    @unittest.skipIf(colour.numpy is None, "NumPy is not installed")
+    def test_numpy_matches(self):
+        for version in (1, 2):
+            with self.subTest(version=version):
+                hsvs = rgb_to_hsv(RGBS, version, use_numpy=False)
+
+                self.assertEqual(rgb_to_hsv(RGBS, version, use_numpy=True), hsvs)
+                self.assertEqual(
+                    hsv_to_rgb(hsvs, version, use_numpy=True),
+                    hsv_to_rgb(hsvs, version, use_numpy=False),
+                )
+
+    def test_unknown_version(self):
+        with self.assertRaises(ValueError):
+            rgb_to_hsv([(255, 0, 0)], version=3)
+        with self.assertRaises(ValueError):
+            kelvin_to_temp([2700], version=3)
+
+    def test_colour_commands(self):
+        self.assertEqual(
+            colour_commands({"d1": (255, 0, 0), "d2": (0, 0, 255)}, version=1),
+            {
+                "d1": [{"code": "colour_data", "value": {"h": 0, "s": 255, "v": 255}}],
+                "d2": [
+                    {"code": "colour_data", "value": {"h": 240, "s": 255, "v": 255}}
+                ],
+            },
+        )
+
+
+class KelvinToTempTest(unittest.TestCase):
+    def test_usual_ranges(self):
+        self.assertEqual(
+            kelvin_to_temp([2000, 2700, 4600, 6500, 9000]), [0, 0, 500, 1000, 1000]
+        )
+        self.assertEqual(kelvin_to_temp([2700, 4600, 6500], version=1), [25, 140, 255])
+
+    def test_schema_range(self):
+        schema = Schema(
+            [temp_function("temp_value_v2", min=100, max=900, scale=0, step=10)]
+        )
+
+        self.assertEqual(
+            kelvin_to_temp([2700, 3000, 4600, 6500], schema=schema),
+            [100, 160, 500, 900],
+        )
+
+    def test_schema_without_the_code(self):
+        schema = Schema([temp_function("temp_value", min=0, max=100, step=1)])
+
+        # The v2 code is not in the schema, its usual range is used
+        self.assertEqual(kelvin_to_temp([6500], schema=schema), [1000])
+        self.assertEqual(kelvin_to_temp([6500], version=1, schema=schema), [100])
+
+
+if __name__ == "__main__":
+    unittest.main()
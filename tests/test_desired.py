@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from tuya_bulb_control import StateCache
+from tuya_bulb_control.desired import desired_values, diff_commands
+from tuya_bulb_control.schema import Schema
+from tuya_bulb_control.testing import MOCK_FUNCTIONS
+from tests.helpers import mock_bulb, mock_server
+
+COMMANDS = "POST /devices/{device_id}/commands"
+RED = {"switch": True, "mode": "colour", "colour": (255, 0, 0), "brightness": 50}
+
+
+class DiffCommandsTest(unittest.TestCase):
+    def test_json_string_and_dict(self):
+        wanted = {"colour_data_v2": {"h": 0, "s": 1000, "v": 1000}}
+
+        self.assertEqual(
+            diff_commands({"colour_data_v2": '{"h":0,"s":1000,"v":1000}'}, wanted), []
+        )
+        self.assertEqual(
+            diff_commands({"colour_data_v2": dict(wanted["colour_data_v2"])}, wanted),
+            [],
+        )
+        self.assertEqual(
+            diff_commands({"colour_data_v2": '{"h":120,"s":1000,"v":1000}'}, wanted),
+            [{"code": "colour_data_v2", "value": wanted["colour_data_v2"]}],
+        )
+        # A json string in the desired values
+        self.assertEqual(
+            diff_commands(
+                {"colour_data_v2": {"h": 0, "s": 1000, "v": 1000}},
+                {"colour_data_v2": '{"h": 0, "s": 1000, "v": 1000}'},
+            ),
+            [],
+        )
+        self.assertEqual(
+            diff_commands({"colour_data_v2": "{not json"}, wanted),
+            [{"code": "colour_data_v2", "value": wanted["colour_data_v2"]}],
+        )
+
+    def test_only_changed_codes(self):
+        current = {"switch_led": True, "work_mode": "white"}
+        wanted = {"switch_led": True, "work_mode": "colour", "bright_value_v2": 500}
+
+        self.assertEqual(
+            diff_commands(current, wanted),
+            [
+                {"code": "work_mode", "value": "colour"},
+                {"code": "bright_value_v2", "value": 500},
+            ],
+        )
+
+    def test_desired_values(self):
+        narrow = [
+            (
+                dict(item, values='{"min": 0, "max": 255}')
+                if item["code"] == "bright_value_v2"
+                else item
+            )
+            for item in MOCK_FUNCTIONS
+        ]
+
+        self.assertEqual(
+            desired_values({"brightness": 50, "switch": 1, "temp_value": 30}),
+            {"switch_led": True, "bright_value_v2": 500, "temp_value": 30},
+        )
+        self.assertEqual(
+            desired_values({"brightness": 50}, Schema(narrow)),
+            {"bright_value_v2": 128},
+        )
+        with self.assertRaises(ValueError):
+            desired_values({"brightness": 0})
+
+
+class ApplyStateTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mock_server(device_ids=("d1", "d2"))
+        self.addCleanup(self.server.stop)
+
+    def test_steady_state(self):
+        bulb = mock_bulb(self.server)
+        self.addCleanup(bulb.close)
+
+        self.assertTrue(bulb.apply_state(RED)["success"])
+        self.assertIsNone(bulb.apply_state(RED))
+        self.assertEqual(self.server.requests[COMMANDS], 1)
+
+        self.server.devices["d1"]["switch_led"] = False
+        bulb.apply_state(RED)
+        self.assertIs(self.server.devices["d1"]["switch_led"], True)
+        self.assertEqual(self.server.requests[COMMANDS], 2)
+
+    def test_steady_state_from_cache(self):
+        bulb = mock_bulb(self.server, state_cache=StateCache(ttl=60))
+        self.addCleanup(bulb.close)
+
+        bulb.apply_state(RED)
+        self.server.reset_stats()
+
+        self.assertIsNone(bulb.apply_state(RED))
+        # Served from the values cached by the commands
+        self.assertEqual(self.server.total_requests, 0)
+
+    def test_apply_states(self):
+        bulb = mock_bulb(self.server)
+        self.addCleanup(bulb.close)
+        bulb.apply_state(RED, device_id="d1")
+        self.server.reset_stats()
+
+        results = bulb.apply_states(RED, ["d1", "d2"])
+
+        self.assertIsNone(results["d1"])
+        self.assertTrue(results["d2"]["success"])
+        self.assertEqual(self.server.requests[COMMANDS], 1)
+        self.assertEqual(self.server.requests["GET /devices/status"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
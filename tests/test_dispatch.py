@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from concurrent.futures import CancelledError
+from tuya_bulb_control import PriorityDispatcher
+from tuya_bulb_control.dispatch import HIGH, LOW, NORMAL
+from tests.helpers import mock_bulb, mock_server
+
+COMMANDS = "POST /devices/{device_id}/commands"
+DEVICE_IDS = tuple(f"d{index}" for index in range(10))
+
+
+class PriorityDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mock_server(device_ids=DEVICE_IDS, latency=0.02)
+        self.addCleanup(self.server.stop)
+        self.bulb = mock_bulb(self.server)
+        self.addCleanup(self.bulb.close)
+        # Fetch the token, so it does not delay the first command
+        self.bulb.state()
+
+    def test_priority_order(self):
+        order = []
+        dispatcher = PriorityDispatcher(
+            self.bulb,
+            workers=1,
+            on_result=lambda device_id, result: order.append(device_id),
+        )
+        with dispatcher:
+            for device_id in DEVICE_IDS[:-1]:
+                dispatcher.submit("switch_led", True, device_id, priority=LOW)
+            urgent = dispatcher.submit("switch_led", True, DEVICE_IDS[-1], HIGH)
+            self.assertTrue(urgent.result(timeout=5)["success"])
+
+        # At most the command already in flight goes before the urgent one
+        self.assertLessEqual(order.index(DEVICE_IDS[-1]), 1)
+        order.remove(DEVICE_IDS[-1])
+        self.assertEqual(order, list(DEVICE_IDS[:-1]))
+
+    def test_same_device_keeps_order(self):
+        with PriorityDispatcher(self.bulb, workers=4, supersede=False) as dispatcher:
+            futures = [
+                dispatcher.submit("bright_value_v2", value, "d1")
+                for value in (100, 200, 300)
+            ]
+
+        for future in futures:
+            self.assertTrue(future.result()["success"])
+        self.assertEqual(self.server.devices["d1"]["bright_value_v2"], 300)
+
+    def test_supersede(self):
+        dispatcher = PriorityDispatcher(self.bulb, workers=1)
+        with dispatcher:
+            # Keeps the worker busy, so the next commands wait
+            dispatcher.submit("switch_led", True, "d2")
+            first = dispatcher.submit("bright_value_v2", 100, "d1")
+            second = dispatcher.submit("bright_value_v2", 200, "d1")
+
+        with self.assertRaises(CancelledError):
+            first.result()
+        self.assertTrue(second.result()["success"])
+        self.assertEqual(dispatcher.superseded, 1)
+        self.assertEqual(self.server.devices["d1"]["bright_value_v2"], 200)
+
+    def test_superseded_priority(self):
+        order = []
+        dispatcher = PriorityDispatcher(
+            self.bulb,
+            workers=1,
+            on_result=lambda device_id, result: order.append(device_id),
+        )
+        with dispatcher:
+            dispatcher.submit("switch_led", True, "d0", priority=HIGH)
+            dispatcher.submit("bright_value_v2", 100, "d1", priority=HIGH)
+            # The urgent value is replaced, and so is its place in the queue
+            dispatcher.submit("bright_value_v2", 200, "d1", priority=LOW)
+            dispatcher.submit("switch_led", True, "d2", priority=NORMAL)
+            for value in range(300, 400):
+                dispatcher.submit("bright_value_v2", value, "d3", priority=LOW)
+            # One heap entry per queued device
+            self.assertLessEqual(len(dispatcher._queue), 6)
+
+        self.assertEqual(order[:3], ["d0", "d2", "d1"])
+        self.assertEqual(self.server.devices["d1"]["bright_value_v2"], 200)
+        self.assertEqual(self.server.devices["d3"]["bright_value_v2"], 399)
+
+    def test_repeated_code_without_supersede(self):
+        dispatcher = PriorityDispatcher(self.bulb, workers=1, supersede=False)
+        with dispatcher:
+            dispatcher.submit("switch_led", True, "d0", priority=HIGH)
+            first = dispatcher.submit("bright_value_v2", 100, "d1")
+            switch = dispatcher.submit("switch_led", True, "d1")
+            second = dispatcher.submit("bright_value_v2", 200, "d1")
+
+        # Both values of the code are sent, each in its own request
+        self.assertEqual(self.server.requests[COMMANDS], 3)
+        self.assertTrue(first.result()["success"])
+        self.assertIs(switch.result(), first.result())
+        self.assertIsNot(second.result(), first.result())
+        self.assertEqual(self.server.devices["d1"]["bright_value_v2"], 200)
+        self.assertEqual(dispatcher.sent, 3)
+
+    def test_capture_device_id(self):
+        with PriorityDispatcher(self.bulb) as dispatcher:
+            with dispatcher.capture(device_id="d2") as futures:
+                self.bulb.turn_on(check=False)
+
+        self.assertEqual(len(futures), 1)
+        self.assertTrue(futures[0].result()["success"])
+        self.assertIs(self.server.devices["d2"]["switch_led"], True)
+        self.assertIs(self.server.devices["d1"]["switch_led"], False)
+
+    def test_failing_callback(self):
+        def on_result(device_id, result):
+            raise RuntimeError
+
+        dispatcher = PriorityDispatcher(self.bulb, workers=2, on_result=on_result)
+        for device_id in DEVICE_IDS:
+            dispatcher.submit("switch_led", True, device_id)
+        self.assertTrue(dispatcher.flush(timeout=5))
+        dispatcher.submit("switch_led", False, "d1")
+        self.assertTrue(dispatcher.flush(timeout=5))
+        dispatcher.close()
+
+        self.assertEqual(dispatcher.callback_errors, len(DEVICE_IDS) + 1)
+        self.assertIs(self.server.devices["d1"]["switch_led"], False)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import unittest
+from time import monotonic
+from tuya_bulb_control.effects import Effect, EffectPlayer
+from tuya_bulb_control.testing import MOCK_FUNCTIONS
+from tests.helpers import mock_bulb, mock_server
+
+SCENE_FUNCTIONS = MOCK_FUNCTIONS + [
+    {
+        "code": "scene_data_v2",
+        "type": "Json",
+        "values": json.dumps(
+            {
+                "scene_num": {"min": 1, "max": 8, "scale": 0, "step": 1},
+                "scene_units": {
+                    "unit_gradient_duration": {"min": 0, "max": 100, "step": 1}
+                },
+            }
+        ),
+    },
+    {"code": "colour_data", "type": "Json", "values": "{}"},
+]
+
+RED = (0, 1000, 1000)
+GREEN = (120, 1000, 1000)
+
+
+class EffectPlayerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mock_server(device_ids=("d1", "d2"), functions=SCENE_FUNCTIONS)
+        self.addCleanup(self.server.stop)
+        self.bulb = mock_bulb(self.server)
+        self.addCleanup(self.bulb.close)
+
+    def test_scene_plays_for_the_loops(self):
+        effect = Effect.cycle([RED, GREEN], period=0.2, loops=2)
+
+        started = monotonic()
+        stats = EffectPlayer(self.bulb).play(effect, ["d1", "d2"])
+
+        self.assertGreaterEqual(monotonic() - started, effect.duration)
+        self.assertTrue(stats["scene"])
+        for device_id in ("d1", "d2"):
+            # The scene is stopped at the end
+            self.assertEqual(self.server.devices[device_id]["work_mode"], "colour")
+            self.assertIn("scene_data_v2", self.server.devices[device_id])
+
+    def test_scene_stop(self):
+        effect = Effect.cycle([RED, GREEN], period=10, loops=2)
+        stop = threading.Event()
+        threading.Timer(0.1, stop.set).start()
+
+        started = monotonic()
+        EffectPlayer(self.bulb).play(effect, ["d1"], stop=stop)
+
+        self.assertLess(monotonic() - started, 5)
+        self.assertEqual(self.server.devices["d1"]["work_mode"], "colour")
+
+    def test_v1_colours_are_rounded(self):
+        player = EffectPlayer(self.bulb, use_scenes=False)
+        player.play(Effect.fade(RED, (0, 999, 2), 0), code_name="colour_data")
+
+        # 999 * 255 / 1000 = 254.7, 2 * 255 / 1000 = 0.51
+        self.assertEqual(
+            json.loads(self.server.devices["d1"]["colour_data"]),
+            {"h": 0, "s": 255, "v": 1},
+        )
+
+    def test_single_loop_is_played_frame_by_frame(self):
+        player = EffectPlayer(self.bulb, fps=20)
+        stats = player.play(Effect.fade(RED, GREEN, 0.2))
+
+        self.assertFalse(stats["scene"])
+        self.assertGreater(stats["sent"], 1)
+        self.assertEqual(
+            json.loads(self.server.devices["d1"]["colour_data_v2"]),
+            {"h": 120, "s": 1000, "v": 1000},
+        )
+
+    def test_stop_between_frames(self):
+        effect = Effect.fade(RED, GREEN, 10)
+        stop = threading.Event()
+        threading.Timer(0.1, stop.set).start()
+
+        started = monotonic()
+        stats = EffectPlayer(self.bulb, fps=0.5).play(effect, ["d1"], stop=stop)
+
+        # The 2 seconds until the next frame are not waited out
+        self.assertLess(monotonic() - started, 1)
+        self.assertEqual(stats["sent"], 1)
+
+    def test_device_errors(self):
+        errors = []
+        player = EffectPlayer(
+            self.bulb,
+            fps=20,
+            on_error=lambda device_id, error: errors.append(device_id),
+        )
+
+        stats = player.play(Effect.fade(RED, GREEN, 0.1), ["d1", "unknown"])
+
+        self.assertEqual(list(stats["errors"]), ["unknown"])
+        self.assertFalse(stats["errors"]["unknown"]["success"])
+        self.assertEqual(set(errors), {"unknown"})
+        self.assertEqual(len(errors), stats["sent"])
+
+    def test_scene_device_errors(self):
+        self.server.offline.add("d2")
+        effect = Effect.cycle([RED, GREEN], period=0.1, loops=2)
+
+        stats = EffectPlayer(self.bulb).play(effect, ["d1", "d2"])
+
+        self.assertTrue(stats["scene"])
+        self.assertEqual(stats["errors"]["d2"]["code"], 2001)
+        self.assertNotIn("d1", stats["errors"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+from time import monotonic, sleep
+from tuya_bulb_control.cache import StateCache
+from tuya_bulb_control.events import Subscriber
+from tuya_bulb_control.exceptions import MessageError
+from tuya_bulb_control.online import OnlineTracker
+from tuya_bulb_control.testing import FakeBroker
+
+
+def wait_for(condition, timeout: float = 5) -> bool:
+    deadline = monotonic() + timeout
+    while not condition():
+        if monotonic() > deadline:
+            return False
+        sleep(0.01)
+
+    return True
+
+
+class SubscriberTest(unittest.TestCase):
+    def setUp(self):
+        self.broker = FakeBroker()
+
+    def test_delivery_and_ack(self):
+        cache = StateCache(ttl=60)
+        tracker = OnlineTracker()
+        events = []
+
+        with Subscriber(
+            self.broker.source(), state_cache=cache, online_tracker=tracker
+        ) as subscriber:
+            subscriber.on(events.append, device_id="d1", code_name="switch_led")
+            first = self.broker.publish("d1", {"switch_led": True})
+            second = self.broker.publish("d2", {"switch_led": True})
+            third = self.broker.publish_online("d1", False)
+            self.assertTrue(wait_for(lambda: subscriber.dispatched == 3))
+
+        self.assertEqual(self.broker.acked, [first, second, third])
+        self.assertEqual(
+            [(item.device_id, item.value) for item in events], [("d1", True)]
+        )
+        self.assertIs(cache.get("d1", "switch_led"), True)
+        self.assertIs(tracker.get("d1"), False)
+
+    def test_closing_does_not_ack_unqueued_events(self):
+        release = threading.Event()
+        subscriber = Subscriber(self.broker.source(), queue_size=1)
+        subscriber.on(lambda event: release.wait(5))
+
+        ids = [
+            self.broker.publish("d1", {"bright_value_v2": value}) for value in (1, 2, 3)
+        ]
+        # The dispatcher waits in the callback, the queue is full and the
+        # reader waits to queue the last event
+        self.assertTrue(wait_for(lambda: subscriber.received == 3))
+        self.assertEqual(self.broker.acked, ids[:2])
+
+        closing = threading.Thread(target=subscriber.close)
+        closing.start()
+        sleep(Subscriber._POLL * 2)
+        release.set()
+        closing.join(5)
+
+        self.assertEqual(self.broker.acked, ids[:2])
+
+        # Delivered again on the next connection
+        cache = StateCache(ttl=60)
+        with Subscriber(self.broker.source(), state_cache=cache) as subscriber:
+            self.assertTrue(wait_for(lambda: subscriber.dispatched == 1))
+
+        self.assertEqual(cache.get("d1", "bright_value_v2"), 3)
+        self.assertEqual(self.broker.acked, ids)
+
+    def test_failing_error_handler(self):
+        errors = []
+
+        def on_error(event, exc):
+            errors.append(event)
+            raise RuntimeError
+
+        def callback(event):
+            raise ValueError
+
+        with Subscriber(self.broker.source(), on_error=on_error) as subscriber:
+            subscriber.on(callback)
+            self.broker.publish("d1", {"switch_led": True})
+            self.broker.publish("d1", {"switch_led": False})
+            self.assertTrue(wait_for(lambda: subscriber.dispatched == 2))
+
+        self.assertEqual(subscriber.errors, 2)
+        self.assertEqual(len(errors), 2)
+
+    def test_undecodable_message(self):
+        errors = []
+        events = []
+
+        with Subscriber(
+            self.broker.source(), on_error=lambda event, exc: errors.append(exc)
+        ) as subscriber:
+            subscriber.on(events.append)
+            bad = self.broker.publish_undecodable()
+            good = self.broker.publish("d1", {"switch_led": True})
+            self.assertTrue(wait_for(lambda: subscriber.dispatched == 1))
+
+        self.assertEqual(subscriber.undecodable, 1)
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], MessageError)
+        self.assertEqual(errors[0].target, bad)
+        self.assertEqual(self.broker.acked, [bad, good])
+        self.assertEqual(len(events), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
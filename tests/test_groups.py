@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from tuya_bulb_control import GroupManager
+from tests.helpers import mock_bulb, mock_server
+
+COMMANDS = "POST /devices/{device_id}/commands"
+ISSUED = "POST /device-groups/{group_id}/issued"
+SWITCH_ON = [{"code": "switch_led", "value": True}]
+
+
+class GroupManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mock_server(
+            device_ids=("d1", "d2", "d3", "d4", "d5"),
+            products={"d4": "other_product", "d5": "other_product"},
+        )
+        self.addCleanup(self.server.stop)
+        self.bulb = mock_bulb(self.server)
+        self.addCleanup(self.bulb.close)
+        self.groups = GroupManager(self.bulb, owner_id="home")
+
+    def test_plan(self):
+        self.groups.add("g1", ["d1", "d2", "d3"])
+        self.groups.add("g2", ["d4", "d5"])
+        # Not all members wanted
+        self.groups.add("g3", ["d1", "d6"])
+        # Smaller than min_size
+        self.groups.add("g4", ["d7"])
+
+        self.assertEqual(
+            self.groups.plan(["d1", "d2", "d3", "d4", "d5", "d7", "d1"]),
+            (["g1", "g2"], ["d7"]),
+        )
+        self.assertEqual(self.groups.plan(["d1", "d4"]), ([], ["d1", "d4"]))
+
+    def test_sync(self):
+        synced = self.groups.sync("Floor", ["d1", "d2", "d3", "d4"])
+
+        # One group per product, none for a single device
+        self.assertEqual(list(synced), ["mock_product"])
+        group_id = synced["mock_product"]
+        self.assertEqual(self.server.groups[group_id]["device_ids"], ["d1", "d2", "d3"])
+
+        synced = self.groups.sync("Floor", ["d1", "d2", "d4", "d5"])
+
+        self.assertEqual(synced["mock_product"], group_id)
+        self.assertEqual(self.server.groups[group_id]["device_ids"], ["d1", "d2"])
+        self.assertEqual(
+            self.server.groups[synced["other_product"]]["device_ids"], ["d4", "d5"]
+        )
+        self.assertEqual(self.server.requests["PUT /device-groups/{group_id}"], 1)
+
+        # Unchanged groups get no request
+        self.server.reset_stats()
+        self.groups.sync("Floor", ["d1", "d2", "d4", "d5"])
+        self.assertEqual(self.server.requests["PUT /device-groups/{group_id}"], 0)
+        self.assertEqual(self.server.requests["POST /device-groups"], 0)
+
+        self.assertEqual(self.groups.sync("Floor", ["d1"]), {})
+        self.assertEqual(self.server.requests["DELETE /device-groups/{group_id}"], 2)
+        self.assertEqual(self.server.groups, {})
+        self.assertEqual(self.groups.groups, {})
+
+    def test_apply(self):
+        self.groups.sync("Floor", ["d1", "d2", "d3"])
+        self.server.reset_stats()
+
+        results = self.groups.apply(["d1", "d2", "d3", "d4"], SWITCH_ON)
+
+        self.assertEqual(sorted(results), ["d1", "d2", "d3", "d4"])
+        self.assertTrue(all(item["success"] for item in results.values()))
+        self.assertEqual(self.server.requests[ISSUED], 1)
+        self.assertEqual(self.server.requests[COMMANDS], 1)
+        for device_id in ("d1", "d2", "d3", "d4"):
+            self.assertIs(self.server.devices[device_id]["switch_led"], True)
+        self.assertIs(self.server.devices["d5"]["switch_led"], False)
+
+    def test_apply_falls_back_to_devices(self):
+        # Deleted outside of this manager, the group command fails
+        self.groups.add("deleted", ["d1", "d2"])
+
+        results = self.groups.apply(["d1", "d2"], SWITCH_ON)
+
+        self.assertTrue(all(item["success"] for item in results.values()))
+        self.assertEqual(self.server.requests[ISSUED], 1)
+        self.assertEqual(self.server.requests[COMMANDS], 2)
+        self.assertIs(self.server.devices["d1"]["switch_led"], True)
+        self.assertIs(self.server.devices["d2"]["switch_led"], True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from tuya_bulb_control import Instrumentation, RetryPolicy
+from tuya_bulb_control.exceptions import RateLimited
+from tuya_bulb_control.instrumentation import Histogram, endpoint
+from tests.helpers import mock_bulb, mock_server
+
+DEVICE_IDS = tuple(f"d{index}" for index in range(30))
+
+
+class HistogramTest(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+        for value in [0.005] * 50 + [0.05] * 40 + [0.5] * 9 + [2.0]:
+            histogram.observe(value)
+
+        data = histogram.to_dict()
+        self.assertEqual(data["count"], 100)
+        self.assertEqual(data["max"], 2.0)
+        self.assertEqual(data["buckets"], {"0.01": 50, "0.1": 40, "1.0": 9, "inf": 1})
+        self.assertEqual(histogram.percentile(50), 0.01)
+        self.assertEqual(histogram.percentile(90), 0.1)
+        self.assertEqual(histogram.percentile(99), 1.0)
+        self.assertEqual(histogram.percentile(100), 2.0)
+        self.assertEqual(Histogram().percentile(50), 0.0)
+
+    def test_endpoint(self):
+        self.assertEqual(
+            endpoint("POST", "/devices/abc/commands"),
+            "POST /devices/{device_id}/commands",
+        )
+        self.assertEqual(
+            endpoint("GET", "/devices/status?device_ids=a,b"), "GET /devices/status"
+        )
+        self.assertEqual(
+            endpoint("POST", "/device-groups/12/issued"),
+            "POST /device-groups/{group_id}/issued",
+        )
+
+
+class InstrumentationTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mock_server(device_ids=DEVICE_IDS)
+        self.addCleanup(self.server.stop)
+        self.instrumentation = Instrumentation()
+        self.bulb = self.make_bulb()
+        # Get the token first, so only the tested requests are counted
+        self.bulb.state()
+        self.instrumentation.reset()
+
+    def make_bulb(self, **kwargs):
+        bulb = mock_bulb(
+            self.server, device_id="d0", instrumentation=self.instrumentation, **kwargs
+        )
+        self.addCleanup(bulb.close)
+
+        return bulb
+
+    def test_fan_out_attribution(self):
+        self.bulb.states(DEVICE_IDS)
+        self.bulb.apply(DEVICE_IDS[:5], [{"code": "switch_led", "value": True}])
+
+        metrics = self.instrumentation.metrics()
+        # Two chunks of 20 on the thread pool, attributed to the caller
+        self.assertEqual(metrics["operations"]["states"]["requests"], 2)
+        self.assertEqual(metrics["operations"]["states"]["count"], 1)
+        self.assertEqual(metrics["operations"]["apply"]["requests"], 5)
+        self.assertNotIn("unattributed_requests", metrics["counters"])
+        self.assertEqual(metrics["counters"]["requests"], 7)
+
+    def test_histograms(self):
+        for _ in range(3):
+            self.bulb.state()
+
+        metrics = self.instrumentation.metrics()
+        self.assertEqual(
+            metrics["endpoints"]["GET /devices/{device_id}/status"]["count"], 3
+        )
+        self.assertEqual(metrics["phases"]["network"]["count"], 3)
+        self.assertEqual(metrics["phases"]["sign"]["count"], 3)
+        self.assertEqual(metrics["operations"]["state"]["requests_per_call"], 1.0)
+
+    def test_validation_gets(self):
+        self.bulb.functions(device_id="d1")
+        self.bulb.set_bright_v2(50)
+        self.bulb.set_bright_v2(60)
+
+        counters = self.instrumentation.metrics()["counters"]
+        # The first check of d0 fetched its schema, functions() is not a check
+        self.assertEqual(counters["validation_gets"], 1)
+        self.assertEqual(counters["requests"], 4)
+
+    def test_token_retries(self):
+        self.server.expire_tokens()
+
+        self.bulb.state()
+
+        counters = self.instrumentation.metrics()["counters"]
+        self.assertEqual(counters["token_retries"], 1)
+        self.assertEqual(counters["token_refreshes"], 1)
+        self.assertEqual(
+            self.instrumentation.metrics()["operations"]["state"]["requests"], 3
+        )
+
+    def test_throttled_last_attempt(self):
+        bulb = self.make_bulb(retry=RetryPolicy(retries=0))
+        bulb.state()
+        self.instrumentation.reset()
+        self.server.rate_limit = 1
+
+        bulb._get("/devices/d0/status")
+        with self.assertRaises(RateLimited):
+            bulb._get("/devices/d0/status")
+
+        counters = self.instrumentation.metrics()["counters"]
+        self.assertEqual(self.server.throttled, 1)
+        self.assertEqual(counters["throttled"], 1)
+        self.assertNotIn("retries", counters)
+
+    def test_hooks(self):
+        calls = []
+        self.instrumentation.on_request(lambda call: calls.append(call.endpoint))
+        self.instrumentation.on_response(lambda call: 1 / 0)
+
+        self.bulb.state()
+
+        self.assertEqual(calls, ["GET /devices/{device_id}/status"])
+        self.assertEqual(self.instrumentation.metrics()["counters"]["hook_errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+from tuya_bulb_control.exceptions import LocalError
+from tuya_bulb_control.local import VERSIONS, LocalDevice
+from tuya_bulb_control.testing import FakeLocalDevice
+from tests.helpers import mock_bulb, mock_server
+
+
+class LocalDeviceTest(unittest.TestCase):
+    def fake(self, version: str) -> FakeLocalDevice:
+        fake = FakeLocalDevice(version=version)
+        fake.start()
+        self.addCleanup(fake.stop)
+
+        return fake
+
+    def device(self, fake: FakeLocalDevice, **kwargs) -> LocalDevice:
+        device = LocalDevice(
+            "d1",
+            fake.host,
+            fake.local_key,
+            fake.version,
+            fake.port,
+            heartbeat=None,
+            **kwargs,
+        )
+        self.addCleanup(device.close)
+
+        return device
+
+    def test_versions(self):
+        for version in VERSIONS:
+            with self.subTest(version=version):
+                fake = self.fake(version)
+                device = self.device(fake)
+
+                self.assertEqual(
+                    device.status(),
+                    {
+                        "switch_led": False,
+                        "work_mode": "white",
+                        "bright_value_v2": 1000,
+                    },
+                )
+
+                device.set_values(
+                    {
+                        "switch_led": True,
+                        "colour_data_v2": {"h": 120, "s": 1000, "v": 500},
+                    }
+                )
+                self.assertEqual(fake.dps["20"], True)
+                self.assertEqual(fake.dps["24"], "007803e801f4")
+                self.assertEqual(
+                    json.loads(device.status()["colour_data_v2"]),
+                    {"h": 120, "s": 1000, "v": 500},
+                )
+                # One connection for every exchange
+                self.assertEqual(fake.connections, 1)
+
+    def test_unknown_code(self):
+        device = self.device(self.fake("3.3"))
+
+        with self.assertRaises(LocalError):
+            device.set_values({"unknown_code": 1})
+
+    def test_invalid_checksum_reconnects(self):
+        for version in ("3.3", "3.4"):
+            with self.subTest(version=version):
+                fake = self.fake(version)
+                device = self.device(fake)
+                device.status()
+
+                fake.corrupt_next("checksum")
+                with self.assertRaises(LocalError):
+                    device.status()
+
+                # The next exchange starts on a new connection, in sync
+                self.assertEqual(device.status()["switch_led"], False)
+                self.assertEqual(fake.connections, 2)
+
+    def test_invalid_payload(self):
+        fake = self.fake("3.3")
+        device = self.device(fake)
+
+        fake.corrupt_next("payload")
+        with self.assertRaises(LocalError):
+            device.status()
+
+        self.assertEqual(device.status()["switch_led"], False)
+
+    def test_bulb_falls_back_on_invalid_reply(self):
+        server = mock_server(device_ids=("d1",))
+        self.addCleanup(server.stop)
+        fake = self.fake("3.3")
+        bulb = mock_bulb(server, local_devices=[self.device(fake)])
+        self.addCleanup(bulb.close)
+
+        fake.corrupt_next("payload")
+        response = bulb.turn_on(check=False)
+
+        self.assertNotIn("local", response)
+        self.assertEqual(server.requests["POST /devices/{device_id}/commands"], 1)
+
+    def test_bulb_falls_back_to_the_cloud(self):
+        server = mock_server(device_ids=("d1",))
+        self.addCleanup(server.stop)
+        fake = self.fake("3.4")
+        device = self.device(fake)
+        bulb = mock_bulb(server, local_devices=[device])
+        self.addCleanup(bulb.close)
+
+        self.assertTrue(bulb.turn_on(check=False)["local"])
+        self.assertEqual(server.requests["POST /devices/{device_id}/commands"], 0)
+
+        # The device goes off the network
+        fake.stop()
+        response = bulb.turn_off(check=False)
+        self.assertNotIn("local", response)
+        self.assertIs(server.devices["d1"]["switch_led"], False)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from time import monotonic, sleep
+from unittest import mock
+from tuya_bulb_control import OnlineTracker
+from tuya_bulb_control.exceptions import DeviceOffline
+from tests.helpers import mock_bulb, mock_server
+
+COMMANDS = "POST /devices/{device_id}/commands"
+
+
+class OnlineTrackerTest(unittest.TestCase):
+    def test_offline_ttl(self):
+        tracker = OnlineTracker(offline_ttl=60)
+
+        with mock.patch("tuya_bulb_control.online.monotonic", return_value=100.0):
+            tracker.set("d1", False)
+        with mock.patch("tuya_bulb_control.online.monotonic", return_value=160.0):
+            self.assertTrue(tracker.is_offline("d1"))
+        with mock.patch("tuya_bulb_control.online.monotonic", return_value=161.0):
+            # Time for a probe
+            self.assertFalse(tracker.is_offline("d1"))
+        self.assertIs(tracker.get("d1"), False)
+        self.assertIsNone(tracker.get("d2"))
+
+    def test_replay_ttl(self):
+        tracker = OnlineTracker(defer=True, replay_ttl=600)
+        patch = "tuya_bulb_control.online.monotonic"
+
+        with mock.patch(patch, return_value=0.0):
+            tracker.defer_commands("d1", [{"code": "switch_led", "value": True}])
+        with mock.patch(patch, return_value=500.0):
+            tracker.defer_commands("d1", [{"code": "work_mode", "value": "colour"}])
+        with mock.patch(patch, return_value=650.0):
+            commands = tracker.take_commands(
+                "d1", [{"code": "bright_value_v2", "value": 500}]
+            )
+
+        # Only the value deferred more than replay_ttl ago is dropped
+        self.assertEqual(
+            commands,
+            [
+                {"code": "work_mode", "value": "colour"},
+                {"code": "bright_value_v2", "value": 500},
+            ],
+        )
+        self.assertEqual(tracker.deferred(), {})
+
+    def test_newest_value_wins(self):
+        tracker = OnlineTracker(defer=True)
+        tracker.defer_commands("d1", [{"code": "switch_led", "value": True}])
+        tracker.defer_commands("d1", [{"code": "switch_led", "value": False}])
+
+        self.assertEqual(tracker.deferred("d1"), {"d1": {"switch_led": False}})
+        self.assertEqual(
+            tracker.take_commands("d1"), [{"code": "switch_led", "value": False}]
+        )
+
+
+class BulbOfflineTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mock_server(device_ids=("d1",))
+        self.addCleanup(self.server.stop)
+        self.server.offline.add("d1")
+
+    def bulb(self, tracker: OnlineTracker):
+        bulb = mock_bulb(self.server, online_tracker=tracker)
+        self.addCleanup(bulb.close)
+
+        return bulb
+
+    def test_fail_fast(self):
+        tracker = OnlineTracker(defer=False)
+        bulb = self.bulb(tracker)
+
+        with self.assertRaises(DeviceOffline):
+            bulb.turn_on(check=False)
+        self.assertIs(tracker.get("d1"), False)
+
+        # Known to be offline, no request
+        with self.assertRaises(DeviceOffline):
+            bulb.turn_on(check=False)
+        self.assertEqual(self.server.requests[COMMANDS], 1)
+        self.assertEqual(tracker.deferred(), {})
+
+    def test_defer_and_replay(self):
+        tracker = OnlineTracker(defer=True)
+        bulb = self.bulb(tracker)
+
+        response = bulb.turn_on(check=False)
+        self.assertTrue(response["deferred"])
+        self.assertFalse(response["success"])
+        self.assertTrue(bulb.set_work_mode("colour", check=False)["deferred"])
+        self.assertEqual(self.server.requests[COMMANDS], 1)
+        self.assertEqual(
+            tracker.deferred("d1"), {"d1": {"switch_led": True, "work_mode": "colour"}}
+        )
+
+        self.server.offline.clear()
+        tracker.set("d1", True)
+
+        deadline = monotonic() + 5
+        while self.server.devices["d1"].get("work_mode") != "colour":
+            self.assertLess(monotonic(), deadline)
+            sleep(0.01)
+
+        self.assertIs(self.server.devices["d1"]["switch_led"], True)
+        # Both values in one request
+        self.assertEqual(self.server.requests[COMMANDS], 2)
+        self.assertEqual(tracker.deferred(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
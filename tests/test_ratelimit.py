@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from time import sleep
+from tuya_bulb_control.exceptions import RateLimited, RequestError
+from tuya_bulb_control.ratelimit import RateLimiter, RetryPolicy
+from tests.helpers import mock_bulb, mock_server
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def test_throttled_by_code(self):
+        policy = RetryPolicy()
+
+        self.assertTrue(policy.is_throttled({"success": False, "code": 40000309}))
+        self.assertFalse(
+            policy.is_throttled(
+                {"success": False, "code": 1106, "msg": "frequency of permission"}
+            )
+        )
+        self.assertFalse(policy.is_throttled({"success": True, "result": True}))
+
+    def test_throttled_requests_are_retried(self):
+        server = mock_server(rate_limit=5)
+        self.addCleanup(server.stop)
+        bulb = mock_bulb(server, retry=RetryPolicy(retries=10, backoff=0.1))
+        self.addCleanup(bulb.close)
+
+        for _ in range(15):
+            self.assertTrue(bulb.turn_on(check=False)["success"])
+
+        self.assertGreater(server.throttled, 0)
+
+    def test_throttled_after_the_retries(self):
+        server = mock_server()
+        self.addCleanup(server.stop)
+        bulb = mock_bulb(server, retry=RetryPolicy(retries=2, backoff=0.01))
+        self.addCleanup(bulb.close)
+        bulb.state()
+        server.rate_limit = 1
+
+        self.assertTrue(bulb.turn_on(check=False)["success"])
+        with self.assertRaises(RateLimited) as context:
+            bulb.turn_off(check=False)
+
+        self.assertIsInstance(context.exception, RequestError)
+        self.assertEqual(server.throttled, 3)
+        self.assertIs(server.devices["d1"]["switch_led"], True)
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_idle_device_buckets_are_evicted(self):
+        limiter = RateLimiter(device_rate=100, device_burst=1, sweep_interval=0.05)
+
+        for index in range(100):
+            limiter.acquire(f"d{index}")
+        self.assertEqual(limiter.stats()["devices"], 100)
+
+        # Refilled after 0.01 seconds, evicted at the next sweep
+        sleep(0.1)
+        limiter.acquire("d0")
+        self.assertEqual(limiter.stats()["devices"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
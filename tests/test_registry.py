@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+from tuya_bulb_control import DeviceRegistry
+
+DEVICES = [
+    {"id": "d1", "product_id": "p1", "category": "dj", "online": True},
+    {"id": "d2", "product_id": "p1", "category": "dj", "online": False},
+    {"id": "d3", "product_id": "p2", "category": "dd", "online": True},
+]
+
+
+class _Bulb:
+    _online_tracker = None
+
+
+class DeviceRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = DeviceRegistry(_Bulb())
+        self.registry.add(DEVICES[0], room="kitchen")
+        self.registry.add(DEVICES[1], room="hall")
+        self.registry.add(DEVICES[2])
+
+    def test_select(self):
+        self.assertEqual(self.registry.select(product_id="p1"), ["d1", "d2"])
+        self.assertEqual(self.registry.select(online=True), ["d1", "d3"])
+        self.assertEqual(self.registry.select(product_id="p1", online=False), ["d2"])
+        self.assertEqual(self.registry.select(room="kitchen"), ["d1"])
+        self.assertEqual(self.registry.count(category="dj"), 2)
+
+    def test_readd_keeps_room(self):
+        self.registry.add(dict(DEVICES[0], online=False))
+
+        self.assertEqual(self.registry.get("d1").room, "kitchen")
+        self.assertFalse(self.registry.get("d1").online)
+        self.assertEqual(self.registry.select(room="kitchen"), ["d1"])
+
+        self.registry.add(DEVICES[0], room="hall")
+        self.assertEqual(self.registry.select(room="hall"), ["d1", "d2"])
+        self.assertEqual(self.registry.select(room="kitchen"), [])
+
+    def test_selects_during_updates(self):
+        device_ids = [f"x{index}" for index in range(200)]
+        for device_id in device_ids:
+            self.registry.add({"id": device_id, "product_id": "p3", "online": True})
+        done = threading.Event()
+
+        def update():
+            while not done.is_set():
+                for device_id in device_ids:
+                    self.registry.add(
+                        {"id": device_id, "product_id": "p3", "online": True}
+                    )
+
+        writer = threading.Thread(target=update)
+        writer.start()
+        try:
+            for _ in range(2000):
+                self.assertEqual(self.registry.count(product_id="p3", online=True), 200)
+        finally:
+            done.set()
+            writer.join()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import unittest
+from tuya_bulb_control import AsyncBulb, SchemaCache
+from tuya_bulb_control.exceptions import (
+    FunctionNotSupported,
+    ModeNotSupported,
+    ValueNotInRange,
+)
+from tuya_bulb_control.schema import (
+    EnumValidator,
+    IntegerValidator,
+    JsonValidator,
+    Schema,
+    compile_function,
+)
+from tuya_bulb_control.testing import MOCK_FUNCTIONS
+from tests.helpers import mock_bulb, mock_server
+
+COMMANDS = "POST /devices/{device_id}/commands"
+FUNCTIONS = "GET /devices/{device_id}/functions"
+
+
+class ValidatorTest(unittest.TestCase):
+    def test_integer_step(self):
+        validator = IntegerValidator("countdown", min=5, max=100, step=5)
+
+        self.assertTrue(validator.allows(5))
+        self.assertTrue(validator.allows(100))
+        self.assertFalse(validator.allows(7))
+        self.assertFalse(validator.allows(105))
+        self.assertFalse(validator.allows(True))
+        self.assertFalse(validator.allows(10.0))
+        with self.assertRaises(ValueNotInRange):
+            validator.check(0)
+
+    def test_integer_scale(self):
+        validator = compile_function(
+            {
+                "code": "temp",
+                "type": "Integer",
+                "values": json.dumps({"min": 0, "max": 500, "scale": 1, "step": 5}),
+            }
+        )
+
+        self.assertIsInstance(validator, IntegerValidator)
+        self.assertEqual((validator.scale, validator.step), (1, 5))
+        self.assertTrue(validator.allows(255))
+        self.assertFalse(validator.allows(254))
+
+    def test_from_percent(self):
+        validator = IntegerValidator("bright_value_v2", min=10, max=1000)
+
+        self.assertEqual(validator.percent_range(), (1, 100))
+        self.assertEqual(validator.from_percent(50), 500)
+        self.assertEqual(validator.from_percent(1), 10)
+        self.assertEqual(validator.from_percent(100), 1000)
+        with self.assertRaises(ValueNotInRange):
+            validator.from_percent(0)
+        with self.assertRaises(ValueNotInRange):
+            validator.from_percent(101)
+
+    def test_from_percent_step(self):
+        validator = IntegerValidator("bright", min=25, max=255, step=10)
+
+        # 50% is 127.5, rounded to the nearest step from 25
+        self.assertEqual(validator.from_percent(50), 125)
+        self.assertEqual(validator.from_percent(100), 255)
+
+    def test_json_rejections(self):
+        schema = Schema(MOCK_FUNCTIONS)
+        validator = schema.get("colour_data_v2")
+
+        self.assertIsInstance(validator, JsonValidator)
+        self.assertTrue(validator.allows({"h": 0, "s": 1000, "v": 1000}))
+        self.assertTrue(validator.allows('{"h": 360, "s": 0, "v": 0}'))
+        self.assertFalse(validator.allows({"h": 361, "s": 0, "v": 0}))
+        self.assertFalse(validator.allows({"h": 0, "s": 0}))
+        self.assertFalse(validator.allows({"h": 0, "s": 0, "v": 0, "x": 0}))
+        self.assertFalse(validator.allows("{not json"))
+        self.assertFalse(validator.allows([0, 0, 0]))
+        with self.assertRaises(ValueNotInRange):
+            schema.validate("colour_data_v2", {"h": 0, "s": -1, "v": 0})
+
+    def test_enum_rejections(self):
+        validator = EnumValidator("work_mode", ["white", "colour"])
+
+        self.assertTrue(validator.allows("white"))
+        self.assertFalse(validator.allows("scene"))
+        self.assertFalse(validator.allows(["white"]))
+        with self.assertRaises(ValueNotInRange):
+            validator.check("music")
+
+    def test_unknown_function(self):
+        with self.assertRaises(FunctionNotSupported):
+            Schema(MOCK_FUNCTIONS).validate("bright_value", 100)
+
+
+class SchemaCacheTest(unittest.TestCase):
+    def test_product_sharing(self):
+        cache = SchemaCache()
+        cache.assign({"d1": "p1", "d2": "p1", "d3": "p2"})
+
+        schema = cache.compile(MOCK_FUNCTIONS, "d1")
+
+        self.assertIs(cache.get("d2"), schema)
+        self.assertIsNone(cache.get("d3"))
+        self.assertIs(cache.compile(list(MOCK_FUNCTIONS), "d3"), schema)
+        self.assertEqual(cache.compiled, 1)
+
+    def test_invalidate_device(self):
+        cache = SchemaCache()
+        cache.assign({"d1": "p1", "d2": "p1"})
+        cache.compile(MOCK_FUNCTIONS, "d1")
+
+        cache.invalidate("d1")
+
+        self.assertIsNone(cache.get("d1"))
+        self.assertIsNone(cache.get("d2"))
+
+    def test_invalidate_all(self):
+        cache = SchemaCache()
+        cache.compile(MOCK_FUNCTIONS, "d1")
+
+        cache.invalidate()
+
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get("d1"))
+
+    def test_bulbs_share_product_schema(self):
+        server = mock_server()
+        self.addCleanup(server.stop)
+        cache = SchemaCache()
+        cache.assign({"d1": "p1", "d2": "p1"})
+        bulb = mock_bulb(server, schema_cache=cache)
+        self.addCleanup(bulb.close)
+
+        bulb.set_bright_v2(50, device_id="d1")
+        bulb.set_bright_v2(50, device_id="d2")
+        with self.assertRaises(ValueNotInRange):
+            bulb.set_bright_v2(0, device_id="d2")
+
+        self.assertEqual(server.requests[FUNCTIONS], 1)
+
+
+class CheckFalseTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mock_server()
+        self.addCleanup(self.server.stop)
+        self.bulb = mock_bulb(self.server)
+        self.addCleanup(self.bulb.close)
+
+    def test_default_ranges_without_schema(self):
+        with self.assertRaises(ValueNotInRange):
+            self.bulb.set_toggle_timer(5000, check=False)
+        with self.assertRaises(ValueNotInRange):
+            self.bulb.set_bright(1000, check=False)
+        with self.assertRaises(ValueNotInRange):
+            self.bulb.set_colour_temp(1000, check=False)
+
+        self.assertEqual(self.server.requests[FUNCTIONS], 0)
+        self.assertEqual(self.server.requests[COMMANDS], 0)
+
+    def test_known_schema(self):
+        self.bulb.functions()
+
+        self.bulb.set_toggle_timer(10, check=False)
+        with self.assertRaises(ValueNotInRange):
+            self.bulb.set_toggle_timer(1441, check=False)
+        self.bulb.set_colour_v2((255, 0, 0), check=False)
+        # Not in the schema, the usual range applies
+        with self.assertRaises(ValueNotInRange):
+            self.bulb.set_bright(1000, check=False)
+        with self.assertRaises(ModeNotSupported):
+            self.bulb.set_work_mode("disco", check=False)
+
+        self.assertEqual(self.server.requests[FUNCTIONS], 1)
+        self.assertEqual(self.server.requests[COMMANDS], 2)
+        self.assertEqual(self.server.devices["d1"]["countdown_1"], 600)
+
+    def test_async(self):
+        async def run():
+            async with AsyncBulb(
+                self.server.client_id,
+                self.server.secret_key,
+                "eu",
+                "d1",
+                base_url=self.server.base_url,
+            ) as bulb:
+                with self.assertRaises(ValueNotInRange):
+                    await bulb.set_toggle_timer(5000, check=False)
+                with self.assertRaises(ValueNotInRange):
+                    await bulb.set_bright(1000, check=False)
+                await bulb.functions()
+                with self.assertRaises(ValueNotInRange):
+                    await bulb.set_colour_temp(1000, check=False)
+                await bulb.set_bright_v2(50, check=False)
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        loop.run_until_complete(run())
+
+        self.assertEqual(self.server.requests[FUNCTIONS], 1)
+        self.assertEqual(self.server.requests[COMMANDS], 1)
+        self.assertEqual(self.server.devices["d1"]["bright_value_v2"], 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+from unittest import mock
+from tuya_bulb_control import _signing
+from tuya_bulb_control._signing import Signer
+
+CLIENT_ID = "client"
+SECRET_KEY = "secret"
+ACCESS_TOKEN = "token"
+TIMESTAMP = "1700000000000"
+URL = "/v1.0/devices/d1/commands"
+BODIES = [
+    "",
+    json.dumps({"commands": [{"code": "switch_led", "value": True}]}),
+    json.dumps({"name": "Étage"}, ensure_ascii=False),
+    '{"name": "灯 💡"}',
+]
+
+
+class SignerTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(_signing, "get_timestamp", return_value=TIMESTAMP)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.signer = Signer(CLIENT_ID, SECRET_KEY)
+
+    def reference(self, method: str, body: str) -> dict:
+        return _signing.request_headers(
+            CLIENT_ID, SECRET_KEY, ACCESS_TOKEN, method, URL, body
+        )
+
+    def test_token_headers(self):
+        url = "/v1.0/token?grant_type=1"
+
+        self.assertEqual(
+            self.signer.token_headers(url),
+            _signing.token_headers(CLIENT_ID, SECRET_KEY, url),
+        )
+
+    def test_request_headers(self):
+        for body in BODIES:
+            with self.subTest(body=body):
+                expected = self.reference("POST", body)
+
+                self.assertEqual(
+                    self.signer.request_headers(ACCESS_TOKEN, "POST", URL, body),
+                    expected,
+                )
+                # The same body as bytes, or with its hash computed beforehand
+                self.assertEqual(
+                    self.signer.request_headers(
+                        ACCESS_TOKEN, "POST", URL, body.encode("utf-8")
+                    ),
+                    expected,
+                )
+                self.assertEqual(
+                    self.signer.request_headers(
+                        ACCESS_TOKEN,
+                        "POST",
+                        URL,
+                        content_hash=Signer.content_hash(body),
+                    ),
+                    expected,
+                )
+
+    def test_sign_batch(self):
+        requests = [("POST", URL, body) for body in BODIES + BODIES]
+        requests.append(("GET", URL, None))
+
+        signed = self.signer.sign_batch(ACCESS_TOKEN, requests)
+
+        self.assertEqual(
+            signed,
+            [self.reference(method, body or "") for method, _, body in requests],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
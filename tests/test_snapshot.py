@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from tuya_bulb_control import Snapshot
+from tuya_bulb_control.snapshot import restore_commands
+from tests.helpers import mock_bulb, mock_server
+
+COMMANDS = "POST /devices/{device_id}/commands"
+WHITE = {"switch_led": True, "work_mode": "white"}
+COLOUR = {
+    "switch_led": True,
+    "work_mode": "colour",
+    "colour_data_v2": '{"h":0,"s":1000,"v":1000}',
+}
+
+
+class SnapshotTest(unittest.TestCase):
+    def test_dedupe(self):
+        snapshot = Snapshot(
+            {"d1": WHITE, "d2": COLOUR, "d3": dict(WHITE), "d4": dict(COLOUR)}
+        )
+
+        self.assertEqual(len(snapshot), 4)
+        self.assertEqual(len(snapshot.states), 2)
+        self.assertEqual(snapshot.codes, ["switch_led", "work_mode", "colour_data_v2"])
+        self.assertEqual(snapshot.get("d3"), WHITE)
+        self.assertEqual(snapshot.get("d4"), COLOUR)
+        self.assertNotIn("d5", snapshot)
+        with self.assertRaises(KeyError):
+            snapshot.get("d5")
+
+    def test_round_trip(self):
+        snapshot = Snapshot({"d1": WHITE, "d2": COLOUR, "d3": WHITE}, taken_at=100.0)
+
+        loaded = Snapshot.loads(snapshot.dumps())
+
+        self.assertEqual(loaded.taken_at, 100.0)
+        self.assertEqual(loaded.to_dict(), snapshot.to_dict())
+        for device_id in ("d1", "d2", "d3"):
+            self.assertEqual(loaded.get(device_id), snapshot.get(device_id))
+
+    def test_unknown_version(self):
+        data = Snapshot({"d1": WHITE}).to_dict()
+        data["version"] = 0
+
+        with self.assertRaises(ValueError):
+            Snapshot.from_dict(data)
+
+    def test_restore_commands(self):
+        self.assertEqual(
+            restore_commands(COLOUR),
+            [
+                {"code": "work_mode", "value": "colour"},
+                {"code": "colour_data_v2", "value": {"h": 0, "s": 1000, "v": 1000}},
+                # The switch goes last
+                {"code": "switch_led", "value": True},
+            ],
+        )
+
+
+class RestoreTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mock_server(device_ids=("d1", "d2", "d3"))
+        self.addCleanup(self.server.stop)
+        self.bulb = mock_bulb(self.server)
+        self.addCleanup(self.bulb.close)
+
+        for device_id in ("d1", "d2", "d3"):
+            self.server.devices[device_id].update(WHITE)
+        self.snapshot = self.bulb.snapshot(["d1", "d2", "d3"])
+
+    def test_restore(self):
+        self.server.devices["d2"]["switch_led"] = False
+        self.server.reset_stats()
+
+        results = self.bulb.restore(self.snapshot)
+
+        self.assertTrue(all(item["success"] for item in results.values()))
+        self.assertEqual(self.server.requests[COMMANDS], 3)
+        self.assertIs(self.server.devices["d2"]["switch_led"], True)
+
+    def test_restore_diff(self):
+        self.server.devices["d2"]["switch_led"] = False
+        self.server.devices["d3"]["work_mode"] = "colour"
+        self.server.reset_stats()
+
+        results = self.bulb.restore(self.snapshot, diff=True)
+
+        self.assertIsNone(results["d1"])
+        self.assertTrue(results["d2"]["success"])
+        self.assertTrue(results["d3"]["success"])
+        self.assertEqual(self.server.requests[COMMANDS], 2)
+        self.assertEqual(self.server.devices["d2"], WHITE)
+        self.assertEqual(self.server.devices["d3"], WHITE)
+
+
+if __name__ == "__main__":
+    unittest.main()
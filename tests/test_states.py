@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from tuya_bulb_control import StateCache
+from tests.helpers import mock_bulb, mock_server
+
+STATUS = "GET /devices/status"
+DEVICE_IDS = tuple(f"d{index}" for index in range(45))
+
+
+class StatesTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mock_server(device_ids=DEVICE_IDS)
+        self.addCleanup(self.server.stop)
+
+    def test_chunks_of_twenty(self):
+        cache = StateCache()
+        bulb = mock_bulb(self.server, state_cache=cache)
+        self.addCleanup(bulb.close)
+        self.server.devices["d44"]["switch_led"] = True
+
+        states = bulb.states(DEVICE_IDS)
+
+        # 20 + 20 + 5 devices
+        self.assertEqual(self.server.requests[STATUS], 3)
+        self.assertEqual(list(states), list(DEVICE_IDS))
+        self.assertIs(states["d44"]["switch_led"], True)
+        self.assertIs(cache.get("d44", "switch_led"), True)
+
+    def test_chunk_size(self):
+        bulb = mock_bulb(self.server)
+        self.addCleanup(bulb.close)
+
+        self.assertEqual(len(bulb.states(DEVICE_IDS[:20])), 20)
+        self.assertEqual(self.server.requests[STATUS], 1)
+
+        self.assertEqual(len(bulb.states(DEVICE_IDS[:20], chunk_size=7)), 20)
+        self.assertEqual(self.server.requests[STATUS], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+from tuya_bulb_control.tokens import MemoryTokenStore
+from tests.helpers import mock_bulb, mock_server
+
+
+class TokenRefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mock_server()
+        self.addCleanup(self.server.stop)
+        self.bulb = mock_bulb(self.server)
+        self.addCleanup(self.bulb.close)
+
+    def test_token_on_first_use(self):
+        self.assertEqual(self.server.total_requests, 0)
+
+        self.bulb.state()
+        self.bulb.state()
+
+        self.assertEqual(self.server.requests["GET /token"], 1)
+
+    def test_refresh_on_1010(self):
+        self.bulb.state()
+        self.server.expire_tokens()
+
+        self.assertTrue(self.bulb.turn_on(check=False)["success"])
+
+        self.assertEqual(self.server.requests["GET /token/{refresh_token}"], 1)
+        self.assertEqual(self.server.requests["GET /token"], 1)
+        self.assertIs(self.server.devices["d1"]["switch_led"], True)
+
+    def test_one_refresh_for_concurrent_requests(self):
+        self.bulb.state()
+        self.server.expire_tokens()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(executor.map(lambda _: self.bulb.state(), range(16)))
+
+        self.assertTrue(all(responses))
+        self.assertEqual(self.server.requests["GET /token/{refresh_token}"], 1)
+
+    def test_renewal_before_expiry(self):
+        server = mock_server(token_ttl=3)
+        self.addCleanup(server.stop)
+        bulb = mock_bulb(server, refresh_margin=2.5)
+        self.addCleanup(bulb.close)
+
+        bulb.state()
+        sleep(0.6)
+        self.assertTrue(bulb.state())
+
+        # Renewed in the background with the refresh token
+        deadline = monotonic() + 5
+        while not server.requests["GET /token/{refresh_token}"]:
+            self.assertLess(monotonic(), deadline)
+            sleep(0.01)
+        self.assertTrue(bulb.state())
+        self.assertEqual(server.requests["GET /token"], 1)
+
+
+class TokenStoreTest(unittest.TestCase):
+    def test_clients_of_different_servers_do_not_share_tokens(self):
+        store = MemoryTokenStore()
+        servers = [mock_server(), mock_server()]
+        bulbs = [mock_bulb(server, token_store=store) for server in servers]
+        for server, bulb in zip(servers, bulbs):
+            self.addCleanup(server.stop)
+            self.addCleanup(bulb.close)
+
+        for _ in range(2):
+            for bulb in bulbs:
+                self.assertTrue(bulb.state())
+
+        for server in servers:
+            self.assertEqual(server.requests["GET /token"], 1)
+            self.assertEqual(server.rejected, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
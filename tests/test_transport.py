@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from unittest import mock
+from tuya_bulb_control import transport
+from tuya_bulb_control.transport import shared_transport
+from tests.helpers import mock_bulb, mock_server
+
+
+class SharedTransportTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(transport._shared_transports, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_transport_per_arguments(self):
+        shared = shared_transport("eu")
+
+        self.assertIs(shared_transport("eu"), shared)
+        self.assertIsNot(shared_transport("us"), shared)
+        self.assertIsNot(shared_transport("eu", pool_size=2), shared)
+
+    def test_bulbs_reuse_connections(self):
+        server = mock_server()
+        self.addCleanup(server.stop)
+        bulbs = [mock_bulb(server, device_id) for device_id in ("d1", "d2")]
+        for bulb in bulbs:
+            self.addCleanup(bulb.close)
+
+        for _ in range(3):
+            for bulb in bulbs:
+                bulb.state()
+
+        shared = shared_transport("eu")
+        self.addCleanup(shared.close)
+        self.assertIs(bulbs[0]._transport, shared)
+        self.assertIs(bulbs[1]._transport, shared)
+
+        pools = shared._session.get_adapter(server.base_url).poolmanager.pools
+        self.assertEqual(len(pools), 1)
+        pool = pools[next(iter(pools.keys()))]
+        # Token grants and states over one kept-alive connection
+        self.assertEqual(pool.num_connections, 1)
+        self.assertEqual(pool.num_requests, sum(server.requests.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
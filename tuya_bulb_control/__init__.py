@@ -1,3 +1,40 @@
+from .async_bulb import AsyncBulb
 from .bulb import Bulb
+from .cache import FunctionsCache, StateCache
+from .coalesce import CoalescingDispatcher
+from .dispatch import PriorityDispatcher
+from .events import Subscriber
+from .groups import GroupManager
+from .instrumentation import Instrumentation
+from .local import LocalDevice
+from .online import OnlineTracker
+from .ratelimit import RateLimiter, RetryPolicy
+from .registry import DeviceRegistry
+from .schema import SchemaCache
+from .snapshot import Snapshot
+from .tokens import FileTokenStore, MemoryTokenStore, TokenStore
+from .transport import Transport, shared_transport
 
-__all__ = Bulb
+__all__ = [
+    "AsyncBulb",
+    "Bulb",
+    "CoalescingDispatcher",
+    "DeviceRegistry",
+    "FileTokenStore",
+    "FunctionsCache",
+    "GroupManager",
+    "Instrumentation",
+    "LocalDevice",
+    "MemoryTokenStore",
+    "OnlineTracker",
+    "PriorityDispatcher",
+    "RateLimiter",
+    "RetryPolicy",
+    "SchemaCache",
+    "Snapshot",
+    "StateCache",
+    "Subscriber",
+    "TokenStore",
+    "Transport",
+    "shared_transport",
+]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # pragma: no cover
+    Cipher = None
+    AESGCM = None
+
+BLOCK_SIZE = 16
+
+
+def require_aes(feature: str, extra: str = "local"):
+    """
+    Check that AES is available.
+
+    :param feature: name of the feature that needs it, for the error message
+    :param extra: setup.py extra that installs it, for the error message
+    :raise ImportError: if cryptography is not installed
+    """
+    if Cipher is None:
+        raise ImportError(
+            f"{feature} requires cryptography: pip install tuya_bulb_control[{extra}]"
+        )
+
+
+def pad(data: bytes) -> bytes:
+    """
+    PKCS#7 padding.
+    """
+    length = BLOCK_SIZE - len(data) % BLOCK_SIZE
+    return data + bytes([length]) * length
+
+
+def unpad(data: bytes) -> bytes:
+    """
+    Remove PKCS#7 padding.
+    """
+    if not data or not 0 < data[-1] <= BLOCK_SIZE:
+        return data
+    return data[: -data[-1]]
+
+
+def aes_encrypt(key: bytes, data: bytes, padding: bool = True) -> bytes:
+    """
+    AES-128-ECB encrypt.
+
+    :param key: 16 bytes key
+    :param data: plain data
+    :param padding: add PKCS#7 padding
+    :return: encrypted data
+    """
+    encryptor = Cipher(algorithms.AES(key), modes.ECB()).encryptor()
+    return encryptor.update(pad(data) if padding else data) + encryptor.finalize()
+
+
+def aes_decrypt(key: bytes, data: bytes, padding: bool = True) -> bytes:
+    """
+    AES-128-ECB decrypt.
+
+    :param key: 16 bytes key
+    :param data: encrypted data
+    :param padding: remove PKCS#7 padding
+    :return: plain data
+    """
+    decryptor = Cipher(algorithms.AES(key), modes.ECB()).decryptor()
+    data = decryptor.update(data) + decryptor.finalize()
+    return unpad(data) if padding else data
+
+
+def aes_gcm_decrypt(key: bytes, data: bytes) -> bytes:
+    """
+    AES-GCM decrypt.
+
+    :param key: 16 bytes key
+    :param data: 12 bytes nonce, encrypted data and 16 bytes tag
+    :return: plain data
+    """
+    return AESGCM(key).decrypt(data[:12], data[12:], None)
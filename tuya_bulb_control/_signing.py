@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+import hmac
+from time import time
+from hashlib import sha256
+
+SIGN_METHOD = "HMAC-SHA256"
+
+
+def generate_string_to_sign(method: str, body: str, headers: dict, url: str) -> str:
+    """
+    Generates the stringToSign required to send the request
+
+    :param method: HTTP method. Example: GET; POST
+    :param body: serialised request body
+    :param headers: signed headers
+    :param url: request path with version. Example: /v1.0/token?grant_type=1
+    :return: a list as a string joined by a '\\n'
+    """
+    header = ""
+    for key, value in headers.items():
+        header += f"{key}:{value}\n"
+    return "\n".join([method, sha256(str.encode(body)).hexdigest(), header, url])
+
+
+def generate_signature(msg: str, key: str) -> str:
+    """
+    Generates the signature required to send the request.
+
+    :param msg: hmac.new(msg)
+    :param key: hmac.new(key)
+    :return: hexdigest string
+    """
+    output = (
+        hmac.new(msg=bytes(msg, "latin-1"), key=bytes(key, "latin-1"), digestmod=sha256)
+        .hexdigest()
+        .upper()
+    )
+
+    return output
+
+
+def get_timestamp() -> str:
+    """
+    Return the current timestamp * 1000.
+
+    :return: timestamp * 1000
+    """
+    timestamp = str(int(time() * 1000))
+
+    return timestamp
+
+
+def token_headers(client_id: str, secret_key: str, url: str) -> dict:
+    """
+    Headers for a token request.
+
+    :param client_id: client id
+    :param secret_key: secret key
+    :param url: request path with version. Example: /v1.0/token?grant_type=1
+    :return: headers dict
+    """
+    t = get_timestamp()
+    string_to_sign = generate_string_to_sign("GET", "", {}, url)
+    sign = generate_signature(client_id + t + string_to_sign, secret_key)
+
+    headers = {
+        "client_id": client_id,
+        "secret": secret_key,
+        "sign_method": SIGN_METHOD,
+        "sign": sign,
+        "t": t,
+    }
+
+    return headers
+
+
+def request_headers(
+    client_id: str,
+    secret_key: str,
+    access_token: str,
+    method: str,
+    url: str,
+    body: str = "",
+) -> dict:
+    """
+    Headers for a business request.
+
+    :param client_id: client id
+    :param secret_key: secret key
+    :param access_token: access token
+    :param method: HTTP method. Example: GET; POST
+    :param url: request path with version. Example: /v1.0/devices/{device_id}/status
+    :param body: serialised request body
+    :return: headers dict
+    """
+    t = get_timestamp()
+    string_to_sign = generate_string_to_sign(method, body, {}, url)
+    sign = generate_signature(client_id + access_token + t + string_to_sign, secret_key)
+
+    headers = {
+        "client_id": client_id,
+        "access_token": access_token,
+        "sign_method": SIGN_METHOD,
+        "sign": sign,
+        "t": t,
+    }
+
+    return headers
+
+
+# Content hash of every GET and DELETE request
+EMPTY_BODY_SHA256 = sha256(b"").hexdigest()
+
+
+class Signer:
+    """
+    Signs the requests of one client, the fast path of the functions above.
+
+    The HMAC is keyed once and copied for every signature, client id and
+    secret key are encoded once, the empty body hash is precomputed and
+    headers are built from templates. sign_batch() also shares the
+    timestamp and the HMAC state of the access token between requests.
+
+    :param client_id: client id
+    :param secret_key: secret key
+    """
+
+    __slots__ = ("client_id", "_hmac", "_client", "_token_headers", "_headers")
+
+    def __init__(self, client_id: str, secret_key: str):
+        self.client_id = client_id
+        self._hmac = hmac.new(secret_key.encode("latin-1"), digestmod=sha256)
+        self._client = client_id.encode("latin-1")
+        self._token_headers = {
+            "client_id": client_id,
+            "secret": secret_key,
+            "sign_method": SIGN_METHOD,
+        }
+        self._headers = {"client_id": client_id, "sign_method": SIGN_METHOD}
+
+    @staticmethod
+    def content_hash(body="") -> str:
+        """
+        Hash of a request body, compute it once for all attempts of a request.
+
+        :param body: serialised request body, str or bytes
+        :return: hexdigest string
+        """
+        if not body:
+            return EMPTY_BODY_SHA256
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+
+        return sha256(body).hexdigest()
+
+    @staticmethod
+    def _sign(mac, method: str, content_hash: str, url: str) -> str:
+        """
+        :param mac: HMAC fed with client id, access token and timestamp, it is updated
+        :return: signature
+        """
+        mac.update(f"{method}\n{content_hash}\n\n{url}".encode("latin-1"))
+
+        return mac.hexdigest().upper()
+
+    def _keyed(self, access_token: str, t: str):
+        """
+        :return: copy of the keyed HMAC fed with client id, access token and timestamp
+        """
+        mac = self._hmac.copy()
+        mac.update(self._client + f"{access_token}{t}".encode("latin-1"))
+
+        return mac
+
+    def token_headers(self, url: str) -> dict:
+        """
+        Headers for a token request, see token_headers().
+
+        :param url: request path with version. Example: /v1.0/token?grant_type=1
+        :return: headers dict
+        """
+        t = get_timestamp()
+        sign = self._sign(self._keyed("", t), "GET", EMPTY_BODY_SHA256, url)
+
+        return {**self._token_headers, "sign": sign, "t": t}
+
+    def request_headers(
+        self,
+        access_token: str,
+        method: str,
+        url: str,
+        body="",
+        content_hash: str = None,
+    ) -> dict:
+        """
+        Headers for a business request, see request_headers().
+
+        :param access_token: access token
+        :param method: HTTP method. Example: GET; POST
+        :param url: request path with version. Example: /v1.0/devices/{device_id}/status
+        :param body: serialised request body, str or bytes
+        :param content_hash: content_hash(body), if already known
+        :return: headers dict
+        """
+        t = get_timestamp()
+        if content_hash is None:
+            content_hash = self.content_hash(body)
+        sign = self._sign(self._keyed(access_token, t), method, content_hash, url)
+
+        return {**self._headers, "access_token": access_token, "sign": sign, "t": t}
+
+    def sign_batch(self, access_token: str, requests) -> list:
+        """
+        Headers for many business requests, signed with one timestamp.
+
+        :param access_token: access token
+        :param requests: iterable of (method, url, body) tuples, url with version
+        :return: list of headers dicts, in the order of the requests
+        """
+        t = get_timestamp()
+        keyed = self._keyed(access_token, t)
+        template = {**self._headers, "access_token": access_token, "t": t}
+        # Pipelines often send the same body to many devices
+        hashes = {}
+        signed = []
+
+        for method, url, body in requests:
+            content_hash = hashes.get(body)
+            if content_hash is None:
+                content_hash = hashes[body] = self.content_hash(body)
+            sign = self._sign(keyed.copy(), method, content_hash, url)
+            signed.append({**template, "sign": sign})
+
+        return signed
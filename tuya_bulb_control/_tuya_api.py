@@ -2,171 +2,425 @@
 # -*- coding: utf-8 -*-
 
 
+import re
 import json
-import hmac
-import requests
-from time import time
-from hashlib import sha256
-from .exceptions import AuthorizedError
+import threading
+from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from ._signing import Signer
+from ._utils import API_URL
+from .exceptions import AuthorizedError, RateLimited, RequestError
+from .instrumentation import Instrumentation
+from .ratelimit import RateLimiter, RetryPolicy
+from .tokens import (
+    DEFAULT_REFRESH_MARGIN,
+    Token,
+    TokenStore,
+    default_token_store,
+)
+from .transport import shared_transport
+
+DEFAULT_MAX_WORKERS = 16
+
+_DEVICE_POSTFIX = re.compile(r"/devices/([^/?]+)/")
 
 
 class _TuyaApi:
     """
-    Private class for API requests
+    Private class for API requests.
+
+    The access token is requested on first use and renewed with its refresh
+    token in the background once it is less than refresh_margin seconds away
+    from expiring. Tokens are shared through a token store keyed by
+    (client_id, region_key, base_url), only one renewal runs at a time per store.
+    Safe to use from many threads at once.
     """
 
-    def __init__(self, client_id: str, secret_key: str, region_key: str):
+    def __init__(
+        self,
+        client_id: str,
+        secret_key: str,
+        region_key: str,
+        transport=None,
+        refresh_margin: float = DEFAULT_REFRESH_MARGIN,
+        token_store: TokenStore = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        rate_limiter: RateLimiter = None,
+        retry: RetryPolicy = None,
+        base_url: str = None,
+        instrumentation: Instrumentation = None,
+    ):
         self._client_id = client_id
         self._secret_key = secret_key
         self._region_key = region_key
+        self._signer = Signer(client_id, secret_key)
+        self._transport = (
+            shared_transport(region_key) if transport is None else transport
+        )
+        self._refresh_margin = refresh_margin
+        self._rate_limiter = rate_limiter
+        self._retry = RetryPolicy() if retry is None else retry
+        self._token_store = (
+            default_token_store() if token_store is None else token_store
+        )
 
-        self._base_url = f"https://openapi.tuya{self._region_key}.com/v1.0"
-        self.__sign_method: str = "HMAC-SHA256"
-        self.__access_token = self.__token()
+        if base_url is None:
+            base_url = API_URL.format(region_key=region_key)
+        self._base_url = base_url.rstrip("/") + "/v1.0"
+        self._token_key = (client_id, region_key, self._base_url)
+        self._instrumentation = instrumentation
+        self.__token = None
+        self.__renewing = threading.Lock()
 
-    @staticmethod
-    def __generate_stringToSign(method: str, body: str, headers: dict, url: str):
-        """
-        Generates the stringToSign required to send the request
-        :param msg: hmac.new(msg)
-        :param key: hmac.new(key)
-        :return: a list as a string joined by a '\n'
-        """
-        header = ""
-        for key, value in headers.items():
-            header += f"{key}:{value}\n"
-        return '\n'.join([method, sha256(str.encode(body)).hexdigest(), header, url])
+        self._max_workers = max_workers
+        self.__executor = None
+        self.__executor_lock = threading.Lock()
 
-    @staticmethod
-    def __generate_signature(msg: str, key: str) -> str:
+    @property
+    def executor(self) -> ThreadPoolExecutor:
         """
-        Generates the signature required to send the request.
+        Bounded thread pool used to run requests for many devices at once.
+        Created on first use with max_workers threads.
 
-        :param msg: hmac.new(msg)
-        :param key: hmac.new(key)
-        :return: hexdigest string
+        :return: concurrent.futures.ThreadPoolExecutor
         """
-        output = (
-            hmac.new(
-                msg=bytes(msg, "latin-1"), key=bytes(key, "latin-1"), digestmod=sha256
-            )
-            .hexdigest()
-            .upper()
-        )
+        with self.__executor_lock:
+            if self.__executor is None:
+                self.__executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers,
+                    thread_name_prefix="tuya_bulb_control",
+                )
+
+        return self.__executor
 
-        return output
+    def close(self):
+        """
+        Shut down the thread pool, if it was started.
+        """
+        with self.__executor_lock:
+            if self.__executor is not None:
+                self.__executor.shutdown()
+                self.__executor = None
 
-    @staticmethod
-    def __get_timestamp() -> str:
+    def _fan_out(self, items, function) -> dict:
         """
-        Return the current timestamp * 1000.
+        Call a function for every item on the thread pool.
 
-        :return: timestamp * 1000
+        :param items: hashable items, e.g. device ids
+        :param function: function taking an item
+        :return: dict by item with the result or the raised exception
         """
-        timestamp = str(int(time() * 1000))
+        if self._instrumentation is not None:
+            function = self._instrumentation.bind(function)
 
-        return timestamp
+        futures = {item: self.executor.submit(function, item) for item in items}
+        results = {}
 
-    def __request_template(self, url, method, body: str = "") -> dict:
+        for item, future in futures.items():
+            try:
+                results[item] = future.result()
+            except Exception as exc:
+                results[item] = exc
+
+        return results
+
+    def __request_template(
+        self, url, method, body: str = "", token=None, content_hash: str = None
+    ) -> dict:
         """
         Default request type.
 
+        :param token: token to sign with. Default: the current token
+        :param content_hash: hash of the body, computed once for all attempts
         :return: default headers
         """
-        t = self.__get_timestamp()
-        stringToSign = self.__generate_stringToSign(method, body if isinstance(body,str) else json.dumps(body), {}, "/v1.0"+url)
-        sign = self.__generate_signature(
-            self._client_id + self.__access_token + t + stringToSign, self._secret_key
+        token = self.__valid_token() if token is None else token
+        default_headers = self._signer.request_headers(
+            access_token=token.access_token,
+            method=method,
+            url="/v1.0" + url,
+            body=body if isinstance(body, str) else json.dumps(body),
+            content_hash=content_hash,
         )
 
-        default_headers = {
-            "client_id": self._client_id,
-            "access_token": self.__access_token,
-            "sign_method": self.__sign_method,
-            "sign": sign,
-            "t": t,
-        }
-
         return default_headers
 
-    def __token(self) -> str:
+    def sign_requests(self, requests) -> list:
+        """
+        Sign many requests at once, with one timestamp, to send them through
+        your own HTTP pipeline. Signatures stay valid for a few minutes.
+
+        :param requests: iterable of (method, postfix, body) tuples, body a dict or None.
+            Example: ("POST", "/devices/{device_id}/commands", {"commands": [...]})
+        :return: list of (method, url, headers, data) tuples, data None without body
+        """
+        requests = [
+            (method, postfix, None if body is None else json.dumps(body))
+            for method, postfix, body in requests
+        ]
+        signed = self._signer.sign_batch(
+            self.__valid_token().access_token,
+            (
+                (method, "/v1.0" + postfix, data or "")
+                for method, postfix, data in requests
+            ),
+        )
+
+        return [
+            (method, self._base_url + postfix, headers, data)
+            for (method, postfix, data), headers in zip(requests, signed)
+        ]
+
+    def __token_request(self, sign_url: str) -> Token:
         """
-        Get the access token.
+        Request a token.
 
-        :return: access token
+        :param sign_url: token address. Example: /token?grant_type=1
+        :return: token
         """
-        t = self.__get_timestamp()
-        sign_url = "/token?grant_type=1"
-        uri = self._base_url + sign_url
-        string_to_sign = self.__generate_stringToSign("GET", "", {}, "/v1.0"+sign_url)
-        sign = self.__generate_signature(self._client_id + t + string_to_sign, self._secret_key)
+        if self._instrumentation is not None:
+            self._instrumentation.count(
+                "token_grants" if sign_url.startswith("/token?") else "token_refreshes"
+            )
+
+        response = self.__send(
+            "GET",
+            sign_url,
+            lambda: self._signer.token_headers("/v1.0" + sign_url),
+        )
 
-        headers_pattern = {
-            "client_id": self._client_id,
-            "secret": self._secret_key,
-            "sign_method": self.__sign_method,
-            "sign": sign,
-            "t": t,
-        }
+        if not response["success"]:
+            raise AuthorizedError(
+                target=response["code"], msg=str(response["msg"]).capitalize()
+            )
 
         try:
-            response = requests.get(uri, headers=headers_pattern).json()
-        except Exception:
-            raise Exception
-        else:
-            if not response["success"]:
-                raise AuthorizedError(
-                    target=response["code"], msg=str(response["msg"]).capitalize()
+            token = Token.from_result(response["result"])
+        except KeyError:
+            raise KeyError("Failed to get access_token")
+
+        return token
+
+    def __send(self, method: str, postfix: str, make_headers, data: str = None):
+        """
+        Send a request through the rate limiter, retrying throttled and failed
+        attempts according to the retry policy.
+
+        :param method: HTTP method. Example: GET; POST
+        :param postfix: request address. Example: /device/{device_id}/commands
+        :param make_headers: function returning fresh signed headers
+        :param data: serialised request body
+        :raise tuya_bulb_control.exceptions.RequestError: if the request failed
+        :raise tuya_bulb_control.exceptions.RateLimited: if still throttled after the retries
+        :return: response dict
+        """
+        uri = self._base_url + postfix
+        match = _DEVICE_POSTFIX.match(postfix)
+        device_id = match.group(1) if match else None
+        instrumentation = self._instrumentation
+        attempt = 0
+
+        while True:
+            call = None
+            if instrumentation is not None:
+                call = instrumentation.start(method, postfix, attempt)
+
+            waited = 0.0
+            if self._rate_limiter is not None:
+                waited = self._rate_limiter.acquire(device_id)
+
+            retry = attempt < self._retry.retries
+            headers = make_headers()
+            if call is not None:
+                instrumentation.signed(call, waited)
+
+            try:
+                http_response = self._transport.request(
+                    method, uri, headers=headers, data=data
                 )
+            except OSError as exc:
+                if call is not None:
+                    instrumentation.finish(call, error=exc)
+                if not retry:
+                    raise RequestError(target=uri, msg=str(exc)) from exc
+            else:
+                status = getattr(http_response, "status_code", 200)
+                try:
+                    response = http_response.json()
+                except ValueError as exc:
+                    if call is not None:
+                        instrumentation.finish(call, status=status, error=exc)
+                    if not retry or status not in self._retry.statuses:
+                        raise RequestError(
+                            target=uri, msg=f"Invalid response, HTTP {status}"
+                        ) from exc
+                else:
+                    throttled = self._retry.is_throttled(response)
+                    if call is not None:
+                        instrumentation.finish(
+                            call, status=status, response=response, throttled=throttled
+                        )
+                    if throttled and not retry:
+                        raise RateLimited(target=uri)
+                    if not retry or not (status in self._retry.statuses or throttled):
+                        return response
+
+            delay = self._retry.delay(attempt)
+            if call is not None:
+                instrumentation.retrying(delay)
+            sleep(delay)
+            attempt += 1
+
+    def __renew(self, stale: Token = None) -> Token:
+        """
+        Get a new token from the store, or renew it with its refresh token,
+        or grant a new one.
+
+        :param stale: token that must be replaced
+        :return: new token
+        """
+        with self._token_store.lock(self._token_key):
+            token = self._token_store.get(self._token_key)
+
+            # Another client renewed the token while we were waiting
+            if (
+                token is not None
+                and (stale is None or token.access_token != stale.access_token)
+                and token.expires_in() > self._refresh_margin
+            ):
+                self.__token = token
+                return token
 
+            token = token or stale
+            new_token = None
+
+            if token is not None and token.refresh_token:
+                try:
+                    new_token = self.__token_request(f"/token/{token.refresh_token}")
+                except AuthorizedError:
+                    pass
+
+            if new_token is None:
+                new_token = self.__token_request("/token?grant_type=1")
+
+            self._token_store.set(self._token_key, new_token)
+            self.__token = new_token
+
+        return new_token
+
+    def __renew_in_background(self):
+        """
+        Start renewing the token in a background thread, unless one is running.
+        """
+        if not self.__renewing.acquire(blocking=False):
+            return
+
+        stale = self.__token
+
+        def renew():
             try:
-                token = response["result"]["access_token"]
-            except KeyError:
-                raise KeyError("Failed to get access_token")
+                self.__renew(stale)
+            except Exception:
+                # The token is still valid, the next request will try again
+                pass
+            finally:
+                self.__renewing.release()
 
-            return token
+        threading.Thread(target=renew, daemon=True).start()
 
-    def _get(self, postfix: str, check_token: bool = True) -> dict:
+    def __valid_token(self) -> Token:
         """
-        Performs a GET request at the specified address.
+        Get a valid token, requesting or renewing it when needed.
 
+        :return: token
+        """
+        token = self.__token
+
+        if token is None or token.expires_in() <= 0:
+            token = self.__renew(token)
+        elif token.expires_in() <= self._refresh_margin:
+            self.__renew_in_background()
+
+        return token
+
+    def _request(
+        self, method: str, postfix: str, body=None, check_token: bool = True
+    ) -> dict:
+        """
+        Performs a request at the specified address, renewing the token and
+        trying once more if the API rejects it.
+
+        :param method: HTTP method. Example: GET; POST
         :param postfix: request address. Example: /device/{device_id}/commands
+        :param body: request body. Default: no body
+        :raise tuya_bulb_control.exceptions.RequestError: if the request failed
         :return: response dict
         """
-        uri = self._base_url + postfix
-        headers = self.__request_template(postfix, "GET")
+        data = content_hash = None
+        if body is not None:
+            data = json.dumps(body)
+            content_hash = self._signer.content_hash(data)
+
+        token = self.__valid_token()
+        response = self.__send(
+            method,
+            postfix,
+            lambda: self.__request_template(
+                postfix, method, data or "", token=token, content_hash=content_hash
+            ),
+            data,
+        )
 
-        try:
-            response = requests.get(uri, headers=headers).json()
-            if check_token and not response["success"] and response['code'] == 1010:
-                self.__access_token = self.__token()
-                return self._get(postfix, False)
-        except Exception:
-            raise Exception
+        if check_token and not response["success"] and response["code"] == 1010:
+            if self._instrumentation is not None:
+                self._instrumentation.count("token_retries")
+            self.__renew(token)
+            return self._request(method, postfix, body, False)
 
         return response
 
+    def _get(self, postfix: str, check_token: bool = True) -> dict:
+        """
+        Performs a GET request at the specified address.
+
+        :param postfix: request address. Example: /device/{device_id}/commands
+        :raise tuya_bulb_control.exceptions.RequestError: if the request failed
+        :return: response dict
+        """
+        return self._request("GET", postfix, check_token=check_token)
+
     def _post(self, postfix: str, body=None, check_token: bool = True) -> dict:
         """
         Performs a POST request at specified address.
 
         :param postfix: request address. Example: /device/{device_id}/commands
         :param body: request body
+        :raise tuya_bulb_control.exceptions.RequestError: if the request failed
         :return: response dict
         """
-        if body is None:
-            body = {}
+        return self._request(
+            "POST", postfix, {} if body is None else body, check_token=check_token
+        )
 
-        body = json.dumps(body)
-        uri = self._base_url + postfix
-        headers = self.__request_template(postfix, "POST", body)
+    def _put(self, postfix: str, body=None, check_token: bool = True) -> dict:
+        """
+        Performs a PUT request at specified address.
 
-        try:
-            response = requests.post(uri, headers=headers, data=body).json()
-            if check_token and not response["success"] and response['code'] == 1010:
-                self.__access_token = self.__token()
-                return self._post(postfix, body, False)
-        except Exception:
-            raise Exception
+        :param postfix: request address. Example: /device-groups/{device_group_id}
+        :param body: request body
+        :raise tuya_bulb_control.exceptions.RequestError: if the request failed
+        :return: response dict
+        """
+        return self._request(
+            "PUT", postfix, {} if body is None else body, check_token=check_token
+        )
 
-        return response
+    def _delete(self, postfix: str, check_token: bool = True) -> dict:
+        """
+        Performs a DELETE request at the specified address.
+
+        :param postfix: request address. Example: /device-groups/{device_group_id}
+        :raise tuya_bulb_control.exceptions.RequestError: if the request failed
+        :return: response dict
+        """
+        return self._request("DELETE", postfix, check_token=check_token)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# The batch status endpoint accepts at most this many device ids per request
+MAX_DEVICE_IDS = 20
+
+# API address by region key
+API_URL = "https://openapi.tuya{region_key}.com"
+
+
+def chunks(items: list, size: int):
+    """
+    Split a list into consecutive chunks.
+
+    :param items: list to split
+    :param size: max chunk size
+    :return: generator of lists
+    """
+    for index in range(0, len(items), size):
+        yield items[index : index + size]
+
+
+def status_dict(status: list) -> dict:
+    """
+    Convert an API status list to a dict.
+
+    :param status: list of {"code": ..., "value": ...} dicts
+    :return: dict by code
+    """
+    return {item["code"]: item["value"] for item in status if "code" in item}
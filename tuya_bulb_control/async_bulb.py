@@ -0,0 +1,707 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import asyncio
+from ._signing import Signer
+from ._utils import API_URL, MAX_DEVICE_IDS, chunks, status_dict
+from .cache import FunctionsCache
+from .colour import colour_value, rgb_to_hsv
+from .exceptions import (
+    ArgumentError,
+    AuthorizedError,
+    FunctionNotSupported,
+    ModeNotSupported,
+    ValueNotInRange,
+)
+from .schema import Schema, SchemaCache, check_value, percent_value
+from .tokens import DEFAULT_REFRESH_MARGIN, Token
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+DEFAULT_CONCURRENCY = 50
+
+
+class _AsyncTuyaApi:
+    """
+    Private class for asyncio API requests
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        secret_key: str,
+        region_key: str,
+        session=None,
+        timeout: float = 10,
+        refresh_margin: float = DEFAULT_REFRESH_MARGIN,
+        base_url: str = None,
+    ):
+        if session is None and aiohttp is None:
+            raise ImportError(
+                "AsyncBulb requires aiohttp: pip install tuya_bulb_control[async]"
+            )
+
+        self._client_id = client_id
+        self._secret_key = secret_key
+        self._region_key = region_key
+        self._signer = Signer(client_id, secret_key)
+        self._session = session
+        self._own_session = session is None
+        self._timeout = timeout
+        self._refresh_margin = refresh_margin
+
+        if base_url is None:
+            base_url = API_URL.format(region_key=region_key)
+        self._base_url = base_url.rstrip("/") + "/v1.0"
+        self.__access_token = None
+        self.__token_lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the HTTP session if it was created by this client.
+        """
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def __get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self._timeout)
+            )
+
+        return self._session
+
+    async def __fetch(self, method: str, uri: str, headers: dict, data: str = None):
+        async with self.__get_session().request(
+            method, uri, headers=headers, data=data
+        ) as response:
+            return await response.json(content_type=None)
+
+    async def __token(self, expired: str = None) -> str:
+        """
+        Get a valid access token.
+        Requested on first use and renewed with the refresh token once it is
+        less than refresh_margin seconds away from expiring.
+        Only one request is made when several coroutines need a token at once.
+
+        :param expired: token rejected by the API, renew it
+        :return: access token
+        """
+        token = self.__access_token
+        if (
+            token is not None
+            and token.access_token != expired
+            and token.expires_in() > self._refresh_margin
+        ):
+            return token.access_token
+
+        if self.__token_lock is None:
+            self.__token_lock = asyncio.Lock()
+
+        async with self.__token_lock:
+            token = self.__access_token
+            if token is not None and token.access_token != expired:
+                if token.expires_in() > self._refresh_margin:
+                    return token.access_token
+
+            if token is not None and token.refresh_token:
+                try:
+                    self.__access_token = await self.__token_request(
+                        f"/token/{token.refresh_token}"
+                    )
+                    return self.__access_token.access_token
+                except AuthorizedError:
+                    pass
+
+            self.__access_token = await self.__token_request("/token?grant_type=1")
+
+            return self.__access_token.access_token
+
+    async def __token_request(self, sign_url: str) -> Token:
+        """
+        Request a token.
+
+        :param sign_url: token address. Example: /token?grant_type=1
+        :return: token
+        """
+        headers = self._signer.token_headers("/v1.0" + sign_url)
+        response = await self.__fetch("GET", self._base_url + sign_url, headers)
+
+        if not response["success"]:
+            raise AuthorizedError(
+                target=response["code"], msg=str(response["msg"]).capitalize()
+            )
+
+        try:
+            token = Token.from_result(response["result"])
+        except KeyError:
+            raise KeyError("Failed to get access_token")
+
+        return token
+
+    async def _request(
+        self, method: str, postfix: str, body=None, check_token: bool = True
+    ) -> dict:
+        """
+        Performs a request at the specified address.
+
+        :param method: HTTP method. Example: GET; POST
+        :param postfix: request address. Example: /device/{device_id}/commands
+        :param body: request body
+        :return: response dict
+        """
+        data = None if body is None else json.dumps(body)
+        access_token = await self.__token()
+        headers = self._signer.request_headers(
+            access_token=access_token,
+            method=method,
+            url="/v1.0" + postfix,
+            body=data or "",
+        )
+
+        response = await self.__fetch(method, self._base_url + postfix, headers, data)
+
+        if check_token and not response["success"] and response["code"] == 1010:
+            await self.__token(expired=access_token)
+            return await self._request(method, postfix, body, False)
+
+        return response
+
+    async def _get(self, postfix: str) -> dict:
+        """
+        Performs a GET request at the specified address.
+
+        :param postfix: request address. Example: /device/{device_id}/status
+        :return: response dict
+        """
+        return await self._request("GET", postfix)
+
+    async def _post(self, postfix: str, body=None) -> dict:
+        """
+        Performs a POST request at specified address.
+
+        :param postfix: request address. Example: /device/{device_id}/commands
+        :param body: request body
+        :return: response dict
+        """
+        return await self._request("POST", postfix, {} if body is None else body)
+
+
+class AsyncBulb(_AsyncTuyaApi):
+    """
+    Asyncio counterpart of tuya_bulb_control.Bulb.
+    Requires aiohttp: pip install tuya_bulb_control[async]
+
+    Example:
+        async with AsyncBulb(CLIENT_ID, SECRET_KEY, REGION_KEY) as bulb:
+            await bulb.apply(device_ids, [{"code": "switch_led", "value": False}])
+
+    :param client_id: your client id
+    :param secret_key: your secret key
+    :param region_key: your region key. Example: cn; us; eu; in
+    :param device_id: your device id
+    :param session: aiohttp.ClientSession to use. Default: created on first request
+    :param timeout: total request timeout in seconds
+    :param functions_cache: cache for device functions used by check=True.
+        Default: in-memory tuya_bulb_control.cache.FunctionsCache()
+    :param concurrency: max number of requests in flight for apply() and gather_state()
+    :param refresh_margin: renew the access token this many seconds before it expires
+    :param base_url: API address, e.g. of tuya_bulb_control.testing.MockTuyaServer.
+        Default: by region_key
+    :param schema_cache: compiled validators shared by devices of a product,
+        tuya_bulb_control.schema.SchemaCache. Default: one per AsyncBulb
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        secret_key: str,
+        region_key: str,
+        device_id: str = None,
+        session=None,
+        timeout: float = 10,
+        functions_cache: FunctionsCache = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        refresh_margin: float = DEFAULT_REFRESH_MARGIN,
+        base_url: str = None,
+        schema_cache: SchemaCache = None,
+    ):
+        super().__init__(
+            client_id=client_id,
+            secret_key=secret_key,
+            region_key=region_key,
+            session=session,
+            timeout=timeout,
+            refresh_margin=refresh_margin,
+            base_url=base_url,
+        )
+        self._device_id = device_id
+        self._functions_cache = (
+            FunctionsCache() if functions_cache is None else functions_cache
+        )
+        self._concurrency = concurrency
+        self._schemas = SchemaCache() if schema_cache is None else schema_cache
+
+    def _check_device_id(self, device_id: str) -> str:
+        """
+        Check device id.
+
+        :param device_id: device id
+        :return: current device id
+        :raise ArgumentError: if device_id is empty
+        """
+        device_id = self._device_id if device_id is None else device_id
+
+        if not device_id:
+            raise ArgumentError(
+                target=device_id, msg="Argument device_id must not be empty."
+            )
+
+        return device_id
+
+    async def _schema(self, device_id: str, fetch: bool = True) -> Schema:
+        """
+        Get the compiled schema of a device. Served from the functions cache,
+        or from another device of the same product, before any request.
+
+        :param device_id: device id
+        :param fetch: request the functions if the schema is not known
+        :return: schema, or None if not known and fetch is False
+        """
+        schema = self._schemas.lookup(device_id, self._functions_cache)
+        if schema is not None or not fetch:
+            return schema
+
+        functions = await self.functions(device_id=device_id)
+
+        return self._schemas.compile(functions, device_id)
+
+    async def _percent(
+        self, code_name: str, percent, check: bool, device_id: str
+    ) -> int:
+        """
+        Convert a percentage to a device value by the range in the schema.
+        Without check, the schema is used only if it is known already.
+
+        :param code_name: function name
+        :param percent: percentage
+        :param check: check if your device supports this function
+        :param device_id: device id
+        :raise FunctionNotSupported: if function not supported
+        :raise tuya_bulb_control.exceptions.ValueNotInRange: if the value is out of range
+        :return: device value
+        """
+        schema = await self._schema(device_id, fetch=check)
+        if check:
+            schema.get(code_name)
+
+        return percent_value(code_name, percent, schema)
+
+    async def _validate(self, code_name: str, value, check: bool, device_id: str):
+        """
+        Check a value against the device schema.
+        Without check, the schema is used only if it is known already,
+        and the usual range of the code otherwise.
+
+        :param code_name: function name
+        :param value: device value
+        :param check: check if your device supports this function
+        :param device_id: device id
+        :raise FunctionNotSupported: if function not supported
+        :raise tuya_bulb_control.exceptions.ValueNotInRange: if the value is not accepted
+        :return: value
+        """
+        schema = await self._schema(device_id, fetch=check)
+        if check:
+            return schema.validate(code_name, value)
+
+        return check_value(code_name, value, schema)
+
+    async def _template(
+        self, value, code_name: str, check: bool, device_id: str
+    ) -> dict:
+        """
+        Send a single command.
+
+        :param value: value
+        :param code_name: function name
+        :param check: check if your device supports this function
+        :param device_id: device id
+        :return: response dict
+        """
+        device_id = self._check_device_id(device_id)
+        await self._validate(code_name, value, check=check, device_id=device_id)
+
+        response = await self.send_commands(
+            commands=[{"code": code_name, "value": value}], device_id=device_id
+        )
+
+        return response
+
+    async def _fan_out(self, device_ids, coroutine_function) -> dict:
+        """
+        Run a coroutine for every device with bounded concurrency.
+
+        :param device_ids: device ids
+        :param coroutine_function: async function taking a device id
+        :return: dict by device id with the result or the raised exception
+        """
+        device_ids = list(device_ids)
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def run(device_id):
+            async with semaphore:
+                return await coroutine_function(device_id)
+
+        results = await asyncio.gather(
+            *[run(device_id) for device_id in device_ids], return_exceptions=True
+        )
+
+        return dict(zip(device_ids, results))
+
+    async def send_commands(self, commands: list, device_id: str = None) -> dict:
+        """
+        Send several commands in one request.
+
+        :param commands: list of {"code": ..., "value": ...} dicts
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :return: response dict
+        """
+        device_id = self._check_device_id(device_id)
+        response = await self._post(
+            f"/devices/{device_id}/commands", body={"commands": commands}
+        )
+
+        return response
+
+    async def set_work_mode(
+        self, mode_name: str, check: bool = True, device_id: str = None
+    ) -> dict:
+        """
+        Select work mode.
+        Uses code: work_mode
+
+        :param mode_name: mode name. For example: white; colour; scene; music
+        :param check: check if your device supports this mode
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :raise tuya_bulb_control.exceptions.ModeNotSupported: if work mode doesn't exist
+        :return: response dict
+        """
+        code_name = "work_mode"
+        device_id = self._check_device_id(device_id)
+
+        try:
+            await self._validate(code_name, mode_name, check=check, device_id=device_id)
+        except ValueNotInRange:
+            raise ModeNotSupported(target=mode_name)
+
+        response = await self.send_commands(
+            commands=[{"code": code_name, "value": mode_name}], device_id=device_id
+        )
+
+        return response
+
+    async def set_colour(
+        self, rgb: tuple, check: bool = True, device_id: str = None
+    ) -> dict:
+        """
+        Colour mode settings.
+        Uses code: colour_data
+
+        :param rgb: rgb coordinates
+        :param check: check if your device supports this function
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :raise tuya_bulb_control.exceptions.ValueNotInRange: if the value is out of range
+        :return: response dict
+        """
+        hsv = rgb_to_hsv([rgb], version=1, use_numpy=False)[0]
+
+        response = await self._template(
+            value=colour_value(hsv),
+            code_name="colour_data",
+            check=check,
+            device_id=device_id,
+        )
+
+        return response
+
+    async def set_colour_v2(
+        self, rgb: tuple, check: bool = True, device_id: str = None
+    ) -> dict:
+        """
+        Colour mode settings.
+        Uses code: colour_data_v2
+
+        :param rgb: rgb coordinates
+        :param check: check if your device supports this function
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :return: response dict
+        """
+        hsv = rgb_to_hsv([rgb], version=2, use_numpy=False)[0]
+
+        response = await self._template(
+            value=colour_value(hsv),
+            code_name="colour_data_v2",
+            check=check,
+            device_id=device_id,
+        )
+
+        return response
+
+    async def set_toggle(
+        self, state: bool = None, check: bool = True, device_id: str = None
+    ) -> dict:
+        """
+        Turn ON or OFF the bulb.
+        Uses code: switch_led
+
+        :param state: explicit status indication
+        :param check: check if your device supports this function
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :return: response dict
+        """
+        code_name = "switch_led"
+
+        if state is None:
+            state = not await self.current_value(
+                code_name=code_name, device_id=device_id
+            )
+
+        response = await self._template(
+            value=state, code_name=code_name, check=check, device_id=device_id
+        )
+
+        return response
+
+    async def set_toggle_timer(
+        self, value: int, check: bool = True, device_id: str = None
+    ) -> dict:
+        """
+        On or Off this device by timer.
+        Uses code: countdown_1
+
+        :param value: minutes. From 0-1440 (24 hours). To cancel the timer, pass value=0
+        :param check: check if your device supports this function
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :raise tuya_bulb_control.exceptions.ValueNotInRange: if the value is out of range
+        :return: response dict
+        """
+        response = await self._template(
+            value=value * 60,  # To seconds
+            code_name="countdown_1",
+            check=check,
+            device_id=device_id,
+        )
+
+        return response
+
+    async def turn_on(self, check: bool = True, device_id: str = None) -> dict:
+        """
+        Turn ON the bulb.
+        Uses code: switch_led
+
+        :param check: check if your device supports this function
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :return: response dict
+        """
+        return await self.set_toggle(state=True, check=check, device_id=device_id)
+
+    async def turn_off(self, check: bool = True, device_id: str = None) -> dict:
+        """
+        Turn OFF the bulb.
+        Uses code: switch_led
+
+        :param check: check if your device supports this function
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :return: response dict
+        """
+        return await self.set_toggle(state=False, check=check, device_id=device_id)
+
+    async def set_colour_temp(
+        self, value: int, check: bool = True, device_id: str = None
+    ) -> dict:
+        """
+        Colour temperature.
+        Uses code: temp_value
+
+        :param value: device value, usually 25-255. For example: 25 = warm or 255 = cold
+        :param check: check if your device supports this function
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :raise tuya_bulb_control.exceptions.ValueNotInRange: if the value is out of range
+        :return: response dict
+        """
+        response = await self._template(
+            value=value, code_name="temp_value", check=check, device_id=device_id
+        )
+
+        return response
+
+    async def set_colour_temp_v2(
+        self, value: int, check: bool = True, device_id: str = None
+    ) -> dict:
+        """
+        Colour temperature.
+        Uses code: temp_value_v2
+
+        :param value: percentage from 0-100. For example: 0 = warm or 100 = cold
+        :param check: check if your device supports this function
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :return: response dict
+        """
+        code_name = "temp_value_v2"
+        device_id = self._check_device_id(device_id)
+        value = await self._percent(code_name, value, check=check, device_id=device_id)
+
+        response = await self.send_commands(
+            commands=[{"code": code_name, "value": value}], device_id=device_id
+        )
+
+        return response
+
+    async def set_bright(
+        self, value: int, check: bool = True, device_id: str = None
+    ) -> dict:
+        """
+        Brightness level.
+        Uses code: bright_value
+
+        :param value: device value, usually 25-255
+        :param check: check if your device supports this function
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :raise tuya_bulb_control.exceptions.ValueNotInRange: if the value is out of range
+        :return: response dict
+        """
+        response = await self._template(
+            value=value, code_name="bright_value", check=check, device_id=device_id
+        )
+
+        return response
+
+    async def set_bright_v2(
+        self, value: int, check: bool = True, device_id: str = None
+    ) -> dict:
+        """
+        Brightness level. v2 only.
+        Uses code: bright_value_v2
+
+        :param value: percentage from 1-100
+        :param check: check if your device supports this function
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :return: response dict
+        """
+        code_name = "bright_value_v2"
+        device_id = self._check_device_id(device_id)
+        value = await self._percent(code_name, value, check=check, device_id=device_id)
+
+        response = await self.send_commands(
+            commands=[{"code": code_name, "value": value}], device_id=device_id
+        )
+
+        return response
+
+    async def state(self, device_id: str = None) -> list:
+        """
+        Get all current state of the bulb.
+
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :return: response status list
+        """
+        device_id = self._check_device_id(device_id)
+        response = (await self._get(f"/devices/{device_id}/status"))["result"]
+
+        return response
+
+    async def functions(self, device_id: str = None, refresh: bool = False) -> list:
+        """
+        Get all available functions for this bulb.
+        The result is cached, see AsyncBulb(functions_cache).
+
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :param refresh: ignore the cache and fetch the functions again
+        :return: response functions list
+        """
+        device_id = self._check_device_id(device_id)
+
+        response = None if refresh else self._functions_cache.get(device_id)
+        if response is None:
+            response = (await self._get(f"/devices/{device_id}/functions"))[
+                "result"
+            ]["functions"]
+            self._functions_cache.set(device_id, response)
+
+        return response
+
+    async def current_value(self, code_name: str, device_id: str = None):
+        """
+        Get value the selected function.
+
+        :param code_name: name to find
+        :param device_id: select device_id for this action only. AsyncBulb(device_id) will be ignored
+        :return: value
+        """
+        try:
+            value = status_dict(await self.state(device_id))[code_name]
+        except KeyError:
+            raise FunctionNotSupported(target=code_name)
+
+        return value
+
+    async def states(self, device_ids, chunk_size: int = MAX_DEVICE_IDS) -> dict:
+        """
+        Get the current state of many devices.
+        Uses one request per chunk_size devices, chunks are fetched concurrently.
+
+        :param device_ids: device ids
+        :param chunk_size: device ids per request. Default: the API maximum
+        :return: dict by device id with {code: value} dicts
+        """
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def fetch(chunk):
+            async with semaphore:
+                postfix = f"/devices/status?device_ids={','.join(chunk)}"
+                return (await self._get(postfix))["result"]
+
+        results = await asyncio.gather(
+            *[fetch(chunk) for chunk in chunks(list(device_ids), chunk_size)]
+        )
+
+        return {
+            item["id"]: status_dict(item["status"])
+            for result in results
+            for item in result
+        }
+
+    async def apply(self, device_ids, commands: list) -> dict:
+        """
+        Send the same commands to many devices concurrently.
+
+        :param device_ids: device ids
+        :param commands: list of {"code": ..., "value": ...} dicts
+        :return: dict by device id with the response or the raised exception
+        """
+
+        async def send(device_id):
+            return await self.send_commands(commands=commands, device_id=device_id)
+
+        return await self._fan_out(device_ids, send)
+
+    async def gather_state(self, device_ids) -> dict:
+        """
+        Get the state of many devices concurrently.
+
+        :param device_ids: device ids
+        :return: dict by device id with the status list or the raised exception
+        """
+        return await self._fan_out(device_ids, self.state)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+class CommandBatch:
+    """
+    Collects commands and sends them as one request per device.
+
+    Use it through tuya_bulb_control.Bulb.batch(). While the batch is active,
+    setters called from the same thread (set_colour_v2, turn_on, ...) are
+    collected instead of being sent and return None.
+    A code set twice keeps only its latest value.
+
+    :param bulb: tuya_bulb_control.Bulb instance
+    :param device_id: default device id for this batch
+    :param check: check that every code is supported by the device before sending
+    """
+
+    def __init__(self, bulb, device_id: str = None, check: bool = True):
+        self._bulb = bulb
+        self._device_id = device_id
+        self._check = check
+        self._commands = {}
+        self.responses = {}
+
+    def __enter__(self):
+        self._bulb._batches.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._bulb._batches.remove(self)
+
+        if exc_type is None:
+            self.send()
+        else:
+            self.clear()
+
+    def __len__(self):
+        return sum(len(commands) for commands in self._commands.values())
+
+    @property
+    def response(self) -> dict:
+        """
+        Response of the last sent request.
+        Use responses for batches that target several devices.
+
+        :return: response dict or None
+        """
+        if not self.responses:
+            return None
+
+        return list(self.responses.values())[-1]
+
+    def add(self, code_name: str, value, device_id: str = None):
+        """
+        Add a command to the batch.
+
+        :param code_name: function name
+        :param value: value
+        :param device_id: select device_id for this command only
+        :return: this batch
+        """
+        device_id = self._bulb._check_device_id(
+            self._device_id if device_id is None else device_id
+        )
+        self._commands.setdefault(device_id, {})[code_name] = value
+
+        return self
+
+    def commands(self, device_id: str = None) -> list:
+        """
+        Get the collected commands of a device.
+
+        :param device_id: device id
+        :return: commands list
+        """
+        device_id = self._bulb._check_device_id(
+            self._device_id if device_id is None else device_id
+        )
+
+        return [
+            {"code": code_name, "value": value}
+            for code_name, value in self._commands.get(device_id, {}).items()
+        ]
+
+    def clear(self):
+        """
+        Drop all collected commands.
+        """
+        self._commands.clear()
+
+    def send(self) -> dict:
+        """
+        Validate and send the collected commands, one request per device.
+
+        :raise tuya_bulb_control.exceptions.FunctionNotSupported: if a code is not supported
+        :return: responses dict by device id
+        """
+        instrumentation = self._bulb._instrumentation
+        if instrumentation is None:
+            return self._send()
+
+        with instrumentation.operation("batch"):
+            return self._send()
+
+    def _send(self) -> dict:
+        if self._check:
+            for device_id, commands in self._commands.items():
+                for code_name in commands:
+                    self._bulb._function_exists(
+                        code_name=code_name, device_id=device_id
+                    )
+
+        for device_id in list(self._commands):
+            self.responses[device_id] = self._bulb._send_commands(
+                commands=self.commands(device_id), device_id=device_id
+            )
+            del self._commands[device_id]
+
+        return self.responses
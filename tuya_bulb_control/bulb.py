@@ -2,9 +2,31 @@
 # -*- coding: utf-8 -*-
 
 import json
-import colorsys
-from ._tuya_api import _TuyaApi
-from .exceptions import ModeNotSupported, FunctionNotSupported, ArgumentError
+import threading
+from time import time
+from ._tuya_api import DEFAULT_MAX_WORKERS, _TuyaApi
+from ._utils import MAX_DEVICE_IDS, chunks, status_dict
+from .batch import CommandBatch
+from .cache import FunctionsCache, StateCache
+from .colour import colour_commands, colour_value, rgb_to_hsv
+from .desired import desired_values, diff_commands
+from .events import EventSource, PulsarSource, Subscriber
+from .instrumentation import Instrumentation, instrumented
+from .exceptions import (
+    ModeNotSupported,
+    FunctionNotSupported,
+    ArgumentError,
+    LocalError,
+    DeviceOffline,
+    ValueNotInRange,
+)
+from .online import OFFLINE_CODE, OnlineTracker
+from .ratelimit import RateLimiter, RetryPolicy
+from .schema import Schema, SchemaCache, check_value, percent_value
+from .snapshot import RESTORE_CODES, Snapshot, restore_commands
+from .tokens import DEFAULT_REFRESH_MARGIN, TokenStore
+
+_MISSING = object()
 
 
 class Bulb(_TuyaApi):
@@ -15,15 +37,104 @@ class Bulb(_TuyaApi):
     :param secret_key: your secret key
     :param region_key: your region key. Example: cn; us; eu; in
     :param device_id: your device id
+    :param transport: transport for API requests.
+        Default: the shared tuya_bulb_control.transport.shared_transport(region_key)
+    :param functions_cache: cache for device functions used by check=True.
+        Default: in-memory tuya_bulb_control.cache.FunctionsCache()
+    :param state_cache: serve current_value() and set_toggle() from a local
+        tuya_bulb_control.cache.StateCache while it is fresh. Default: disabled
+    :param refresh_margin: renew the access token this many seconds before it expires
+    :param token_store: tuya_bulb_control.tokens.TokenStore shared by clients of the
+        same client_id, region_key and base_url.
+        Default: one in-memory store per process
+    :param max_workers: threads used by apply() and gather_state()
+    :param rate_limiter: tuya_bulb_control.ratelimit.RateLimiter for all requests.
+        Default: no limit
+    :param retry: tuya_bulb_control.ratelimit.RetryPolicy for throttled and failed requests.
+        Default: RetryPolicy()
+    :param local_devices: list of tuya_bulb_control.local.LocalDevice controlled over
+        the LAN, with the cloud API as a fallback
+    :param online_tracker: skip or defer commands to offline devices with a
+        tuya_bulb_control.online.OnlineTracker. Default: disabled
+    :param base_url: API address, e.g. of tuya_bulb_control.testing.MockTuyaServer.
+        Default: by region_key
+    :param instrumentation: count and time the requests of every method with a
+        tuya_bulb_control.instrumentation.Instrumentation. Default: disabled
+    :param schema_cache: compiled validators shared by devices of a product,
+        tuya_bulb_control.schema.SchemaCache. Default: one per Bulb
     """
 
     def __init__(
-        self, client_id: str, secret_key: str, region_key: str, device_id: str = None
+        self,
+        client_id: str,
+        secret_key: str,
+        region_key: str,
+        device_id: str = None,
+        transport=None,
+        functions_cache: FunctionsCache = None,
+        state_cache: StateCache = None,
+        refresh_margin: float = DEFAULT_REFRESH_MARGIN,
+        token_store: TokenStore = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        rate_limiter: RateLimiter = None,
+        retry: RetryPolicy = None,
+        local_devices: list = None,
+        online_tracker: OnlineTracker = None,
+        base_url: str = None,
+        instrumentation: Instrumentation = None,
+        schema_cache: SchemaCache = None,
     ):
         super().__init__(
-            client_id=client_id, secret_key=secret_key, region_key=region_key
+            client_id=client_id,
+            secret_key=secret_key,
+            region_key=region_key,
+            transport=transport,
+            refresh_margin=refresh_margin,
+            token_store=token_store,
+            max_workers=max_workers,
+            rate_limiter=rate_limiter,
+            retry=retry,
+            base_url=base_url,
+            instrumentation=instrumentation,
         )
         self._device_id = device_id
+        self._functions_cache = (
+            FunctionsCache() if functions_cache is None else functions_cache
+        )
+        self._state_cache = state_cache
+        self._schemas = SchemaCache() if schema_cache is None else schema_cache
+        self._local = threading.local()
+        self._local_devices = {
+            device.device_id: device for device in local_devices or []
+        }
+        self._online_tracker = online_tracker
+        if online_tracker is not None:
+            online_tracker.on_online(self._replay)
+
+    @property
+    def _batches(self) -> list:
+        """
+        Active batches of the current thread.
+        """
+        if not hasattr(self._local, "batches"):
+            self._local.batches = []
+
+        return self._local.batches
+
+    def _function(self, code_name: str, device_id: str) -> dict:
+        """
+        Get the function description from the (cached) device functions.
+
+        :param code_name: function name
+        :param device_id: device id
+        :raise FunctionNotSupported: if function not supported
+        :return: function dict
+        """
+        for item in self.functions(device_id=device_id):
+            if item.get("code") == code_name:
+                return item
+
+        raise FunctionNotSupported(target=code_name)
 
     def _function_exists(self, code_name: str, device_id: str) -> bool:
         """
@@ -35,30 +146,63 @@ class Bulb(_TuyaApi):
         :raise FunctionNotSupported: if function not supported
         :return: state
         """
-        functions = self.functions(device_id=device_id)
+        self._schema(device_id).get(code_name)
 
-        try:
-            state = [True for item in functions if code_name == item["code"]][0]
-        except (KeyError, IndexError):
-            raise FunctionNotSupported(target=code_name)
+        return True
+
+    def _schema(self, device_id: str, fetch: bool = True) -> Schema:
+        """
+        Get the compiled schema of a device. Served from the functions cache,
+        or from another device of the same product, before any request.
+
+        :param device_id: device id
+        :param fetch: request the functions if the schema is not known
+        :return: schema, or None if not known and fetch is False
+        """
+        schema = self._schemas.lookup(device_id, self._functions_cache)
+        if schema is not None or not fetch:
+            return schema
 
-        return state
+        return self._schemas.compile(self.functions(device_id=device_id), device_id)
 
-    def _available_values(self, code_name: str, device_id: str):
+    def _validate(self, code_name: str, value, check: bool, device_id: str):
         """
-        Get all available values.
+        Check a value against the device schema.
+        Without check, the schema is used only if it is known already,
+        and the usual range of the code otherwise.
 
         :param code_name: function name
+        :param value: device value
+        :param check: check if your device supports this function
         :param device_id: device id
+        :raise FunctionNotSupported: if function not supported
+        :raise tuya_bulb_control.exceptions.ValueNotInRange: if the value is not accepted
         :return: value
         """
-        values = [
-            item["values"]
-            for item in self.functions(device_id=device_id)
-            if item["code"] == code_name
-        ][0]
+        schema = self._schema(device_id, fetch=check)
+        if check:
+            return schema.validate(code_name, value)
 
-        return values
+        return check_value(code_name, value, schema)
+
+    def _percent(self, code_name: str, percent, check: bool, device_id: str) -> int:
+        """
+        Convert a percentage to a device value by the range in the schema.
+        Without check, the schema is used only if it is known already.
+
+        :param code_name: function name
+        :param percent: percentage
+        :param check: check if your device supports this function
+        :param device_id: device id
+        :raise FunctionNotSupported: if function not supported
+        :raise tuya_bulb_control.exceptions.ValueNotInRange: if the value is out of range
+        :return: device value
+        """
+        schema = self._schema(device_id, fetch=check)
+        if check:
+            schema.get(code_name)
+
+        return percent_value(code_name, percent, schema)
 
     def _template(
         self,
@@ -67,28 +211,172 @@ class Bulb(_TuyaApi):
         device_id: str,
     ) -> dict:
         """
-        Brightness level for multi-version.
+        Send a single command, or add it to the active batch.
 
-        :param value:
+        :param value: value
+        :param code_name: function name
         :param device_id: select device_id for this action only. tuya_bulb_control.Bulb(device_id) will be ignored
-        :raise tuya_bulb_control.exceptions.ValueNotInRange: if the value is out of range
-        :return: response dict or bool
+        :return: response dict or None inside tuya_bulb_control.Bulb.batch()
         """
         device_id = self._check_device_id(device_id)
 
-        body = {"commands": [{"code": code_name, "value": value}]}
-        response = self._post(postfix=f"/devices/{device_id}/commands", body=body)
+        if self._batches:
+            self._batches[-1].add(code_name=code_name, value=value, device_id=device_id)
+            return None
+
+        body = self._make_body(code_name=code_name, value=value)
+        response = self._send_commands(commands=body["commands"], device_id=device_id)
+
+        return response
+
+    def _send_commands(self, commands: list, device_id: str) -> dict:
+        """
+        Send several commands in one request.
+
+        :param commands: list of {"code": ..., "value": ...} dicts
+        :param device_id: device id
+        :raise tuya_bulb_control.exceptions.DeviceOffline: if the device is offline
+        :return: response dict
+        """
+        tracker = self._online_tracker
+        if tracker is not None:
+            if tracker.is_offline(device_id):
+                return self._offline(commands=commands, device_id=device_id)
+            commands = tracker.take_commands(device_id, commands)
+
+        response = self._local_send(commands=commands, device_id=device_id)
+        if response is None:
+            response = self._post(
+                postfix=f"/devices/{device_id}/commands", body={"commands": commands}
+            )
+
+        if tracker is not None:
+            if response.get("success"):
+                tracker.set(device_id, True)
+            elif response.get("code") == OFFLINE_CODE:
+                tracker.set(device_id, False)
+                return self._offline(commands=commands, device_id=device_id)
+
+        if response.get("success"):
+            self._cache_commands(commands=commands, device_id=device_id)
 
         return response
 
+    def _cache_commands(self, commands: list, device_id: str):
+        """
+        Store the values of successful commands in the state cache.
+
+        :param commands: list of {"code": ..., "value": ...} dicts
+        :param device_id: device id
+        """
+        if self._state_cache is None:
+            return
+
+        # The status endpoint reports json values as strings
+        self._state_cache.update(
+            device_id,
+            {
+                item["code"]: json.dumps(item["value"])
+                if isinstance(item["value"], dict)
+                else item["value"]
+                for item in commands
+            },
+        )
+
+    def _offline(self, commands: list, device_id: str) -> dict:
+        """
+        Handle commands to an offline device, see tuya_bulb_control.OnlineTracker.
+
+        :param commands: list of {"code": ..., "value": ...} dicts
+        :param device_id: device id
+        :raise tuya_bulb_control.exceptions.DeviceOffline: if commands are not deferred
+        :return: response dict of the deferred commands
+        """
+        if not self._online_tracker.defer:
+            raise DeviceOffline(device_id)
+
+        self._online_tracker.defer_commands(device_id, commands)
+
+        return {
+            "success": False,
+            "code": OFFLINE_CODE,
+            "msg": "device is offline, commands deferred",
+            "deferred": True,
+        }
+
+    def _replay(self, device_id: str):
+        """
+        Send the deferred commands of a device that is back online.
+        Runs on the thread pool, so push event dispatching is not blocked.
+
+        :param device_id: device id
+        """
+        commands = self._online_tracker.take_commands(device_id)
+        if commands:
+            self.executor.submit(
+                self._send_commands, commands=commands, device_id=device_id
+            )
+
+    def _local_send(self, commands: list, device_id: str):
+        """
+        Send commands over the LAN if the device is a local device.
+
+        :param commands: list of {"code": ..., "value": ...} dicts
+        :param device_id: device id
+        :return: response dict, or None to fall back to the cloud API
+        """
+        device = self._local_devices.get(device_id)
+        if device is None:
+            return None
+
+        try:
+            device.set_values({item["code"]: item["value"] for item in commands})
+        except LocalError:
+            return None
+
+        return {"success": True, "result": True, "t": int(time() * 1000), "local": True}
+
+    def _local_state(self, device_id: str):
+        """
+        Get the state over the LAN if the device is a local device.
+
+        :param device_id: device id
+        :return: status list, or None to fall back to the cloud API
+        """
+        device = self._local_devices.get(device_id)
+        if device is None:
+            return None
+
+        try:
+            status = device.status()
+        except LocalError:
+            return None
+
+        return [
+            {"code": code_name, "value": value} for code_name, value in status.items()
+        ]
+
+    def close(self):
+        """
+        Shut down the thread pool and close the local device connections.
+        """
+        super().close()
+        for device in self._local_devices.values():
+            device.close()
+
     def _check_device_id(self, device_id: str) -> str:
         """
         Check device id.
+        Inside tuya_bulb_control.Bulb.batch(device_id), the device of the batch
+        is the default.
 
         :param device_id: device id
         :return: current device id
         :raise ArgumentError: if device_id is empty
         """
+        if device_id is None and self._batches:
+            device_id = self._batches[-1]._device_id
+
         device_id = self._device_id if device_id is None else device_id
 
         if not device_id:
@@ -118,6 +406,7 @@ class Bulb(_TuyaApi):
 
         return body
 
+    @instrumented
     def set_work_mode(
         self, mode_name: str, check: bool = True, device_id: str = None
     ) -> dict:
@@ -137,21 +426,21 @@ class Bulb(_TuyaApi):
         code_name = "work_mode"
         device_id = self._check_device_id(device_id)
 
-        if not check:
-            self._function_exists(code_name=code_name, device_id=device_id)
-            available_values = json.loads(
-                self._available_values(code_name=code_name, device_id=device_id)
-            )["range"]
-
-            if not [item for item in available_values if item == mode_name]:
-                raise ModeNotSupported(target=mode_name)
+        try:
+            self._validate(
+                code_name=code_name, value=mode_name, check=check, device_id=device_id
+            )
+        except ValueNotInRange:
+            raise ModeNotSupported(target=mode_name)
 
-        body = self._make_body(code_name=code_name, value=mode_name)
-        response = self._post(f"/devices/{device_id}/commands", body=body)
+        response = self._template(
+            value=mode_name, code_name=code_name, device_id=device_id
+        )
 
         return response
 
-    def set_colour(self, rgb: tuple, check: bool = None, device_id: str = None) -> dict:
+    @instrumented
+    def set_colour(self, rgb: tuple, check: bool = True, device_id: str = None) -> dict:
         """
         Colour mode settings.
         Uses code: colour_data
@@ -166,18 +455,20 @@ class Bulb(_TuyaApi):
         code_name = "colour_data"
         device_id = self._check_device_id(device_id)
 
-        if not check:
-            self._function_exists(code_name=code_name, device_id=device_id)
+        hsv = rgb_to_hsv([rgb], version=1, use_numpy=False)[0]
+        value = colour_value(hsv)
 
-        h, s, v = colorsys.rgb_to_hsv(rgb[0] / 255, rgb[1] / 255, rgb[2] / 255)
+        self._validate(
+            code_name=code_name, value=value, check=check, device_id=device_id
+        )
 
-        body = self._make_body(code_name, {"h": h * 360, "s": s * 255, "v": v * 255})
-        response = self._post(postfix=f"/devices/{device_id}/commands", body=body)
+        response = self._template(value=value, code_name=code_name, device_id=device_id)
 
         return response
 
+    @instrumented
     def set_colour_v2(
-        self, rgb: tuple, check: bool = None, device_id: str = None
+        self, rgb: tuple, check: bool = True, device_id: str = None
     ) -> dict:
         """
         Colour mode settings.
@@ -193,18 +484,18 @@ class Bulb(_TuyaApi):
         code_name = "colour_data_v2"
         device_id = self._check_device_id(device_id)
 
-        if not check:
-            self._function_exists(code_name=code_name, device_id=device_id)
-
-        h, s, v = colorsys.rgb_to_hsv(rgb[0] / 255, rgb[1] / 255, rgb[2] / 255)
+        hsv = rgb_to_hsv([rgb], version=2, use_numpy=False)[0]
+        value = colour_value(hsv)
 
-        body = self._make_body(
-            code_name=code_name, value={"h": h * 360, "s": s * 1000, "v": v * 1000}
+        self._validate(
+            code_name=code_name, value=value, check=check, device_id=device_id
         )
-        response = self._post(postfix=f"/devices/{device_id}/commands", body=body)
+
+        response = self._template(value=value, code_name=code_name, device_id=device_id)
 
         return response
 
+    @instrumented
     def set_toggle(
         self, state: bool = None, check: bool = True, device_id: str = None
     ) -> dict:
@@ -227,13 +518,13 @@ class Bulb(_TuyaApi):
         if state is None:
             state = not self.current_value(code_name=code_name, device_id=device_id)
 
-        body = self._make_body(code_name=code_name, value=state)
-        response = self._post(postfix=f"/devices/{device_id}/commands", body=body)
+        response = self._template(value=state, code_name=code_name, device_id=device_id)
 
         return response
 
+    @instrumented
     def set_toggle_timer(
-        self, value: int, check: bool = None, device_id: str = None
+        self, value: int, check: bool = True, device_id: str = None
     ) -> dict:
         """
         On or Off this device by timer.
@@ -249,19 +540,17 @@ class Bulb(_TuyaApi):
         code_name = "countdown_1"
         device_id = self._check_device_id(device_id)
 
-        if value > 1440:
-            raise ValueError(f"{code_name} -> The value must be between 0-1440")
-
-        if not check:
-            self._function_exists(code_name=code_name, device_id=device_id)
-
         value = value * 60  # To seconds
 
-        body = self._make_body(code_name=code_name, value=value)
-        response = self._post(postfix=f"/devices/{device_id}/commands", body=body)
+        self._validate(
+            code_name=code_name, value=value, check=check, device_id=device_id
+        )
+
+        response = self._template(value=value, code_name=code_name, device_id=device_id)
 
         return response
 
+    @instrumented
     def turn_on(self, check: bool = True, device_id: str = None) -> dict:
         """
         Turn ON the bulb.
@@ -278,6 +567,7 @@ class Bulb(_TuyaApi):
 
         return response
 
+    @instrumented
     def turn_off(self, check: bool = True, device_id: str = None) -> dict:
         """
         Turn OFF the bulb.
@@ -294,14 +584,15 @@ class Bulb(_TuyaApi):
 
         return response
 
+    @instrumented
     def set_colour_temp(
-        self, value: int, check: bool = None, device_id: str = None
+        self, value: int, check: bool = True, device_id: str = None
     ) -> dict:
         """
         Colour temperature.
         Uses code: temp_value
 
-        :param value: percentage from 25-255. For example: 25 = warm or 255 = cold
+        :param value: device value, usually 25-255. For example: 25 = warm or 255 = cold
         :param check: check if your device supports this mode.
             Default: True == Always check. Set to False if you are sure the device supports the mode.
         :param device_id: select device_id for this action only. tuya_bulb_control.Bulb(device_id) will be ignored
@@ -309,19 +600,19 @@ class Bulb(_TuyaApi):
         :return: response dict or bool
         """
         code_name = "temp_value"
+        device_id = self._check_device_id(device_id)
 
-        if value < 25 or value > 255:
-            raise ValueError(f"{value} -> The value not in rage 25-255")
-
-        if not check:
-            self._function_exists(code_name=code_name, device_id=device_id)
+        self._validate(
+            code_name=code_name, value=value, check=check, device_id=device_id
+        )
 
         response = self._template(value=value, code_name=code_name, device_id=device_id)
 
         return response
 
+    @instrumented
     def set_colour_temp_v2(
-        self, value: int, check: bool = None, device_id: str = None
+        self, value: int, check: bool = True, device_id: str = None
     ) -> dict:
         """
         Colour temperature.
@@ -335,25 +626,20 @@ class Bulb(_TuyaApi):
         :return: response dict or bool
         """
         code_name = "temp_value_v2"
+        device_id = self._check_device_id(device_id)
+        value = self._percent(code_name, value, check=check, device_id=device_id)
 
-        if value < 0 or value > 100:
-            raise ValueError(f"{value} -> The value not in rage 0-100")
-
-        if not check:
-            self._function_exists(code_name=code_name, device_id=device_id)
-
-        response = self._template(
-            value=value * 10, code_name=code_name, device_id=device_id
-        )
+        response = self._template(value=value, code_name=code_name, device_id=device_id)
 
         return response
 
-    def set_bright(self, value: int, check: bool = None, device_id: str = None) -> dict:
+    @instrumented
+    def set_bright(self, value: int, check: bool = True, device_id: str = None) -> dict:
         """
         Brightness level.
         Uses code: bright_value
 
-        :param value: percentage from 25-255
+        :param value: device value, usually 25-255
         :param check: check if your device supports this mode.
             Default: True == Always check. Set to False if you are sure the device supports the mode.
         :param device_id: select device_id for this action only. tuya_bulb_control.Bulb(device_id) will be ignored
@@ -361,19 +647,19 @@ class Bulb(_TuyaApi):
         :return: response dict or bool
         """
         code_name = "bright_value"
+        device_id = self._check_device_id(device_id)
 
-        if value < 25 or value > 255:
-            raise ValueError(f"{value} -> The value not in rage 25-255")
-
-        if not check:
-            self._function_exists(code_name=code_name, device_id=device_id)
+        self._validate(
+            code_name=code_name, value=value, check=check, device_id=device_id
+        )
 
         response = self._template(value=value, code_name=code_name, device_id=device_id)
 
         return response
 
+    @instrumented
     def set_bright_v2(
-        self, value: int, check: bool = None, device_id: str = None
+        self, value: int, check: bool = True, device_id: str = None
     ) -> dict:
         """
         Brightness level. v2 only.
@@ -387,19 +673,192 @@ class Bulb(_TuyaApi):
         :return: response dict or bool
         """
         code_name = "bright_value_v2"
+        device_id = self._check_device_id(device_id)
+        value = self._percent(code_name, value, check=check, device_id=device_id)
 
-        if value < 1 or value > 100:
-            raise ValueError(f"{value} -> The value not in rage 1-100")
+        response = self._template(value=value, code_name=code_name, device_id=device_id)
 
-        if not check:
-            self._function_exists(code_name=code_name, device_id=device_id)
+        return response
 
-        response = self._template(
-            value=value * 10, code_name=code_name, device_id=device_id
+    def _current_values(self, device_id: str, codes, refresh: bool) -> dict:
+        """
+        Get the current values of the codes, from the state cache when it has
+        all of them.
+
+        :param device_id: device id
+        :param codes: function codes
+        :param refresh: ignore the state cache
+        :return: {code: value} dict
+        """
+        if not refresh and self._state_cache is not None:
+            cached = self._state_cache.get_all(device_id)
+            if all(code_name in cached for code_name in codes):
+                return cached
+
+        return status_dict(self.state(device_id=device_id))
+
+    @instrumented
+    def apply_state(
+        self, desired: dict, device_id: str = None, refresh: bool = False
+    ) -> dict:
+        """
+        Bring the bulb to a desired state, sending only the values that differ
+        in one request. The current state comes from the state cache, or is fetched.
+
+        Example:
+            bulb.apply_state({"switch": True, "mode": "white", "brightness": 80})
+
+        :param desired: desired state, see tuya_bulb_control.desired.desired_values()
+        :param device_id: select device_id for this action only. tuya_bulb_control.Bulb(device_id) will be ignored
+        :param refresh: fetch the current state even if it is cached
+        :raise ValueError: if a value is out of range
+        :return: response dict, or None if the bulb already is in the desired state
+        """
+        device_id = self._check_device_id(device_id)
+        wanted = desired_values(desired, self._schema(device_id, fetch=False))
+        current = self._current_values(device_id, wanted, refresh)
+
+        commands = diff_commands(current, wanted)
+        if not commands:
+            return None
+
+        return self._send_commands(commands=commands, device_id=device_id)
+
+    @instrumented
+    def apply_states(
+        self, desired: dict, device_ids=None, refresh: bool = False
+    ) -> dict:
+        """
+        Bring many bulbs to a desired state, see apply_state().
+        Missing current states are fetched with states(), and only the bulbs
+        that differ get a request, concurrently.
+
+        :param desired: one desired state for every device of device_ids,
+            or {device_id: desired state} if device_ids is not given
+        :param device_ids: device ids
+        :param refresh: fetch the current states even if they are cached
+        :raise ValueError: if a value is out of range
+        :return: dict by device id with the response, None if the bulb already
+            is in the desired state, or the raised exception
+        """
+        if device_ids is None:
+            wanted = {
+                device_id: desired_values(value, self._schema(device_id, fetch=False))
+                for device_id, value in desired.items()
+            }
+        else:
+            # Devices of a product share a schema, convert once per schema
+            by_schema = {}
+            wanted = {}
+            for device_id in device_ids:
+                schema = self._schema(device_id, fetch=False)
+                if schema not in by_schema:
+                    by_schema[schema] = desired_values(desired, schema)
+                wanted[device_id] = by_schema[schema]
+
+        current = {}
+        for device_id, values in wanted.items():
+            if not refresh and self._state_cache is not None:
+                cached = self._state_cache.get_all(device_id)
+                if all(code_name in cached for code_name in values):
+                    current[device_id] = cached
+
+        missing = [device_id for device_id in wanted if device_id not in current]
+        if missing:
+            current.update(self.states(missing))
+
+        commands = {
+            device_id: diff_commands(current.get(device_id, {}), values)
+            for device_id, values in wanted.items()
+        }
+
+        response = dict.fromkeys(wanted)
+        response.update(
+            self._fan_out(
+                [device_id for device_id, items in commands.items() if items],
+                lambda device_id: self._send_commands(
+                    commands=commands[device_id], device_id=device_id
+                ),
+            )
+        )
+
+        return response
+
+    @instrumented
+    def snapshot(self, device_ids) -> Snapshot:
+        """
+        Capture the state of many devices, e.g. before an alarm flash.
+        Uses states(), so one request per 20 devices.
+
+        :param device_ids: device ids
+        :return: tuya_bulb_control.snapshot.Snapshot, serialisable with dumps()
+        """
+        return Snapshot(self.states(device_ids))
+
+    @instrumented
+    def restore(
+        self,
+        snapshot: Snapshot,
+        device_ids=None,
+        codes=RESTORE_CODES,
+        diff: bool = False,
+    ) -> dict:
+        """
+        Restore the state captured by snapshot(), all values of a device in one
+        request, with at most max_workers requests at a time.
+
+        :param snapshot: tuya_bulb_control.snapshot.Snapshot
+        :param device_ids: restore only these devices. Default: every device of the snapshot
+        :param codes: codes to restore, in the order they are sent.
+            Default: tuya_bulb_control.snapshot.RESTORE_CODES
+        :param diff: fetch the current states first and send only what differs
+        :return: dict by device id with the response, None if there was nothing
+            to send, or the raised exception
+        """
+        device_ids = list(snapshot.devices if device_ids is None else device_ids)
+        commands = {
+            device_id: restore_commands(snapshot.get(device_id), codes)
+            for device_id in device_ids
+        }
+
+        if diff:
+            return self.apply_states(
+                {
+                    device_id: {item["code"]: item["value"] for item in items}
+                    for device_id, items in commands.items()
+                },
+                refresh=True,
+            )
+
+        response = dict.fromkeys(device_ids)
+        response.update(
+            self._fan_out(
+                [device_id for device_id, items in commands.items() if items],
+                lambda device_id: self._send_commands(
+                    commands=commands[device_id], device_id=device_id
+                ),
+            )
         )
 
         return response
 
+    def batch(self, check: bool = True, device_id: str = None) -> CommandBatch:
+        """
+        Collect several commands and send them in one request per device.
+
+        Example:
+            with bulb.batch():
+                bulb.turn_on(check=False)
+                bulb.set_work_mode("colour")
+                bulb.set_colour_v2((255, 0, 0))
+
+        :param check: check that every code is supported by the device before sending
+        :param device_id: select device_id for this batch only. tuya_bulb_control.Bulb(device_id) will be ignored
+        :return: tuya_bulb_control.batch.CommandBatch
+        """
+        return CommandBatch(bulb=self, device_id=device_id, check=check)
+
+    @instrumented
     def state(self, device_id: str = None) -> dict:
         """
         Get all current state of the bulb.
@@ -408,22 +867,70 @@ class Bulb(_TuyaApi):
         :return: response status dict
         """
         device_id = self._check_device_id(device_id)
-        response = self._get(postfix=f"/devices/{device_id}/status")["result"]
+        response = self._local_state(device_id)
+        if response is None:
+            response = self._get(postfix=f"/devices/{device_id}/status")["result"]
+
+        if self._state_cache is not None:
+            self._state_cache.update(device_id, status_dict(response))
 
         return response
 
-    def functions(self, device_id: str = None) -> dict:
+    @instrumented
+    def is_online(self, device_id: str = None, refresh: bool = False) -> bool:
+        """
+        Check if the bulb is online.
+        Served from tuya_bulb_control.Bulb(online_tracker) when it knows the status.
+
+        :param device_id: select device_id for this action only. tuya_bulb_control.Bulb(device_id) will be ignored
+        :param refresh: ignore the tracker and fetch the device details
+        :return: state
+        """
+        device_id = self._check_device_id(device_id)
+        tracker = self._online_tracker
+
+        if tracker is not None and not refresh:
+            online = tracker.get(device_id)
+            if online is not None:
+                return online
+
+        online = bool(self._get(f"/devices/{device_id}")["result"]["online"])
+        if tracker is not None:
+            tracker.set(device_id, online)
+
+        return online
+
+    @instrumented
+    def functions(self, device_id: str = None, refresh: bool = False) -> dict:
         """
         Get all available functions for this bulb.
+        The result is cached, see tuya_bulb_control.Bulb(functions_cache).
 
         :param device_id: select device_id for this action only. tuya_bulb_control.Bulb(device_id) will be ignored
+        :param refresh: ignore the cache and fetch the functions again
         :return: response functions dict
         """
         device_id = self._check_device_id(device_id)
-        response = self._get(f"/devices/{device_id}/functions")["result"]["functions"]
+
+        response = None if refresh else self._functions_cache.get(device_id)
+        if response is None:
+            response = self._get(f"/devices/{device_id}/functions")["result"][
+                "functions"
+            ]
+            self._functions_cache.set(device_id, response)
 
         return response
 
+    def invalidate_functions(self, device_id: str = None):
+        """
+        Drop the cached functions, e.g. after a firmware update.
+
+        :param device_id: drop only this device. Default: all devices
+        """
+        self._functions_cache.invalidate(device_id)
+        self._schemas.invalidate(device_id)
+
+    @instrumented
     def current_value(self, code_name: str, device_id: str = None):
         """
         Get value the selected function.
@@ -432,13 +939,120 @@ class Bulb(_TuyaApi):
         :param device_id: select device_id for this action only. tuya_bulb_control.Bulb(device_id) will be ignored
         :return: value
         """
+        device_id = self._check_device_id(device_id)
+
+        if self._state_cache is not None:
+            value = self._state_cache.get(device_id, code_name, default=_MISSING)
+            if value is not _MISSING:
+                return value
+
         try:
-            value = [
-                item["value"]
-                for item in self.state(device_id)
-                if item["code"] == code_name
-            ][0]
-        except (IndexError, KeyError):
+            value = status_dict(self.state(device_id))[code_name]
+        except KeyError:
             raise FunctionNotSupported(target=code_name)
 
         return value
+
+    @instrumented
+    def states(self, device_ids, chunk_size: int = MAX_DEVICE_IDS) -> dict:
+        """
+        Get the current state of many devices.
+        Uses one request per chunk_size devices, run concurrently.
+
+        :param device_ids: device ids
+        :param chunk_size: device ids per request. Default: the API maximum
+        :return: dict by device id with {code: value} dicts
+        """
+        response = {}
+        requests = list(chunks(list(device_ids), chunk_size))
+
+        def fetch(chunk):
+            return self._get(f"/devices/status?device_ids={','.join(chunk)}")[
+                "result"
+            ]
+
+        if len(requests) > 1:
+            results = self._fan_out([tuple(item) for item in requests], fetch)
+        else:
+            results = {tuple(item): fetch(item) for item in requests}
+
+        for result in results.values():
+            if isinstance(result, Exception):
+                raise result
+            for item in result:
+                response[item["id"]] = status_dict(item["status"])
+                if self._state_cache is not None:
+                    self._state_cache.update(item["id"], response[item["id"]])
+
+        return response
+
+    @instrumented
+    def apply(self, device_ids, commands: list) -> dict:
+        """
+        Send the same commands to many devices concurrently.
+        Uses tuya_bulb_control.Bulb.executor.
+
+        :param device_ids: device ids
+        :param commands: list of {"code": ..., "value": ...} dicts
+        :return: dict by device id with the response or the raised exception
+        """
+        return self._fan_out(
+            device_ids,
+            lambda device_id: self._send_commands(
+                commands=commands, device_id=device_id
+            ),
+        )
+
+    @instrumented
+    def set_colours(self, colours: dict, version: int = 2) -> dict:
+        """
+        Set a different colour on many devices concurrently.
+        Colours are converted in one batch, see tuya_bulb_control.colour.
+        Uses code: colour_data_v2, or colour_data for version=1
+
+        :param colours: {device_id: (r, g, b)}
+        :param version: 1 for colour_data, 2 for colour_data_v2
+        :return: dict by device id with the response or the raised exception
+        """
+        commands = colour_commands(colours, version=version)
+
+        return self._fan_out(
+            commands,
+            lambda device_id: self._send_commands(
+                commands=commands[device_id], device_id=device_id
+            ),
+        )
+
+    @instrumented
+    def gather_state(self, device_ids) -> dict:
+        """
+        Get the state of many devices concurrently, one request per device.
+        Prefer tuya_bulb_control.Bulb.states() where the batch endpoint is available.
+
+        :param device_ids: device ids
+        :return: dict by device id with the status list or the raised exception
+        """
+        return self._fan_out(device_ids, self.state)
+
+    def subscribe(self, source: EventSource = None, **kwargs) -> Subscriber:
+        """
+        Receive status changes pushed by the message service, keeping
+        the state cache and online tracker up to date without polling.
+        Use it with StateCache(policy="serve_stale").
+
+        :param source: tuya_bulb_control.events.EventSource.
+            Default: PulsarSource with the credentials of this bulb
+        :param kwargs: tuya_bulb_control.events.Subscriber arguments
+        :return: running tuya_bulb_control.events.Subscriber, close() it when done
+        """
+        if source is None:
+            source = PulsarSource(
+                client_id=self._client_id,
+                secret_key=self._secret_key,
+                region_key=self._region_key,
+            )
+
+        kwargs.setdefault("state_cache", self._state_cache)
+        kwargs.setdefault("online_tracker", self._online_tracker)
+
+        return Subscriber(source=source, **kwargs)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import threading
+from time import monotonic, time
+
+DEFAULT_FUNCTIONS_TTL = 3600
+
+# Name ending of the files of FunctionsCache, other files in the directory are kept
+FUNCTIONS_SUFFIX = ".functions.json"
+
+
+class FunctionsCache:
+    """
+    Per-device cache of the functions schema.
+
+    Entries expire after ttl seconds. With path set, every schema is also
+    stored on disk as <path>/<device_id>.functions.json and survives process
+    restarts. Other files in the directory are left alone.
+
+    :param ttl: seconds an entry stays valid. None == never expires
+    :param path: directory for the on-disk store. Default: memory only
+    """
+
+    def __init__(self, ttl: float = DEFAULT_FUNCTIONS_TTL, path: str = None):
+        self.ttl = ttl
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def _expired(self, fetched_at: float) -> bool:
+        return self.ttl is not None and time() - fetched_at > self.ttl
+
+    def _file(self, device_id: str) -> str:
+        return os.path.join(self.path, device_id + FUNCTIONS_SUFFIX)
+
+    def get(self, device_id: str):
+        """
+        Get the cached functions of a device.
+
+        :param device_id: device id
+        :return: functions list or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(device_id)
+
+        if entry is None and self.path is not None:
+            try:
+                with open(self._file(device_id)) as file:
+                    data = json.load(file)
+                entry = (data["fetched_at"], data["functions"])
+            except (OSError, ValueError, KeyError):
+                return None
+
+            with self._lock:
+                self._entries[device_id] = entry
+
+        if entry is None or self._expired(entry[0]):
+            return None
+
+        return entry[1]
+
+    def set(self, device_id: str, functions: list):
+        """
+        Store the functions of a device.
+
+        :param device_id: device id
+        :param functions: functions list
+        """
+        entry = (time(), functions)
+
+        with self._lock:
+            self._entries[device_id] = entry
+
+        if self.path is not None:
+            tmp = self._file(device_id) + ".tmp"
+            with open(tmp, "w") as file:
+                json.dump({"fetched_at": entry[0], "functions": functions}, file)
+            os.replace(tmp, self._file(device_id))
+
+    def invalidate(self, device_id: str = None):
+        """
+        Drop cached functions.
+
+        :param device_id: drop only this device. Default: drop everything
+        """
+        with self._lock:
+            if device_id is None:
+                device_ids = list(self._entries)
+                self._entries.clear()
+            else:
+                device_ids = [device_id]
+                self._entries.pop(device_id, None)
+
+        if self.path is None:
+            return
+
+        if device_id is None:
+            device_ids = [
+                name[: -len(FUNCTIONS_SUFFIX)]
+                for name in os.listdir(self.path)
+                if name.endswith(FUNCTIONS_SUFFIX)
+            ]
+
+        for item in device_ids:
+            try:
+                os.remove(self._file(item))
+            except FileNotFoundError:
+                pass
+
+
+class StateCache:
+    """
+    Local cache of device state, {code: value} per device.
+
+    Filled from status requests and successful commands.
+    Values are fresh for ttl seconds, or ttls[code] for selected codes.
+    Stale values are handled by policy:
+        "fetch" - a read fetches the status again
+        "serve_stale" - a read returns the last known value; the status is only
+            fetched when the code was never seen. Use it when the cache is kept
+            up to date by other means, e.g. push events
+
+    :param ttl: default seconds a value stays fresh
+    :param ttls: per-code ttl overrides. Example: {"switch_led": 30}
+    :param policy: stale policy. "fetch" or "serve_stale"
+    """
+
+    FETCH = "fetch"
+    SERVE_STALE = "serve_stale"
+
+    def __init__(self, ttl: float = 5, ttls: dict = None, policy: str = FETCH):
+        if policy not in (self.FETCH, self.SERVE_STALE):
+            raise ValueError(f"{policy} -> Unknown stale policy")
+
+        self.ttl = ttl
+        self.ttls = {} if ttls is None else dict(ttls)
+        self.policy = policy
+        self._devices = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, code_name: str, updated_at: float) -> bool:
+        return monotonic() - updated_at <= self.ttls.get(code_name, self.ttl)
+
+    def get(self, device_id: str, code_name: str, default=None):
+        """
+        Get a cached value that can be served under the current policy.
+
+        :param device_id: device id
+        :param code_name: function name
+        :param default: returned if the value is missing or stale
+        :return: value
+        """
+        with self._lock:
+            entry = self._devices.get(device_id, {}).get(code_name)
+
+        if entry is None:
+            return default
+
+        if self.policy == self.FETCH and not self._fresh(code_name, entry[0]):
+            return default
+
+        return entry[1]
+
+    def get_all(self, device_id: str) -> dict:
+        """
+        Get all values of a device that can be served under the current policy.
+
+        :param device_id: device id
+        :return: {code: value} dict
+        """
+        with self._lock:
+            entries = dict(self._devices.get(device_id, {}))
+
+        return {
+            code_name: value
+            for code_name, (updated_at, value) in entries.items()
+            if self.policy == self.SERVE_STALE or self._fresh(code_name, updated_at)
+        }
+
+    def update(self, device_id: str, values: dict):
+        """
+        Store new values of a device.
+
+        :param device_id: device id
+        :param values: {code: value} dict
+        """
+        now = monotonic()
+
+        with self._lock:
+            entries = self._devices.setdefault(device_id, {})
+            for code_name, value in values.items():
+                entries[code_name] = (now, value)
+
+    def invalidate(self, device_id: str = None, code_name: str = None):
+        """
+        Drop cached values.
+
+        :param device_id: drop only this device. Default: all devices
+        :param code_name: drop only this code of the device
+        """
+        with self._lock:
+            if device_id is None:
+                self._devices.clear()
+            elif code_name is None:
+                self._devices.pop(device_id, None)
+            else:
+                self._devices.get(device_id, {}).pop(code_name, None)
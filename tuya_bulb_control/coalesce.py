@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import monotonic
+from .batch import CommandBatch
+from .ratelimit import TokenBucket
+
+DEFAULT_MAX_RATE = 5
+
+
+class CoalescingDispatcher:
+    """
+    Sends commands from a background thread, keeping only the newest value.
+
+    Values submitted while a device is waiting replace older values of the
+    same code, and all pending codes of a device go out in one request.
+    Meant for high-frequency input, e.g. a colour picker being dragged.
+
+    Example:
+        with CoalescingDispatcher(bulb, max_rate=10) as dispatcher:
+            with dispatcher.capture():
+                bulb.set_colour_v2(rgb, check=False)
+
+    :param bulb: tuya_bulb_control.Bulb instance
+    :param max_rate: max requests per second
+    :param on_result: function(device_id, response or exception) called after each request,
+        exceptions it raises are counted in callback_errors
+    """
+
+    def __init__(self, bulb, max_rate: float = DEFAULT_MAX_RATE, on_result=None):
+        self._bulb = bulb
+        self._bucket = TokenBucket(max_rate, burst=1)
+        self._on_result = on_result
+
+        self._pending = OrderedDict()
+        self._in_flight = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+        self.sent = 0
+        self.submitted = 0
+        self.callback_errors = 0
+
+        self._thread = threading.Thread(
+            target=self._run, name="tuya_bulb_control.coalesce", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, code_name: str, value, device_id: str = None):
+        """
+        Queue a command, replacing a pending value of the same code.
+
+        :param code_name: function name
+        :param value: value
+        :param device_id: select device_id for this command only. tuya_bulb_control.Bulb(device_id) will be ignored
+        """
+        device_id = self._bulb._check_device_id(device_id)
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The dispatcher is closed")
+
+            self._pending.setdefault(device_id, {})[code_name] = value
+            self.submitted += 1
+            self._condition.notify()
+
+    @contextmanager
+    def capture(self, device_id: str = None):
+        """
+        Queue the commands of Bulb setters called inside the block,
+        instead of sending them.
+
+        :param device_id: select device_id for this block only. tuya_bulb_control.Bulb(device_id) will be ignored
+        """
+        batch = CommandBatch(bulb=self._bulb, device_id=device_id, check=False)
+        self._bulb._batches.append(batch)
+
+        try:
+            yield batch
+        finally:
+            self._bulb._batches.remove(batch)
+
+        for batch_device_id, commands in batch._commands.items():
+            for code_name, value in commands.items():
+                self.submit(code_name=code_name, value=value, device_id=batch_device_id)
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until every queued command is sent.
+
+        :param timeout: max seconds to wait. None == no limit
+        :return: False if the timeout expired
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+
+        with self._condition:
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+
+        return True
+
+    def close(self, flush: bool = True):
+        """
+        Stop the background thread.
+
+        :param flush: send the queued commands first
+        """
+        if flush:
+            self.flush()
+
+        with self._condition:
+            self._closed = True
+            self._pending.clear()
+            self._condition.notify_all()
+
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+
+            # Wait for the rate budget before taking the values,
+            # so the newest values submitted meanwhile are sent
+            self._bucket.acquire()
+
+            with self._condition:
+                if not self._pending:
+                    continue
+                device_id, commands = self._pending.popitem(last=False)
+                self._in_flight += 1
+
+            try:
+                result = self._bulb._send_commands(
+                    commands=[
+                        {"code": code_name, "value": value}
+                        for code_name, value in commands.items()
+                    ],
+                    device_id=device_id,
+                )
+            except Exception as exc:
+                result = exc
+
+            with self._condition:
+                self._in_flight -= 1
+                self.sent += 1
+                self._condition.notify_all()
+
+            if self._on_result is not None:
+                try:
+                    self._on_result(device_id, result)
+                except Exception:
+                    # A failing callback must not stop the dispatcher
+                    self.callback_errors += 1
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+from .schema import _integer_validator
+
+SCALES = {1: 255, 2: 1000}
+CODES = {1: "colour_data", 2: "colour_data_v2"}
+TEMP_CODES = {1: "temp_value", 2: "temp_value_v2"}
+
+# HSV values use device units: h 0-360, s and v 0-255 for v1 devices
+# (colour_data) or 0-1000 for v2 devices (colour_data_v2).
+# Every function takes a sequence of colours and returns lists of ints,
+# NumPy is used when installed for large batches or NumPy input.
+
+# Batches at least this long are converted with NumPy when available
+NUMPY_THRESHOLD = 64
+
+
+def _scale(version: int) -> int:
+    try:
+        return SCALES[version]
+    except KeyError:
+        raise ValueError(f"{version} -> The version must be 1 or 2")
+
+
+def _use_numpy(values, use_numpy) -> bool:
+    if numpy is None:
+        if use_numpy:
+            raise ImportError("NumPy is not installed")
+        return False
+
+    if use_numpy is None:
+        return isinstance(values, numpy.ndarray) or len(values) >= NUMPY_THRESHOLD
+
+    return use_numpy
+
+
+def _round_div(numerator, denominator):
+    """
+    Integer division rounded half up, works for ints and NumPy int arrays.
+    """
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def rgb_to_hsv(rgbs, version: int = 2, use_numpy: bool = None) -> list:
+    """
+    Convert RGB colours to device HSV.
+    Uses integer arithmetic, so results are exact and rounded half up.
+
+    :param rgbs: sequence of (r, g, b), 0-255
+    :param version: 1 for colour_data, 2 for colour_data_v2
+    :param use_numpy: None == auto; True == always; False == never
+    :return: list of (h, s, v) ints
+    """
+    scale = _scale(version)
+
+    if _use_numpy(rgbs, use_numpy):
+        rgb = numpy.rint(numpy.asarray(rgbs, dtype=float)).astype(int).reshape(-1, 3)
+        r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+        high = rgb.max(axis=1)
+        delta = high - rgb.min(axis=1)
+        safe_delta = numpy.where(delta == 0, 1, delta)
+
+        hue = numpy.select(
+            [delta == 0, high == r, high == g],
+            [0, 60 * (g - b), 60 * (b - r) + 120 * delta],
+            60 * (r - g) + 240 * delta,
+        )
+        hsv = numpy.stack(
+            [
+                _round_div(hue, safe_delta) % 360,
+                _round_div(delta * scale, numpy.where(high == 0, 1, high)),
+                _round_div(high * scale, 255),
+            ],
+            axis=1,
+        )
+
+        return [tuple(item) for item in hsv.tolist()]
+
+    result = []
+    for colour in rgbs:
+        r, g, b = (int(round(item)) for item in colour)
+        high = max(r, g, b)
+        delta = high - min(r, g, b)
+
+        if delta == 0:
+            hue = 0
+        elif high == r:
+            hue = 60 * (g - b)
+        elif high == g:
+            hue = 60 * (b - r) + 120 * delta
+        else:
+            hue = 60 * (r - g) + 240 * delta
+
+        result.append(
+            (
+                _round_div(hue, delta or 1) % 360,
+                _round_div(delta * scale, high or 1),
+                _round_div(high * scale, 255),
+            )
+        )
+
+    return result
+
+
+def hsv_to_rgb(hsvs, version: int = 2, use_numpy: bool = None) -> list:
+    """
+    Convert device HSV colours to RGB.
+    Uses integer arithmetic, so results are exact and rounded half up.
+
+    :param hsvs: sequence of (h, s, v) in device units
+    :param version: 1 for colour_data, 2 for colour_data_v2
+    :param use_numpy: None == auto; True == always; False == never
+    :return: list of (r, g, b) ints, 0-255
+    """
+    scale = _scale(version)
+    # Channels as numerators over scale * scale * 60
+    denominator = scale * scale * 60
+
+    if _use_numpy(hsvs, use_numpy):
+        hsv = numpy.rint(numpy.asarray(hsvs, dtype=float)).astype(int).reshape(-1, 3)
+        h, s, v = hsv[:, 0] % 360, hsv[:, 1], hsv[:, 2]
+        sector, fraction = h // 60, h % 60
+
+        channels = [
+            v * scale * 60,
+            v * (scale - s) * 60,
+            v * (scale * 60 - s * fraction),
+            v * (scale * 60 - s * (60 - fraction)),
+        ]
+        value, p, q, t = (_round_div(item * 255, denominator) for item in channels)
+
+        r = numpy.choose(sector, [value, q, p, p, t, value])
+        g = numpy.choose(sector, [t, value, value, q, p, p])
+        b = numpy.choose(sector, [p, p, t, value, value, q])
+
+        return [tuple(item) for item in numpy.stack([r, g, b], axis=1).tolist()]
+
+    result = []
+    for colour in hsvs:
+        h, s, v = (int(round(item)) for item in colour)
+        h %= 360
+        sector, fraction = h // 60, h % 60
+
+        value, p, q, t = (
+            _round_div(item * 255, denominator)
+            for item in (
+                v * scale * 60,
+                v * (scale - s) * 60,
+                v * (scale * 60 - s * fraction),
+                v * (scale * 60 - s * (60 - fraction)),
+            )
+        )
+        result.append(
+            [
+                (value, t, p),
+                (q, value, p),
+                (p, value, t),
+                (p, q, value),
+                (t, p, value),
+                (value, p, q),
+            ][sector]
+        )
+
+    return result
+
+
+def kelvin_to_temp(
+    kelvins, version: int = 2, warm: int = 2700, cold: int = 6500, schema=None
+):
+    """
+    Convert colour temperatures to temp_value, by the range in the schema.
+
+    :param kelvins: sequence of colour temperatures in kelvin
+    :param version: 1 for temp_value, 2 for temp_value_v2
+    :param warm: kelvin of the warmest device setting
+    :param cold: kelvin of the coldest device setting
+    :param schema: tuya_bulb_control.schema.Schema of the device.
+        Default: the usual range of the code
+    :return: list of ints
+    """
+    _scale(version)
+    validator = _integer_validator(TEMP_CODES[version], schema)
+    low, high, step = validator.min, validator.max, validator.step
+
+    result = []
+    for kelvin in kelvins:
+        position = min(1.0, max(0.0, (kelvin - warm) / (cold - warm)))
+        value = low + int(round(position * (high - low) / step)) * step
+        result.append(min(value, high))
+
+    return result
+
+
+def colour_value(hsv: tuple) -> dict:
+    """
+    Command value for a device HSV colour.
+
+    :param hsv: (h, s, v) in device units
+    :return: {"h": ..., "s": ..., "v": ...}
+    """
+    return {"h": int(hsv[0]), "s": int(hsv[1]), "v": int(hsv[2])}
+
+
+def colour_commands(colours: dict, version: int = 2, use_numpy: bool = None) -> dict:
+    """
+    Convert RGB colours of many devices to commands in one batch.
+
+    :param colours: {device_id: (r, g, b)}
+    :param version: 1 for colour_data, 2 for colour_data_v2
+    :param use_numpy: None == auto; True == always; False == never
+    :return: {device_id: commands list}
+    """
+    device_ids = list(colours)
+    hsvs = rgb_to_hsv([colours[item] for item in device_ids], version, use_numpy)
+
+    return {
+        device_id: [{"code": CODES[version], "value": colour_value(hsv)}]
+        for device_id, hsv in zip(device_ids, hsvs)
+    }
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+from .colour import colour_value, rgb_to_hsv
+from .schema import Schema, percent_value
+
+# Desired state keys and the v2 codes they set, in the order commands are sent
+STATE_CODES = {
+    "switch": "switch_led",
+    "mode": "work_mode",
+    "brightness": "bright_value_v2",
+    "temperature": "temp_value_v2",
+    "colour": "colour_data_v2",
+}
+
+
+def desired_values(desired: dict, schema: Schema = None) -> dict:
+    """
+    Convert a desired state to device values.
+    Values use the units of the Bulb setters. Other keys are taken as
+    function codes with device values, e.g. {"bright_value": 200} for v1 devices.
+
+    Example:
+        desired_values({"switch": True, "mode": "colour", "colour": (255, 0, 0)})
+
+    :param desired: dict with the keys
+        switch - bool
+        mode - work mode. Example: white; colour; scene
+        brightness - percentage from 1-100
+        temperature - percentage from 0-100. For example: 0 = warm or 100 = cold
+        colour - rgb coordinates
+    :param schema: device schema, for the ranges of brightness and temperature.
+        Default: the usual v2 ranges
+    :raise ValueError: if a value is out of range
+    :return: {code: value} in device units
+    """
+    values = {}
+
+    for key, code_name in STATE_CODES.items():
+        if key not in desired:
+            continue
+        value = desired[key]
+
+        if key == "switch":
+            value = bool(value)
+        elif key in ("brightness", "temperature"):
+            value = percent_value(code_name, value, schema)
+        elif key == "colour":
+            value = colour_value(rgb_to_hsv([value], version=2, use_numpy=False)[0])
+
+        values[code_name] = value
+
+    for key, value in desired.items():
+        if key not in STATE_CODES:
+            values[key] = value
+
+    return values
+
+
+def _same(current, wanted) -> bool:
+    # The status endpoint reports json values as strings, desired values
+    # may be either
+    if isinstance(wanted, dict) != isinstance(current, dict):
+        try:
+            if isinstance(current, str):
+                current = json.loads(current)
+            elif isinstance(wanted, str):
+                wanted = json.loads(wanted)
+        except ValueError:
+            return False
+
+    return current == wanted
+
+
+def diff_commands(current: dict, wanted: dict) -> list:
+    """
+    Get the commands needed to go from the current to the wanted values.
+
+    :param current: {code: value} of the device
+    :param wanted: {code: value} in device units
+    :return: list of {"code": ..., "value": ...} dicts, empty if nothing differs
+    """
+    return [
+        {"code": code_name, "value": value}
+        for code_name, value in wanted.items()
+        if code_name not in current or not _same(current[code_name], value)
+    ]
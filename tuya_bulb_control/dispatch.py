@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import heapq
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from itertools import count
+from time import monotonic
+from .batch import CommandBatch
+
+# Priorities, lower values are sent first
+HIGH = 0
+NORMAL = 50
+LOW = 100
+
+DEFAULT_WORKERS = 4
+
+
+class _Job:
+    __slots__ = ("code_name", "value", "priority", "future")
+
+    def __init__(self, code_name: str, value, priority: int):
+        self.code_name = code_name
+        self.value = value
+        self.priority = priority
+        self.future = Future()
+
+
+class PriorityDispatcher:
+    """
+    Sends commands from background threads by priority, without blocking the caller.
+
+    Devices with pending commands wait in a priority queue, keyed by their most
+    urgent command, so an emergency command jumps ahead of bulk updates to
+    other devices. Commands to one device keep their order: a device has at
+    most one request in flight, and its pending commands go out together in
+    one request. A newer command of the same code cancels the pending one,
+    unless supersede=False; then the newer one goes in the next request.
+
+    Every command gets a concurrent.futures.Future with the response,
+    cancel() it to drop the command while it is pending.
+
+    Example:
+        with PriorityDispatcher(bulb) as dispatcher:
+            for device_id in device_ids:
+                dispatcher.submit("colour_data_v2", value, device_id, priority=LOW)
+            future = dispatcher.submit("switch_led", True, EXIT_SIGN, priority=HIGH)
+            future.result(timeout=5)
+
+    :param bulb: tuya_bulb_control.Bulb instance
+    :param workers: requests sent at once
+    :param supersede: cancel pending commands replaced by a newer value of their code
+    :param on_result: function(device_id, response or exception) called after each request,
+        exceptions it raises are counted in callback_errors
+    """
+
+    def __init__(
+        self,
+        bulb,
+        workers: int = DEFAULT_WORKERS,
+        supersede: bool = True,
+        on_result=None,
+    ):
+        self._bulb = bulb
+        self._supersede = supersede
+        self._on_result = on_result
+
+        # {device_id: list of _Job in submission order}
+        self._pending = {}
+        # Heap of (priority, order, device_id), stale entries are skipped
+        self._queue = []
+        # {device_id: its current entry in the heap}
+        self._queued = {}
+        self._order = count()
+        self._busy = set()
+        self._closed = False
+        self._condition = threading.Condition()
+
+        self.submitted = 0
+        self.sent = 0
+        self.superseded = 0
+        self.callback_errors = 0
+
+        self._threads = [
+            threading.Thread(
+                target=self._run,
+                name=f"tuya_bulb_control.dispatch_{index}",
+                daemon=True,
+            )
+            for index in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        """
+        Pending commands, not counting the requests in flight.
+        """
+        with self._condition:
+            return sum(len(jobs) for jobs in self._pending.values())
+
+    def _schedule(self, device_id: str):
+        """
+        Queue a device by its most urgent pending command. Call with the lock held.
+        """
+        jobs = self._pending.get(device_id)
+        if not jobs or device_id in self._busy:
+            self._queued.pop(device_id, None)
+            return
+
+        priority = min(job.priority for job in jobs)
+        entry = self._queued.get(device_id)
+        if entry is not None and entry[0] == priority:
+            return
+
+        # The previous entry of the device, if any, goes stale
+        entry = (priority, next(self._order), device_id)
+        self._queued[device_id] = entry
+        heapq.heappush(self._queue, entry)
+        if len(self._queue) > 2 * len(self._queued):
+            self._queue = list(self._queued.values())
+            heapq.heapify(self._queue)
+        self._condition.notify()
+
+    def submit(
+        self, code_name: str, value, device_id: str = None, priority: int = NORMAL
+    ) -> Future:
+        """
+        Queue a command.
+
+        :param code_name: function name
+        :param value: value
+        :param device_id: select device_id for this command only. tuya_bulb_control.Bulb(device_id) will be ignored
+        :param priority: HIGH; NORMAL; LOW or any int, lower values are sent first
+        :raise RuntimeError: if the dispatcher is closed
+        :return: concurrent.futures.Future with the response dict
+        """
+        device_id = self._bulb._check_device_id(device_id)
+        job = _Job(code_name, value, priority)
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The dispatcher is closed")
+
+            jobs = self._pending.setdefault(device_id, [])
+            if self._supersede:
+                for item in [item for item in jobs if item.code_name == code_name]:
+                    jobs.remove(item)
+                    item.future.cancel()
+                    self.superseded += 1
+
+            jobs.append(job)
+            self.submitted += 1
+            self._schedule(device_id)
+
+        return job.future
+
+    @contextmanager
+    def capture(self, device_id: str = None, priority: int = NORMAL):
+        """
+        Queue the commands of Bulb setters called inside the block,
+        instead of sending them.
+
+        :param device_id: select device_id for this block only. tuya_bulb_control.Bulb(device_id) will be ignored
+        :param priority: priority of the captured commands
+        :return: list, filled with the futures of the commands when the block exits
+        """
+        batch = CommandBatch(bulb=self._bulb, device_id=device_id, check=False)
+        futures = []
+        self._bulb._batches.append(batch)
+
+        try:
+            yield futures
+        finally:
+            self._bulb._batches.remove(batch)
+
+        for batch_device_id, commands in batch._commands.items():
+            for code_name, value in commands.items():
+                futures.append(
+                    self.submit(
+                        code_name=code_name,
+                        value=value,
+                        device_id=batch_device_id,
+                        priority=priority,
+                    )
+                )
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until every queued command is sent.
+
+        :param timeout: max seconds to wait. None == no limit
+        :return: False if the timeout expired
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+
+        with self._condition:
+            while self._pending or self._busy:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+
+        return True
+
+    def close(self, flush: bool = True):
+        """
+        Stop the background threads.
+
+        :param flush: send the queued commands first, else cancel them
+        """
+        if flush:
+            self.flush()
+
+        with self._condition:
+            self._closed = True
+            for jobs in self._pending.values():
+                for job in jobs:
+                    job.future.cancel()
+            self._pending.clear()
+            self._queued.clear()
+            self._condition.notify_all()
+
+        for thread in self._threads:
+            thread.join()
+
+    def _take(self):
+        """
+        Take the pending commands of the most urgent device. Call with the lock held.
+        A repeated code and the commands after it stay pending for the next request.
+
+        :return: (device_id, list of _Job), or None if no device is ready
+        """
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            device_id = entry[2]
+            if self._queued.get(device_id) is not entry:
+                continue
+
+            del self._queued[device_id]
+            self._busy.add(device_id)
+            jobs = self._pending.pop(device_id)
+            codes = set()
+            for index, job in enumerate(jobs):
+                if job.future.cancelled():
+                    continue
+                if job.code_name in codes:
+                    self._pending[device_id] = jobs[index:]
+                    return device_id, jobs[:index]
+                codes.add(job.code_name)
+
+            return device_id, jobs
+
+        return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        return
+                    taken = self._take()
+                    if taken is not None:
+                        break
+                    self._condition.wait()
+
+            device_id, jobs = taken
+            jobs = [job for job in jobs if job.future.set_running_or_notify_cancel()]
+            result = None
+
+            if jobs:
+                try:
+                    result = self._bulb._send_commands(
+                        commands=[
+                            {"code": job.code_name, "value": job.value} for job in jobs
+                        ],
+                        device_id=device_id,
+                    )
+                except Exception as exc:
+                    result = exc
+
+                for job in jobs:
+                    if isinstance(result, Exception):
+                        job.future.set_exception(result)
+                    else:
+                        job.future.set_result(result)
+
+            with self._condition:
+                self._busy.discard(device_id)
+                if jobs:
+                    self.sent += 1
+                self._schedule(device_id)
+                self._condition.notify_all()
+
+            if jobs and self._on_result is not None:
+                try:
+                    self._on_result(device_id, result)
+                except Exception:
+                    # A failing callback must not stop the worker
+                    with self._condition:
+                        self.callback_errors += 1
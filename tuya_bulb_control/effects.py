@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import math
+import threading
+from time import monotonic
+from .colour import _round_div
+from .exceptions import FunctionNotSupported
+
+# Colours are (h, s, v) tuples: h 0-360, s and v 0-1000 (colour_data_v2 units)
+
+EASINGS = {
+    "linear": lambda x: x,
+    "ease_in": lambda x: x * x,
+    "ease_out": lambda x: 1 - (1 - x) * (1 - x),
+    "ease_in_out": lambda x: (1 - math.cos(math.pi * x)) / 2,
+}
+
+# scene_data_v2 speed range, used when the device schema does not provide one
+_SCENE_DURATION_RANGE = (0, 100)
+
+
+def interpolate(start: tuple, end: tuple, x: float) -> tuple:
+    """
+    Interpolate between two HSV colours, turning the hue the short way round.
+
+    :param start: (h, s, v)
+    :param end: (h, s, v)
+    :param x: position from 0 to 1
+    :return: (h, s, v) of ints
+    """
+    dh = (end[0] - start[0] + 180) % 360 - 180
+
+    return (
+        int(round(start[0] + dh * x)) % 360,
+        int(round(start[1] + (end[1] - start[1]) * x)),
+        int(round(start[2] + (end[2] - start[2]) * x)),
+    )
+
+
+class Transition:
+    """
+    Fade from one HSV colour to another.
+
+    :param start: (h, s, v). h 0-360, s and v 0-1000
+    :param end: (h, s, v). h 0-360, s and v 0-1000
+    :param duration: seconds
+    :param easing: name from tuya_bulb_control.effects.EASINGS
+    """
+
+    def __init__(self, start: tuple, end: tuple, duration: float, easing="linear"):
+        if easing not in EASINGS:
+            raise ValueError(f"{easing} -> Unknown easing")
+
+        self.start = tuple(start)
+        self.end = tuple(end)
+        self.duration = duration
+        self.easing = easing
+
+    def frames(self, fps: float) -> list:
+        """
+        Precompute the frames of the transition.
+
+        :param fps: frames per second
+        :return: list of (offset seconds, (h, s, v))
+        """
+        ease = EASINGS[self.easing]
+        count = max(1, int(math.ceil(self.duration * fps)))
+
+        return [
+            (
+                self.duration * index / count,
+                interpolate(self.start, self.end, ease(index / count)),
+            )
+            for index in range(count + 1)
+        ]
+
+
+class Effect:
+    """
+    Sequence of transitions played one after another.
+
+    :param transitions: list of tuya_bulb_control.effects.Transition
+    :param loops: number of times to play the sequence
+    """
+
+    def __init__(self, transitions: list, loops: int = 1):
+        self.transitions = list(transitions)
+        self.loops = loops
+
+    @classmethod
+    def fade(cls, start: tuple, end: tuple, duration: float, easing="ease_in_out"):
+        """
+        Single fade.
+
+        :param start: (h, s, v)
+        :param end: (h, s, v)
+        :param duration: seconds
+        :param easing: name from tuya_bulb_control.effects.EASINGS
+        :return: effect
+        """
+        return cls([Transition(start, end, duration, easing)])
+
+    @classmethod
+    def cycle(cls, colours: list, period: float, loops: int = 1, easing="linear"):
+        """
+        Fade through the colours and back to the first one.
+
+        :param colours: list of (h, s, v)
+        :param period: seconds for a full cycle
+        :param loops: number of cycles
+        :param easing: name from tuya_bulb_control.effects.EASINGS
+        :return: effect
+        """
+        step = period / len(colours)
+        transitions = [
+            Transition(colour, colours[(index + 1) % len(colours)], step, easing)
+            for index, colour in enumerate(colours)
+        ]
+
+        return cls(transitions, loops=loops)
+
+    @property
+    def duration(self) -> float:
+        return sum(item.duration for item in self.transitions) * self.loops
+
+    def timeline(self, fps: float) -> list:
+        """
+        Precompute the frames of the whole effect.
+        Frames that would repeat the previous colour are left out.
+
+        :param fps: frames per second
+        :return: list of (offset seconds, (h, s, v))
+        """
+        timeline = []
+        offset = 0.0
+
+        for _ in range(self.loops):
+            for transition in self.transitions:
+                for frame_offset, colour in transition.frames(fps):
+                    if not timeline or timeline[-1][1] != colour:
+                        timeline.append((offset + frame_offset, colour))
+                offset += transition.duration
+
+        return timeline
+
+    def scene_data(self, schema: dict = None, scene_num: int = 1) -> dict:
+        """
+        scene_data_v2 value that lets the device play the transitions itself.
+        Scenes loop until the work mode changes.
+
+        :param schema: parsed "values" of the device scene_data_v2 function
+        :param scene_num: scene number
+        :return: scene_data_v2 value
+        """
+        units = (schema or {}).get("scene_units", {})
+        speed = units.get("unit_gradient_duration", {})
+        low = speed.get("min", _SCENE_DURATION_RANGE[0])
+        high = speed.get("max", _SCENE_DURATION_RANGE[1])
+
+        def duration(seconds):
+            # Device speed units are roughly tenths of a second
+            return max(low, min(high, int(round(seconds * 10))))
+
+        return {
+            "scene_num": scene_num,
+            "scene_units": [
+                {
+                    "unit_change_mode": "gradient",
+                    "unit_switch_duration": duration(item.duration),
+                    "unit_gradient_duration": duration(item.duration),
+                    "bright": 0,
+                    "temperature": 0,
+                    "h": item.start[0],
+                    "s": item.start[1],
+                    "v": item.start[2],
+                }
+                for item in self.transitions
+            ],
+        }
+
+
+class EffectPlayer:
+    """
+    Plays effects on one or many bulbs in sync.
+
+    Frames are scheduled against wall time. When sending falls behind, the
+    frames that are already late are dropped instead of queued.
+    The frame rate is capped so the whole group stays within max_rate.
+    Devices that fail a frame are reported in the "errors" of play(), and
+    to on_error if given.
+
+    :param bulb: tuya_bulb_control.Bulb instance
+    :param fps: wanted frames per second
+    :param max_rate: max requests per second for the whole group. None == no limit
+    :param use_scenes: play looping effects as scene_data_v2 where every device supports it
+    :param on_error: function(device_id, error) called when a device fails a frame,
+        error is the raised exception or the unsuccessful response dict
+    """
+
+    def __init__(
+        self,
+        bulb,
+        fps: float = 2,
+        max_rate: float = None,
+        use_scenes: bool = True,
+        on_error=None,
+    ):
+        self._bulb = bulb
+        self.fps = fps
+        self.max_rate = max_rate
+        self.use_scenes = use_scenes
+        self.on_error = on_error
+
+    def _fps(self, devices: int) -> float:
+        if self.max_rate is None:
+            return self.fps
+
+        return min(self.fps, self.max_rate / devices)
+
+    def _scene_schema(self, device_ids: list):
+        """
+        Get the scene_data_v2 schema if every device supports it.
+        The functions of the devices are fetched concurrently.
+
+        :return: parsed schema or None
+        """
+        functions = self._bulb._fan_out(
+            device_ids,
+            lambda device_id: self._bulb._function("scene_data_v2", device_id),
+        )
+        schema = None
+
+        for function in functions.values():
+            if isinstance(function, FunctionNotSupported):
+                return None
+            if isinstance(function, Exception):
+                raise function
+            schema = json.loads(function.get("values") or "{}")
+
+        return schema
+
+    def _apply(self, device_ids: list, commands: list, stats: dict):
+        """
+        Send commands to the devices, keeping the failures in stats["errors"].
+        """
+        for device_id, response in self._bulb.apply(device_ids, commands).items():
+            if isinstance(response, Exception) or not response.get("success"):
+                stats["errors"][device_id] = response
+                if self.on_error is not None:
+                    self.on_error(device_id, response)
+
+    @staticmethod
+    def _colour_command(code_name: str, colour: tuple) -> dict:
+        """
+        :param code_name: colour_data_v2, or colour_data for v1 devices
+        :param colour: (h, s, v) in colour_data_v2 units
+        :return: command dict
+        """
+        h, s, v = colour
+        if code_name == "colour_data":
+            s, v = _round_div(s * 255, 1000), _round_div(v * 255, 1000)
+
+        return {"code": code_name, "value": {"h": h, "s": s, "v": v}}
+
+    def _play_scene(
+        self,
+        effect: Effect,
+        device_ids: list,
+        schema: dict,
+        code_name: str,
+        stop: threading.Event,
+    ) -> dict:
+        """
+        Let the devices play the effect as a scene for its duration,
+        then stop the scene at the colour it has reached.
+
+        :return: dict with keys sent, dropped, scene, errors
+        """
+        stats = {"sent": 2, "dropped": 0, "scene": True, "errors": {}}
+        self._apply(
+            device_ids,
+            [
+                {"code": "work_mode", "value": "scene"},
+                {"code": "scene_data_v2", "value": effect.scene_data(schema)},
+            ],
+            stats,
+        )
+        started = monotonic()
+        stop.wait(effect.duration)
+
+        # The scene loops until the work mode changes
+        elapsed = monotonic() - started
+        colour = effect.transitions[-1].end
+        for offset, item in effect.timeline(self._fps(len(device_ids))):
+            if offset > elapsed:
+                break
+            colour = item
+
+        self._apply(
+            device_ids,
+            [
+                {"code": "work_mode", "value": "colour"},
+                self._colour_command(code_name, colour),
+            ],
+            stats,
+        )
+
+        return stats
+
+    def play(
+        self,
+        effect: Effect,
+        device_ids: list = None,
+        code_name: str = "colour_data_v2",
+        stop: threading.Event = None,
+    ) -> dict:
+        """
+        Play an effect and block until it is done.
+        With use_scenes, an effect of several loops is played by the devices
+        as a scene, stopped when its duration has passed.
+
+        :param effect: tuya_bulb_control.effects.Effect
+        :param device_ids: devices to play on. Default: tuya_bulb_control.Bulb(device_id)
+        :param code_name: colour_data_v2, or colour_data for v1 devices
+        :param stop: event to stop playing early
+        :return: dict with keys
+            sent - frames sent
+            dropped - late frames left out
+            scene - played as a device scene
+            errors - {device_id: raised exception or unsuccessful response}
+                of the last failed frame of every device
+        """
+        device_ids = list(device_ids or [self._bulb._check_device_id(None)])
+        stats = {"sent": 0, "dropped": 0, "scene": False, "errors": {}}
+        if stop is None:
+            stop = threading.Event()
+
+        if self.use_scenes and effect.loops > 1:
+            schema = self._scene_schema(device_ids)
+            if schema is not None:
+                return self._play_scene(effect, device_ids, schema, code_name, stop)
+
+        timeline = effect.timeline(self._fps(len(device_ids)))
+        started = monotonic()
+        index = 0
+
+        while index < len(timeline):
+            if stop.is_set():
+                break
+
+            # Skip to the newest frame that is already due
+            now = monotonic() - started
+            latest = index
+            while latest + 1 < len(timeline) and timeline[latest + 1][0] <= now:
+                latest += 1
+            stats["dropped"] += latest - index
+            index = latest
+
+            offset, colour = timeline[index]
+            if offset > now and stop.wait(offset - now):
+                break
+
+            commands = [self._colour_command(code_name, colour)]
+            if stats["sent"] == 0:
+                commands.insert(0, {"code": "work_mode", "value": "colour"})
+
+            self._apply(device_ids, commands, stats)
+            stats["sent"] += 1
+            index += 1
+
+        return stats
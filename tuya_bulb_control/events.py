@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import queue
+import threading
+from base64 import b64decode
+from hashlib import md5
+from ._crypto import aes_decrypt, aes_gcm_decrypt, require_aes
+from .cache import StateCache
+from .exceptions import MessageError
+from .online import OnlineTracker
+from .ratelimit import RetryPolicy
+
+try:
+    import websocket
+except ImportError:  # pragma: no cover
+    websocket = None
+
+# Message service endpoints by region key
+MQ_URLS = {
+    "cn": "wss://mqe.tuyacn.com:8285/",
+    "us": "wss://mqe.tuyaus.com:8285/",
+    "eu": "wss://mqe.tuyaeu.com:8285/",
+    "in": "wss://mqe.tuyain.com:8285/",
+}
+# Message service environments
+ENV_PROD = "event"
+ENV_TEST = "event-test"
+
+# Code of the events reporting a device going online or offline
+ONLINE = "online"
+
+DEFAULT_QUEUE_SIZE = 1000
+
+
+class Event:
+    """
+    Status change of one device function.
+
+    :param device_id: device id
+    :param code: function code, or tuya_bulb_control.events.ONLINE
+    :param value: new value, json values as a string like the status endpoint
+    :param t: device timestamp in milliseconds
+    """
+
+    __slots__ = ("device_id", "code", "value", "t")
+
+    def __init__(self, device_id: str, code: str, value, t: int = None):
+        self.device_id = device_id
+        self.code = code
+        self.value = value
+        self.t = t
+
+    def __repr__(self):
+        return f"Event({self.device_id!r}, {self.code!r}, {self.value!r}, {self.t!r})"
+
+
+def decode_message(message: dict, secret_key: str) -> dict:
+    """
+    Decode and decrypt a message of the message service.
+
+    :param message: message received from the service
+    :param secret_key: project secret key, the decryption key is derived from it
+    :return: message data dict
+    """
+    payload = json.loads(b64decode(message["payload"]))
+    data = b64decode(payload["data"])
+    key = secret_key[8:24].encode("utf-8")
+
+    if message.get("properties", {}).get("em") == "aes_gcm":
+        data = aes_gcm_decrypt(key, data)
+    else:
+        data = aes_decrypt(key, data)
+
+    return json.loads(data)
+
+
+def parse_events(data: dict) -> list:
+    """
+    Get the events of a decoded message.
+
+    :param data: message data dict
+    :return: list of tuya_bulb_control.events.Event
+    """
+    device_id = data.get("devId")
+
+    if data.get("bizCode") in ("online", "offline"):
+        online = data["bizCode"] == "online"
+        return [Event(device_id, ONLINE, online, data.get("ts"))]
+
+    return [
+        Event(device_id, item["code"], item["value"], item.get("t"))
+        for item in data.get("status", [])
+        if "code" in item
+    ]
+
+
+class EventSource:
+    """
+    Source of messages, e.g. a message service connection.
+    """
+
+    def connect(self):
+        """
+        Connect, or reconnect after close().
+        """
+        raise NotImplementedError
+
+    def receive(self, timeout: float):
+        """
+        Wait for the next message.
+
+        :param timeout: max seconds to wait
+        :raise tuya_bulb_control.exceptions.MessageError: if the message can't be
+            decoded, with the message id as target
+        :return: (message id, message data dict), or None on timeout
+        """
+        raise NotImplementedError
+
+    def ack(self, message_id):
+        """
+        Confirm a message, so it is not delivered again.
+
+        :param message_id: message id
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Close the connection.
+        """
+        raise NotImplementedError
+
+
+class PulsarSource(EventSource):
+    """
+    Tuya message service, Pulsar over a websocket.
+    Requires websocket-client and cryptography: pip install tuya_bulb_control[events]
+
+    :param client_id: your client id
+    :param secret_key: your secret key
+    :param region_key: cn; us; eu; in
+    :param env: tuya_bulb_control.events.ENV_PROD or ENV_TEST
+    :param url: message service url. Default: by region_key
+    :param timeout: connection timeout in seconds
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        secret_key: str,
+        region_key: str,
+        env: str = ENV_PROD,
+        url: str = None,
+        timeout: float = 10,
+    ):
+        if websocket is None:
+            raise ImportError(
+                "PulsarSource requires websocket-client: "
+                "pip install tuya_bulb_control[events]"
+            )
+        require_aes("PulsarSource", extra="events")
+
+        self._client_id = client_id
+        self._secret_key = secret_key
+        self._url = (
+            f"{url or MQ_URLS[region_key]}ws/v2/consumer/persistent/"
+            f"{client_id}/out/{env}/{client_id}-sub"
+            "?ackTimeoutMillis=3000&subscriptionType=Failover"
+        )
+        self._timeout = timeout
+        self._connection = None
+
+    def connect(self):
+        secret_hash = md5(self._secret_key.encode("utf-8")).hexdigest()
+        password = md5((self._client_id + secret_hash).encode("utf-8")).hexdigest()
+
+        self._connection = websocket.create_connection(
+            self._url,
+            header={
+                "Connection": "Upgrade",
+                "username": self._client_id,
+                "password": password[8:24],
+            },
+            timeout=self._timeout,
+        )
+
+    def receive(self, timeout: float):
+        self._connection.settimeout(timeout)
+        try:
+            message = json.loads(self._connection.recv())
+        except websocket.WebSocketTimeoutException:
+            return None
+
+        try:
+            data = decode_message(message, self._secret_key)
+        except Exception as exc:
+            raise MessageError(target=message["messageId"], msg=str(exc))
+
+        return message["messageId"], data
+
+    def ack(self, message_id):
+        self._connection.send(json.dumps({"messageId": message_id}))
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class Subscriber:
+    """
+    Receives status changes pushed by the message service.
+
+    A reader thread takes messages from the source, reconnecting with
+    backoff when the connection drops, and a dispatcher thread updates the
+    state cache and calls the callbacks. Between them is a bounded queue,
+    when it is full the overflow policy applies:
+        "block" - stop reading until there is room; unread messages wait
+            on the service side
+        "drop_oldest" - drop the oldest queued event
+    Messages are confirmed once their events are queued. Messages that can't
+    be decoded are confirmed too, so they are not delivered again and again,
+    and reported to on_error.
+
+    Example:
+        with Subscriber(source, state_cache=cache) as subscriber:
+            subscriber.on(print, device_id="device_id", code_name="switch_led")
+
+    :param source: tuya_bulb_control.events.EventSource
+    :param state_cache: tuya_bulb_control.cache.StateCache to keep up to date
+    :param online_tracker: tuya_bulb_control.online.OnlineTracker to keep up to date
+    :param queue_size: max events waiting for the dispatcher
+    :param overflow: overflow policy. "block" or "drop_oldest"
+    :param retry: tuya_bulb_control.ratelimit.RetryPolicy, backoff between reconnects.
+        Default: RetryPolicy()
+    :param on_error: function(event, exception) called when a callback raises,
+        or function(None, tuya_bulb_control.exceptions.MessageError) for a message
+        that can't be decoded
+    """
+
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+
+    # Seconds between checks for close() while waiting
+    _POLL = 0.5
+
+    def __init__(
+        self,
+        source: EventSource,
+        state_cache: StateCache = None,
+        online_tracker: OnlineTracker = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        overflow: str = BLOCK,
+        retry: RetryPolicy = None,
+        on_error=None,
+    ):
+        if overflow not in (self.BLOCK, self.DROP_OLDEST):
+            raise ValueError(f"{overflow} -> Unknown overflow policy")
+
+        self._source = source
+        self._state_cache = state_cache
+        self._online_tracker = online_tracker
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._overflow = overflow
+        self._retry = RetryPolicy() if retry is None else retry
+        self._on_error = on_error
+
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+        self.received = 0
+        self.dispatched = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self.errors = 0
+        self.undecodable = 0
+
+        self._reader = threading.Thread(
+            target=self._read, name="tuya_bulb_control.events.reader", daemon=True
+        )
+        self._dispatcher = threading.Thread(
+            target=self._dispatch,
+            name="tuya_bulb_control.events.dispatcher",
+            daemon=True,
+        )
+        self._reader.start()
+        self._dispatcher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def on(self, callback, device_id: str = None, code_name: str = None):
+        """
+        Call a function for matching events.
+
+        :param callback: function(tuya_bulb_control.events.Event)
+        :param device_id: only events of this device. Default: all devices
+        :param code_name: only events of this code. Default: all codes
+        :return: handle for off()
+        """
+        handle = (device_id, code_name, callback)
+        with self._lock:
+            self._callbacks = self._callbacks + [handle]
+
+        return handle
+
+    def off(self, handle):
+        """
+        Stop calling a function registered with on().
+
+        :param handle: handle returned by on()
+        """
+        with self._lock:
+            self._callbacks = [item for item in self._callbacks if item is not handle]
+
+    def close(self):
+        """
+        Stop both threads and close the source.
+        Events still queued are dispatched first.
+        """
+        self._closed.set()
+        self._reader.join()
+        self._dispatcher.join()
+
+    def _report(self, event: Event, exc: Exception):
+        if self._on_error is None:
+            return
+
+        try:
+            self._on_error(event, exc)
+        except Exception:
+            # A failing error handler must not stop the thread
+            pass
+
+    def _put(self, event: Event) -> bool:
+        """
+        :return: False if the event was not queued because of close()
+        """
+        if self._overflow == self.DROP_OLDEST:
+            while True:
+                try:
+                    self._queue.put_nowait(event)
+                    return True
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+        while not self._closed.is_set():
+            try:
+                self._queue.put(event, timeout=self._POLL)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def _read(self):
+        attempt = 0
+        connected = False
+
+        try:
+            while not self._closed.is_set():
+                if not connected:
+                    try:
+                        self._source.connect()
+                        connected = True
+                        attempt = 0
+                    except Exception:
+                        self._closed.wait(self._retry.delay(attempt))
+                        attempt += 1
+                        continue
+
+                try:
+                    message = self._source.receive(timeout=self._POLL)
+                except MessageError as exc:
+                    self.undecodable += 1
+                    self._report(None, exc)
+                    message = exc.target, {}
+                except Exception:
+                    self._source.close()
+                    connected = False
+                    self.reconnects += 1
+                    continue
+
+                if message is None:
+                    continue
+
+                message_id, data = message
+                self.received += 1
+                if not all(self._put(event) for event in parse_events(data)):
+                    # Closing, the message is delivered again on the next connection
+                    break
+
+                try:
+                    self._source.ack(message_id)
+                except Exception:
+                    # Not confirmed messages are delivered again
+                    self._source.close()
+                    connected = False
+                    self.reconnects += 1
+        finally:
+            self._source.close()
+
+    def _dispatch(self):
+        while True:
+            try:
+                event = self._queue.get(timeout=self._POLL)
+            except queue.Empty:
+                if self._closed.is_set() and not self._reader.is_alive():
+                    return
+                continue
+
+            if event.code == ONLINE:
+                if self._online_tracker is not None:
+                    self._online_tracker.set(event.device_id, event.value)
+            elif self._state_cache is not None:
+                self._state_cache.update(event.device_id, {event.code: event.value})
+
+            for device_id, code_name, callback in self._callbacks:
+                if device_id not in (None, event.device_id):
+                    continue
+                if code_name not in (None, event.code):
+                    continue
+
+                try:
+                    callback(event)
+                except Exception as exc:
+                    self.errors += 1
+                    self._report(event, exc)
+
+            self.dispatched += 1
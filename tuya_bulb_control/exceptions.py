@@ -29,3 +29,39 @@ class AuthorizedError(__MainException):
     def __init__(self, target: str, msg: str = "Authorized error."):
         self.target = target
         self.msg = msg
+
+
+class RequestError(__MainException):
+    def __init__(self, target: str, msg: str = "Request error."):
+        self.target = target
+        self.msg = msg
+
+
+class RateLimited(RequestError):
+    def __init__(self, target: str, msg: str = "Request frequency is too high."):
+        self.target = target
+        self.msg = msg
+
+
+class LocalError(__MainException):
+    def __init__(self, target: str, msg: str = "Local control error."):
+        self.target = target
+        self.msg = msg
+
+
+class DeviceOffline(__MainException):
+    def __init__(self, target: str, msg: str = "Device is offline."):
+        self.target = target
+        self.msg = msg
+
+
+class ValueNotInRange(__MainException, ValueError):
+    def __init__(self, target: str, msg: str = "Value not in range."):
+        self.target = target
+        self.msg = msg
+
+
+class MessageError(__MainException):
+    def __init__(self, target: str, msg: str = "Message could not be decoded."):
+        self.target = target
+        self.msg = msg
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+from .exceptions import RequestError
+
+# Smallest group worth a group command, smaller ones are sent per device
+MIN_GROUP_SIZE = 2
+
+
+def _device_ids(value) -> frozenset:
+    """
+    Device ids of a group, the API lists them as a list or a comma separated string.
+    """
+    if isinstance(value, str):
+        value = value.split(",")
+
+    return frozenset(item for item in value or () if item)
+
+
+class GroupManager:
+    """
+    Cloud device groups, to send commands to many devices in one request.
+
+    Groups of the Tuya cloud hold devices of one product, so sync() makes one
+    group per product. apply() covers the wanted devices with known groups
+    whose members are all wanted, biggest first, and sends the commands to
+    the rest of the devices one request per device.
+
+    Example:
+        groups = GroupManager(bulb, owner_id=HOME_ID, registry=registry)
+        groups.sync("Floor 1", floor_device_ids)
+        groups.apply(floor_device_ids, [{"code": "switch_led", "value": False}])
+
+    :param bulb: tuya_bulb_control.Bulb instance
+    :param owner_id: home id the groups belong to
+    :param registry: tuya_bulb_control.DeviceRegistry with the product ids of devices.
+        Default: fetch the device details
+    :param min_size: smallest group worth a group command
+    """
+
+    def __init__(self, bulb, owner_id, registry=None, min_size: int = MIN_GROUP_SIZE):
+        self._bulb = bulb
+        self._owner_id = owner_id
+        self._registry = registry
+        self.min_size = min_size
+
+        # {group_id: frozenset of device ids}
+        self._groups = {}
+        # {name: {product_id: group_id}}
+        self._synced = {}
+        self._lock = threading.Lock()
+
+    @property
+    def groups(self) -> dict:
+        """
+        Known groups.
+
+        :return: {group_id: frozenset of device ids}
+        """
+        with self._lock:
+            return dict(self._groups)
+
+    def _check(self, response: dict, postfix: str) -> dict:
+        if not response.get("success"):
+            raise RequestError(target=postfix, msg=str(response.get("msg")))
+
+        return response
+
+    def add(self, group_id, device_ids):
+        """
+        Register an existing group.
+
+        :param group_id: group id
+        :param device_ids: member device ids
+        """
+        with self._lock:
+            self._groups[group_id] = frozenset(device_ids)
+
+    def load(self, group_id) -> frozenset:
+        """
+        Register an existing group with its members from the API.
+
+        :param group_id: group id
+        :raise tuya_bulb_control.exceptions.RequestError: if the request failed
+        :return: member device ids
+        """
+        postfix = f"/device-groups/{group_id}"
+        result = self._check(self._bulb._get(postfix), postfix)["result"]
+        device_ids = _device_ids(result.get("device_ids"))
+        self.add(group_id, device_ids)
+
+        return device_ids
+
+    def create(self, name: str, device_ids, product_id: str) -> str:
+        """
+        Create a group.
+
+        :param name: group name
+        :param device_ids: member device ids, all of product_id
+        :param product_id: product id of the devices
+        :raise tuya_bulb_control.exceptions.RequestError: if the request failed
+        :return: group id
+        """
+        device_ids = frozenset(device_ids)
+        response = self._check(
+            self._bulb._post(
+                "/device-groups",
+                body={
+                    "name": name,
+                    "product_id": product_id,
+                    "owner_id": self._owner_id,
+                    "device_ids": ",".join(sorted(device_ids)),
+                },
+            ),
+            "/device-groups",
+        )
+        result = response["result"]
+        group_id = result["id"] if isinstance(result, dict) else result
+        self.add(group_id, device_ids)
+
+        return group_id
+
+    def update(self, group_id, device_ids, name: str = None):
+        """
+        Replace the members of a group.
+
+        :param group_id: group id
+        :param device_ids: member device ids
+        :param name: new group name
+        :raise tuya_bulb_control.exceptions.RequestError: if the request failed
+        """
+        device_ids = frozenset(device_ids)
+        body = {"device_ids": ",".join(sorted(device_ids))}
+        if name is not None:
+            body["name"] = name
+
+        postfix = f"/device-groups/{group_id}"
+        self._check(self._bulb._put(postfix, body=body), postfix)
+        self.add(group_id, device_ids)
+
+    def delete(self, group_id):
+        """
+        Delete a group.
+
+        :param group_id: group id
+        :raise tuya_bulb_control.exceptions.RequestError: if the request failed
+        """
+        postfix = f"/device-groups/{group_id}"
+        self._check(self._bulb._delete(postfix), postfix)
+
+        with self._lock:
+            self._groups.pop(group_id, None)
+            for groups in self._synced.values():
+                for product_id, synced_id in list(groups.items()):
+                    if synced_id == group_id:
+                        del groups[product_id]
+
+    def products(self, device_ids) -> dict:
+        """
+        Get the product ids of devices, from the registry when possible.
+
+        :param device_ids: device ids
+        :return: {device_id: product_id}
+        """
+        products = {}
+        missing = []
+
+        for device_id in device_ids:
+            if self._registry is not None and device_id in self._registry:
+                products[device_id] = self._registry.get(device_id).product_id
+            else:
+                missing.append(device_id)
+
+        for device_id, response in self._bulb._fan_out(
+            missing, lambda device_id: self._bulb._get(f"/devices/{device_id}")
+        ).items():
+            if isinstance(response, Exception):
+                raise response
+            products[device_id] = self._check(response, f"/devices/{device_id}")[
+                "result"
+            ]["product_id"]
+
+        return products
+
+    def sync(self, name: str, device_ids) -> dict:
+        """
+        Make the groups of a name hold exactly these devices, one group per product.
+        Groups are created, updated or deleted as needed. Products with fewer
+        than min_size devices get no group.
+
+        :param name: group name
+        :param device_ids: member device ids
+        :raise tuya_bulb_control.exceptions.RequestError: if a request failed
+        :return: {product_id: group_id}
+        """
+        by_product = {}
+        for device_id, product_id in self.products(device_ids).items():
+            by_product.setdefault(product_id, set()).add(device_id)
+
+        with self._lock:
+            current = dict(self._synced.get(name, {}))
+
+        synced = {}
+        for product_id, members in by_product.items():
+            if len(members) < self.min_size:
+                continue
+
+            group_id = current.pop(product_id, None)
+            if group_id is None:
+                group_id = self.create(name, members, product_id)
+            elif self.groups.get(group_id) != members:
+                self.update(group_id, members)
+            synced[product_id] = group_id
+
+        for group_id in current.values():
+            self.delete(group_id)
+
+        with self._lock:
+            self._synced[name] = synced
+
+        return dict(synced)
+
+    def send(self, group_id, commands: list) -> dict:
+        """
+        Send commands to every device of a group in one request.
+
+        :param group_id: group id
+        :param commands: list of {"code": ..., "value": ...} dicts
+        :return: response dict
+        """
+        response = self._bulb._post(
+            f"/device-groups/{group_id}/issued", body={"functions": commands}
+        )
+
+        if response.get("success"):
+            for device_id in self.groups.get(group_id, ()):
+                self._bulb._cache_commands(commands=commands, device_id=device_id)
+
+        return response
+
+    def plan(self, device_ids) -> tuple:
+        """
+        Choose the groups covering the devices.
+
+        :param device_ids: device ids
+        :return: (list of group ids, list of device ids left for per-device requests)
+        """
+        device_ids = list(dict.fromkeys(device_ids))
+        remaining = set(device_ids)
+        group_ids = []
+
+        for group_id, members in sorted(
+            self.groups.items(), key=lambda item: len(item[1]), reverse=True
+        ):
+            if len(members) >= self.min_size and members <= remaining:
+                group_ids.append(group_id)
+                remaining -= members
+
+        return group_ids, [item for item in device_ids if item in remaining]
+
+    def apply(self, device_ids, commands: list) -> dict:
+        """
+        Send the same commands to many devices with as few requests as possible.
+        Groups covering wanted devices get one request each, the other devices
+        one request per device, all concurrently. When a group command fails,
+        its devices are tried one by one.
+
+        :param device_ids: device ids
+        :param commands: list of {"code": ..., "value": ...} dicts
+        :return: dict by device id with the response or the raised exception
+        """
+        group_ids, single_ids = self.plan(device_ids)
+        groups = self.groups
+
+        def run(item):
+            kind, key = item
+            if kind == "device":
+                return {
+                    key: self._bulb._send_commands(commands=commands, device_id=key)
+                }
+
+            response = self.send(key, commands)
+            if response.get("success"):
+                return dict.fromkeys(groups[key], response)
+
+            # Already on a pool thread, so one by one instead of a nested fan-out
+            results = {}
+            for device_id in groups[key]:
+                try:
+                    results[device_id] = self._bulb._send_commands(
+                        commands=commands, device_id=device_id
+                    )
+                except Exception as exc:
+                    results[device_id] = exc
+
+            return results
+
+        items = [("group", item) for item in group_ids]
+        items += [("device", item) for item in single_ids]
+
+        results = {}
+        for (kind, key), result in self._bulb._fan_out(items, run).items():
+            if isinstance(result, Exception):
+                members = groups[key] if kind == "group" else [key]
+                result = dict.fromkeys(members, result)
+            results.update(result)
+
+        return results
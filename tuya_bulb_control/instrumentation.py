@@ -0,0 +1,568 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import json
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+
+try:
+    import contextvars
+except ImportError:
+    # Python 3.6, operations are tracked per thread
+    contextvars = None
+
+# Upper bounds of the latency histogram buckets, seconds
+BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# Endpoint of the schema requests made by check=True
+VALIDATION_ENDPOINT = "GET /devices/{device_id}/functions"
+
+_ENDPOINT_IDS = re.compile(
+    r"/(devices|device-groups|homes|token|users)/(?!status\b)[^/?]+"
+)
+_ENDPOINT_NAMES = {
+    "devices": "{device_id}",
+    "device-groups": "{group_id}",
+    "homes": "{home_id}",
+    "token": "{refresh_token}",
+    "users": "{uid}",
+}
+
+
+def endpoint(method: str, postfix: str) -> str:
+    """
+    Endpoint of a request, with ids and the query string left out.
+
+    :param method: HTTP method. Example: GET; POST
+    :param postfix: request address. Example: /devices/{device_id}/commands
+    :return: endpoint. Example: POST /devices/{device_id}/commands
+    """
+    path = _ENDPOINT_IDS.sub(
+        lambda match: f"/{match.group(1)}/{_ENDPOINT_NAMES[match.group(1)]}",
+        postfix.split("?", 1)[0],
+    )
+
+    return f"{method} {path}"
+
+
+class _Operation:
+    __slots__ = ("name", "requests")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.requests = 0
+
+
+if contextvars is not None:
+    _operation = contextvars.ContextVar("tuya_bulb_control_operation", default=None)
+
+    def _current() -> _Operation:
+        return _operation.get()
+
+    def _enter(operation: _Operation):
+        return _operation.set(operation)
+
+    def _leave(token):
+        _operation.reset(token)
+
+else:
+    _local = threading.local()
+
+    def _current() -> _Operation:
+        return getattr(_local, "operation", None)
+
+    def _enter(operation: _Operation):
+        previous = _current()
+        _local.operation = operation
+        return previous
+
+    def _leave(token):
+        _local.operation = token
+
+
+def current_operation() -> str:
+    """
+    Name of the Bulb method running in this thread or task.
+
+    :return: method name, or None outside of an instrumented method
+    """
+    operation = _current()
+
+    return None if operation is None else operation.name
+
+
+def instrumented(function):
+    """
+    Attribute the requests of a public method to its name.
+    A method called from another instrumented method is attributed to the
+    outer one. Costs one attribute lookup when instrumentation is disabled.
+    """
+    name = function.__name__
+
+    @wraps(function)
+    def wrapper(self, *args, **kwargs):
+        instrumentation = self._instrumentation
+        if instrumentation is None:
+            return function(self, *args, **kwargs)
+
+        with instrumentation.operation(name):
+            return function(self, *args, **kwargs)
+
+    return wrapper
+
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets, safe to share between threads.
+
+    :param buckets: upper bounds of the buckets, seconds, ascending
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum", "max", "_lock")
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        # The last count is for values above the last bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """
+        :param value: seconds
+        """
+        index = bisect_left(self.buckets, value)
+
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, percent: float) -> float:
+        """
+        Estimate a percentile, as the upper bound of its bucket.
+
+        :param percent: from 0-100
+        :return: seconds, 0.0 if nothing was observed
+        """
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+            maximum = self.max
+
+        if not count:
+            return 0.0
+
+        rank = percent / 100 * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(bound, maximum)
+
+        return maximum
+
+    def to_dict(self) -> dict:
+        """
+        :return: dict with keys
+            count, sum, mean, max, p50, p90, p99 - seconds
+            buckets - {upper bound: count}, "inf" for values above the last bucket
+        """
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+            total = self.sum
+            maximum = self.max
+
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0.0,
+            "max": maximum,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "buckets": dict(
+                zip([str(item) for item in self.buckets] + ["inf"], counts)
+            ),
+        }
+
+
+class Call:
+    """
+    One HTTP attempt, passed to the request and response hooks.
+
+    :param method: HTTP method
+    :param endpoint: endpoint. Example: POST /devices/{device_id}/commands
+    :param postfix: request address with ids
+    :param operation: name of the Bulb method that made the request, or None
+    :param attempt: number of the attempt, from 0
+    """
+
+    __slots__ = (
+        "method",
+        "endpoint",
+        "postfix",
+        "operation",
+        "attempt",
+        "started",
+        "signed",
+        "rate_limit_wait",
+        "sign_time",
+        "elapsed",
+        "status",
+        "code",
+        "success",
+        "error",
+    )
+
+    def __init__(
+        self, method: str, endpoint: str, postfix: str, operation: str, attempt: int
+    ):
+        self.method = method
+        self.endpoint = endpoint
+        self.postfix = postfix
+        self.operation = operation
+        self.attempt = attempt
+        self.started = perf_counter()
+        self.signed = self.started
+        self.rate_limit_wait = 0.0
+        self.sign_time = 0.0
+        # Seconds of the HTTP round trip, set before the response hooks
+        self.elapsed = None
+        self.status = None
+        self.code = None
+        self.success = None
+        self.error = None
+
+
+class Exporter:
+    """
+    Receives the metrics of tuya_bulb_control.Instrumentation.export().
+    Subclass it to send them to a monitoring system.
+    """
+
+    def export(self, metrics: dict):
+        """
+        :param metrics: tuya_bulb_control.Instrumentation.metrics() dict
+        """
+        raise NotImplementedError
+
+
+class JsonLinesExporter(Exporter):
+    """
+    Write the metrics as one json line per export.
+
+    :param stream: text file object
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def export(self, metrics: dict):
+        with self._lock:
+            self.stream.write(json.dumps(metrics, sort_keys=True) + "\n")
+            self.stream.flush()
+
+
+class Instrumentation:
+    """
+    Request counts, latency histograms and hooks of a Bulb.
+
+    Every HTTP attempt is timed by endpoint and attributed to the public
+    Bulb method that triggered it, also through the thread pool of apply()
+    and states(). Time is split into phases: rate_limit, sign, network and
+    retry_wait. Disabled (the default) it costs an attribute lookup per call.
+
+    Counters:
+        requests - HTTP attempts
+        retries - attempts after a throttled or failed one
+        throttled - throttled responses
+        errors - connection errors and invalid responses
+        token_grants, token_refreshes - token requests
+        token_retries - requests repeated after code 1010
+        validation_gets - schema requests made to check a value (check=True)
+        unattributed_requests - requests outside of a Bulb method
+        hook_errors - exceptions raised by hooks, they never reach the caller
+
+    Example:
+        instrumentation = Instrumentation()
+        bulb = Bulb(..., instrumentation=instrumentation)
+        bulb.set_toggle()
+        instrumentation.metrics()["operations"]["set_toggle"]["requests"]
+
+    :param exporter: tuya_bulb_control.instrumentation.Exporter for export()
+    :param buckets: histogram bucket bounds, seconds
+    """
+
+    def __init__(self, exporter: Exporter = None, buckets=BUCKETS):
+        self.exporter = exporter
+        self._buckets = tuple(buckets)
+        self._request_hooks = []
+        self._response_hooks = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Drop the collected metrics. Hooks stay registered.
+        """
+        with self._lock:
+            self.counters = Counter()
+            # {endpoint: Histogram}
+            self.endpoints = {}
+            # {method name: Histogram}
+            self.operations = {}
+            # {phase: Histogram}
+            self.phases = {}
+            # {method name: HTTP attempts}
+            self.operation_requests = Counter()
+
+    def on_request(self, hook):
+        """
+        Call a function before every HTTP attempt, after signing.
+
+        :param hook: function(tuya_bulb_control.instrumentation.Call)
+        """
+        with self._lock:
+            self._request_hooks.append(hook)
+
+    def on_response(self, hook):
+        """
+        Call a function after every HTTP attempt, also failed ones.
+
+        :param hook: function(tuya_bulb_control.instrumentation.Call)
+        """
+        with self._lock:
+            self._response_hooks.append(hook)
+
+    def count(self, name: str, value: int = 1):
+        """
+        :param name: counter name
+        :param value: increment
+        """
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, table: dict, key: str, seconds: float):
+        """
+        :param table: endpoints; operations; phases
+        :param key: histogram key
+        :param seconds: value
+        """
+        histogram = table.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = table.setdefault(key, Histogram(self._buckets))
+        histogram.observe(seconds)
+
+    @contextmanager
+    def operation(self, name: str):
+        """
+        Attribute the requests made inside the block to a method name.
+        Nested blocks are attributed to the outermost one.
+
+        :param name: method name
+        """
+        if _current() is not None:
+            yield
+            return
+
+        operation = _Operation(name)
+        token = _enter(operation)
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            _leave(token)
+            self.observe(self.operations, name, perf_counter() - started)
+            with self._lock:
+                self.operation_requests[name] += operation.requests
+
+    def bind(self, function):
+        """
+        Carry the current operation to a function run on another thread.
+
+        :param function: function
+        :return: function attributing its requests to the current operation
+        """
+        operation = _current()
+        if operation is None:
+            return function
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            token = _enter(operation)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _leave(token)
+
+        return wrapper
+
+    def _hooks(self, hooks: list, call: Call):
+        for hook in hooks:
+            try:
+                hook(call)
+            except Exception:
+                self.count("hook_errors")
+
+    def start(self, method: str, postfix: str, attempt: int) -> Call:
+        """
+        Begin timing an HTTP attempt, before rate limiting and signing.
+
+        :return: call record
+        """
+        operation = _current()
+        call = Call(
+            method=method,
+            endpoint=endpoint(method, postfix),
+            postfix=postfix,
+            operation=None if operation is None else operation.name,
+            attempt=attempt,
+        )
+
+        with self._lock:
+            self.counters["requests"] += 1
+            if attempt:
+                self.counters["retries"] += 1
+            if operation is None:
+                self.counters["unattributed_requests"] += 1
+            else:
+                operation.requests += 1
+            if call.endpoint == VALIDATION_ENDPOINT and call.operation not in (
+                None,
+                "functions",
+            ):
+                self.counters["validation_gets"] += 1
+
+        return call
+
+    def signed(self, call: Call, rate_limit_wait: float = 0.0):
+        """
+        Headers are signed, the request is about to be sent.
+
+        :param call: call record
+        :param rate_limit_wait: seconds waited for the rate limiter
+        """
+        call.signed = perf_counter()
+        call.rate_limit_wait = rate_limit_wait
+        call.sign_time = call.signed - call.started - rate_limit_wait
+
+        if rate_limit_wait:
+            self.observe(self.phases, "rate_limit", rate_limit_wait)
+        self.observe(self.phases, "sign", call.sign_time)
+        if self._request_hooks:
+            self._hooks(self._request_hooks, call)
+
+    def finish(
+        self,
+        call: Call,
+        status: int = None,
+        response: dict = None,
+        error: Exception = None,
+        throttled: bool = False,
+    ):
+        """
+        The HTTP attempt is done.
+
+        :param call: call record
+        :param status: HTTP status
+        :param response: response dict
+        :param error: connection error or invalid response
+        :param throttled: the response is throttled, also on the last attempt
+        """
+        call.elapsed = perf_counter() - call.signed
+        call.status = status
+        call.error = error
+        if response is not None:
+            call.success = bool(response.get("success"))
+            call.code = response.get("code")
+
+        self.observe(self.endpoints, call.endpoint, call.elapsed)
+        self.observe(self.phases, "network", call.elapsed)
+        if error is not None:
+            self.count("errors")
+        if throttled:
+            self.count("throttled")
+        if self._response_hooks:
+            self._hooks(self._response_hooks, call)
+
+    def retrying(self, delay: float):
+        """
+        An attempt is retried after a delay.
+
+        :param delay: seconds
+        """
+        self.observe(self.phases, "retry_wait", delay)
+
+    def metrics(self) -> dict:
+        """
+        :return: dict with keys
+            counters - {name: value}
+            endpoints - {endpoint: histogram dict}
+            phases - {phase: histogram dict}
+            operations - {method name: histogram dict with requests and
+                requests_per_call}
+        """
+        with self._lock:
+            counters = dict(self.counters)
+            endpoints = dict(self.endpoints)
+            phases = dict(self.phases)
+            operations = dict(self.operations)
+            operation_requests = dict(self.operation_requests)
+
+        metrics = {
+            "counters": counters,
+            "endpoints": {key: value.to_dict() for key, value in endpoints.items()},
+            "phases": {key: value.to_dict() for key, value in phases.items()},
+            "operations": {},
+        }
+
+        for name, histogram in operations.items():
+            item = histogram.to_dict()
+            item["requests"] = operation_requests.get(name, 0)
+            item["requests_per_call"] = (
+                item["requests"] / item["count"] if item["count"] else 0.0
+            )
+            metrics["operations"][name] = item
+
+        return metrics
+
+    def export(self) -> dict:
+        """
+        Send the metrics to the exporter.
+
+        :return: metrics dict
+        """
+        metrics = self.metrics()
+        if self.exporter is not None:
+            self.exporter.export(metrics)
+
+        return metrics
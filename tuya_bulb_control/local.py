@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import hmac
+import json
+import base64
+import socket
+import struct
+import binascii
+import threading
+from collections import namedtuple
+from hashlib import md5, sha256
+from time import monotonic, time
+from ._crypto import aes_decrypt, aes_encrypt, require_aes
+from .exceptions import LocalError
+
+PORT = 6668
+PREFIX = 0x000055AA
+SUFFIX = 0x0000AA55
+
+SESS_KEY_NEG_START = 3
+SESS_KEY_NEG_RES = 4
+SESS_KEY_NEG_FINISH = 5
+CONTROL = 7
+STATUS = 8
+HEART_BEAT = 9
+DP_QUERY = 10
+CONTROL_NEW = 13
+DP_QUERY_NEW = 16
+
+VERSIONS = ("3.1", "3.3", "3.4")
+
+# Commands sent without the version header
+_NO_HEADER = frozenset(
+    [
+        DP_QUERY,
+        DP_QUERY_NEW,
+        HEART_BEAT,
+        SESS_KEY_NEG_START,
+        SESS_KEY_NEG_RES,
+        SESS_KEY_NEG_FINISH,
+    ]
+)
+
+# Data point ids of the standard v2 light, by function code
+DEFAULT_DPS = {
+    "switch_led": "20",
+    "work_mode": "21",
+    "bright_value_v2": "22",
+    "temp_value_v2": "23",
+    "colour_data_v2": "24",
+    "countdown_1": "26",
+}
+
+Message = namedtuple("Message", "seqno cmd retcode payload")
+
+
+def pack_message(seqno: int, cmd: int, payload: bytes, hmac_key: bytes = None):
+    """
+    Frame a message.
+
+    :param seqno: sequence number
+    :param cmd: command
+    :param payload: encoded payload
+    :param hmac_key: protocol 3.4 key, the message is signed with HMAC-SHA256.
+        Default: CRC32
+    :return: message bytes
+    """
+    length = len(payload) + (36 if hmac_key else 8)
+    header = struct.pack(">4I", PREFIX, seqno, cmd, length)
+
+    if hmac_key:
+        check = hmac.new(hmac_key, header + payload, sha256).digest()
+    else:
+        check = struct.pack(">I", binascii.crc32(header + payload) & 0xFFFFFFFF)
+
+    return header + payload + check + struct.pack(">I", SUFFIX)
+
+
+def read_message(sock: socket.socket, hmac_key: bytes = None, retcode: bool = True):
+    """
+    Read and check one message.
+
+    :param sock: connected socket
+    :param hmac_key: protocol 3.4 key. Default: CRC32
+    :param retcode: the payload starts with a return code (device to client)
+    :raise tuya_bulb_control.exceptions.LocalError: if the message is invalid
+    :return: tuya_bulb_control.local.Message
+    """
+    header = _read_exactly(sock, 16)
+    prefix, seqno, cmd, length = struct.unpack(">4I", header)
+    if prefix != PREFIX:
+        raise LocalError(target=hex(prefix), msg="Invalid message prefix.")
+
+    body = _read_exactly(sock, length)
+    check_size = 32 if hmac_key else 4
+    payload, check = body[: -check_size - 4], body[-check_size - 4 : -4]
+
+    if hmac_key:
+        expected = hmac.new(hmac_key, header + payload, sha256).digest()
+    else:
+        expected = struct.pack(">I", binascii.crc32(header + payload) & 0xFFFFFFFF)
+
+    if not hmac.compare_digest(check, expected) or body[-4:] != struct.pack(
+        ">I", SUFFIX
+    ):
+        raise LocalError(target=cmd, msg="Invalid message checksum.")
+
+    code = None
+    if retcode and len(payload) >= 4 and not any(payload[:3]):
+        code = struct.unpack(">I", payload[:4])[0]
+        payload = payload[4:]
+
+    return Message(seqno, cmd, code, payload)
+
+
+def _read_exactly(sock: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed by the device")
+        data += chunk
+    return data
+
+
+def encode_payload(version: str, key: bytes, cmd: int, data: bytes) -> bytes:
+    """
+    Encrypt a payload the way the protocol version expects.
+
+    :param version: protocol version. 3.1; 3.3; 3.4
+    :param key: local key, or the session key for protocol 3.4
+    :param cmd: command
+    :param data: plain payload
+    :return: encoded payload
+    """
+    header = version.encode() + b"\0" * 12
+
+    if version == "3.1":
+        if cmd != CONTROL:
+            return data
+        encoded = base64.b64encode(aes_encrypt(key, data))
+        sign = md5(b"data=" + encoded + b"||lpv=3.1||" + key).hexdigest()[8:24]
+        return b"3.1" + sign.encode() + encoded
+
+    if version == "3.3":
+        encrypted = aes_encrypt(key, data)
+        return encrypted if cmd in _NO_HEADER else header + encrypted
+
+    return aes_encrypt(key, data if cmd in _NO_HEADER else header + data)
+
+
+def decode_payload(version: str, key: bytes, payload: bytes) -> bytes:
+    """
+    Decrypt a payload encoded with tuya_bulb_control.local.encode_payload()
+
+    :param version: protocol version. 3.1; 3.3; 3.4
+    :param key: local key, or the session key for protocol 3.4
+    :param payload: encoded payload
+    :return: plain payload
+    """
+    if not payload:
+        return payload
+
+    if version == "3.1":
+        if payload.startswith(b"3.1"):
+            return aes_decrypt(key, base64.b64decode(payload[19:]))
+        return payload
+
+    if version == "3.3":
+        if payload.startswith(b"3.3"):
+            payload = payload[15:]
+        if len(payload) % 16:
+            return payload
+        return aes_decrypt(key, payload)
+
+    payload = aes_decrypt(key, payload)
+    return payload[15:] if payload.startswith(version.encode()) else payload
+
+
+def encode_value(code_name: str, value):
+    """
+    Convert a cloud API value to its local data point form.
+
+    :param code_name: function code
+    :param value: cloud API value
+    :return: local value
+    """
+    if code_name == "colour_data_v2":
+        if isinstance(value, str):
+            value = json.loads(value)
+        return "%04x%04x%04x" % (value["h"], value["s"], value["v"])
+
+    return value
+
+
+def decode_value(code_name: str, value):
+    """
+    Convert a local data point value to its cloud API form.
+
+    :param code_name: function code
+    :param value: local value
+    :return: cloud API value, json values as a string like the status endpoint
+    """
+    if code_name == "colour_data_v2" and isinstance(value, str) and len(value) == 12:
+        h, s, v = (int(value[index : index + 4], 16) for index in (0, 4, 8))
+        return json.dumps({"h": h, "s": s, "v": v})
+
+    return value
+
+
+class LocalDevice:
+    """
+    Controls a device over the LAN with the Tuya local protocol.
+
+    Keeps one TCP connection to the device, reconnects on failure and sends
+    a heartbeat while idle. Pass it to tuya_bulb_control.Bulb(local_devices=...)
+    to use it behind the usual Bulb methods, with the cloud API as a fallback.
+    Requires cryptography: pip install tuya_bulb_control[local]
+
+    :param device_id: device id
+    :param host: device address on the LAN
+    :param local_key: device local key, see the "local_key" of /devices/{device_id}
+    :param version: protocol version. 3.1; 3.3; 3.4
+    :param port: device port
+    :param dps: {code: data point id}. Default: tuya_bulb_control.local.DEFAULT_DPS
+    :param timeout: socket timeout in seconds
+    :param heartbeat: seconds between heartbeats while idle. None == no heartbeat
+    """
+
+    def __init__(
+        self,
+        device_id: str,
+        host: str,
+        local_key: str,
+        version: str = "3.3",
+        port: int = PORT,
+        dps: dict = None,
+        timeout: float = 2,
+        heartbeat: float = 10,
+    ):
+        require_aes("LocalDevice")
+        if version not in VERSIONS:
+            raise ValueError(f"{version} -> The version must be one of {VERSIONS}")
+
+        self.device_id = device_id
+        self.host = host
+        self.port = port
+        self.version = version
+        self.timeout = timeout
+        self.heartbeat = heartbeat
+        self.dps = dict(DEFAULT_DPS if dps is None else dps)
+        self._codes = {str(dp): code for code, dp in self.dps.items()}
+
+        self._local_key = local_key.encode("latin-1")
+        self._session_key = None
+        self._socket = None
+        self._seqno = 0
+        self._last_used = 0.0
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._heartbeat_thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def _key(self) -> bytes:
+        return self._session_key or self._local_key
+
+    @property
+    def _hmac_key(self):
+        return self._key if self.version == "3.4" else None
+
+    def connect(self):
+        """
+        Open the connection, unless it is open.
+
+        :raise tuya_bulb_control.exceptions.LocalError: if the device is not reachable
+        """
+        with self._lock:
+            if self._socket is not None:
+                return
+
+            try:
+                self._socket = socket.create_connection(
+                    (self.host, self.port), timeout=self.timeout
+                )
+                self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                if self.version == "3.4":
+                    self._negotiate_session_key()
+            except OSError as exc:
+                self._disconnect()
+                raise LocalError(target=self.device_id, msg=str(exc)) from exc
+
+            self._last_used = monotonic()
+            self._closed.clear()
+            if self.heartbeat and self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(
+                    target=self._heartbeat_loop, daemon=True
+                )
+                self._heartbeat_thread.start()
+
+    def close(self):
+        """
+        Close the connection and stop the heartbeat.
+        """
+        self._closed.set()
+        with self._lock:
+            self._disconnect()
+
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+
+    def _disconnect(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            finally:
+                self._socket = None
+        self._session_key = None
+
+    def _send(self, cmd: int, data: bytes):
+        self._seqno += 1
+        payload = encode_payload(self.version, self._key, cmd, data)
+        self._socket.sendall(
+            pack_message(self._seqno, cmd, payload, hmac_key=self._hmac_key)
+        )
+
+    def _negotiate_session_key(self):
+        """
+        Protocol 3.4 session key negotiation.
+        """
+        local_nonce = os.urandom(16)
+        self._send(SESS_KEY_NEG_START, local_nonce)
+
+        message = read_message(self._socket, hmac_key=self._local_key)
+        data = decode_payload(self.version, self._local_key, message.payload)
+        remote_nonce, remote_hmac = data[:16], data[16:48]
+
+        if not hmac.compare_digest(
+            remote_hmac, hmac.new(self._local_key, local_nonce, sha256).digest()
+        ):
+            raise LocalError(
+                target=self.device_id, msg="Session key negotiation failed."
+            )
+
+        self._send(
+            SESS_KEY_NEG_FINISH,
+            hmac.new(self._local_key, remote_nonce, sha256).digest(),
+        )
+        nonce = bytes(a ^ b for a, b in zip(local_nonce, remote_nonce))
+        self._session_key = aes_encrypt(self._local_key, nonce, padding=False)[:16]
+
+    def _body(self, cmd: int, dps: dict = None) -> bytes:
+        if self.version == "3.4":
+            if cmd == CONTROL_NEW:
+                body = {"protocol": 5, "t": int(time()), "data": {"dps": dps}}
+            else:
+                body = {}
+        elif cmd == CONTROL:
+            body = {
+                "devId": self.device_id,
+                "uid": self.device_id,
+                "t": str(int(time())),
+                "dps": dps,
+            }
+        else:
+            body = {
+                "gwId": self.device_id,
+                "devId": self.device_id,
+                "uid": self.device_id,
+                "t": str(int(time())),
+            }
+
+        return json.dumps(body, separators=(",", ":")).encode()
+
+    def _exchange(self, cmd: int, dps: dict = None) -> dict:
+        """
+        Send a command and wait for its reply, reconnecting once on failure.
+
+        :param cmd: command
+        :param dps: data points for control commands
+        :raise tuya_bulb_control.exceptions.LocalError: if the device did not reply
+        :return: reply dict, empty if the reply has no payload
+        """
+        with self._lock:
+            for attempt in range(2):
+                self.connect()
+                try:
+                    self._send(cmd, self._body(cmd, dps))
+                    while True:
+                        message = read_message(self._socket, hmac_key=self._hmac_key)
+                        if message.cmd == cmd:
+                            break
+                    self._last_used = monotonic()
+                except LocalError:
+                    # Invalid checksum or HMAC, the stream is out of sync
+                    self._disconnect()
+                    raise
+                except (OSError, ValueError) as exc:
+                    self._disconnect()
+                    if attempt:
+                        raise LocalError(target=self.device_id, msg=str(exc)) from exc
+                    continue
+
+                if message.retcode:
+                    raise LocalError(
+                        target=self.device_id, msg=f"Device error {message.retcode}."
+                    )
+
+                try:
+                    data = decode_payload(self.version, self._key, message.payload)
+                    return json.loads(data) if data.strip() else {}
+                except ValueError as exc:
+                    raise LocalError(
+                        target=self.device_id, msg=f"Invalid reply: {exc}"
+                    ) from exc
+
+    def _heartbeat_loop(self):
+        while not self._closed.wait(self.heartbeat / 2):
+            if monotonic() - self._last_used < self.heartbeat:
+                continue
+            try:
+                self._exchange(HEART_BEAT)
+            except LocalError:
+                pass
+
+    def status(self) -> dict:
+        """
+        Get the current state of the device.
+
+        :raise tuya_bulb_control.exceptions.LocalError: if the device did not reply
+        :return: {code: value} dict with values in cloud API form
+        """
+        reply = self._exchange(DP_QUERY_NEW if self.version == "3.4" else DP_QUERY)
+        dps = reply.get("dps") or reply.get("data", {}).get("dps", {})
+
+        return {
+            self._codes[dp]: decode_value(self._codes[dp], value)
+            for dp, value in dps.items()
+            if dp in self._codes
+        }
+
+    def set_values(self, values: dict):
+        """
+        Send several values in one command.
+
+        :param values: {code: value} dict with values in cloud API form
+        :raise tuya_bulb_control.exceptions.LocalError: if a code has no data point
+            or the device did not reply
+        """
+        try:
+            dps = {
+                self.dps[code_name]: encode_value(code_name, value)
+                for code_name, value in values.items()
+            }
+        except KeyError as exc:
+            raise LocalError(
+                target=exc.args[0], msg="No local data point for this function."
+            )
+
+        self._exchange(CONTROL_NEW if self.version == "3.4" else CONTROL, dps)
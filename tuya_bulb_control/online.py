@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+# API error code of a command to an offline device
+OFFLINE_CODE = 2001
+
+
+class OnlineTracker:
+    """
+    Cached online status of devices, with a replay queue for commands
+    to offline devices.
+
+    Fed by the device list (tuya_bulb_control.DeviceRegistry), push events
+    (tuya_bulb_control.events.Subscriber) and command responses. A device
+    known to be offline is skipped for offline_ttl seconds, after that the
+    next command is sent as a probe.
+
+    Commands to offline devices either fail fast with DeviceOffline, or
+    with defer=True wait in the replay queue, newest value per code, and are
+    sent when the device is back online.
+
+    :param offline_ttl: seconds to trust an offline status
+    :param defer: queue commands to offline devices instead of failing
+    :param replay_ttl: seconds a deferred value stays valid. None == no limit
+    """
+
+    def __init__(
+        self, offline_ttl: float = 60, defer: bool = False, replay_ttl: float = 600
+    ):
+        self.offline_ttl = offline_ttl
+        self.defer = defer
+        self.replay_ttl = replay_ttl
+
+        # {device_id: (online, updated_at)}
+        self._status = {}
+        # {device_id: OrderedDict {code: (deferred_at, value)}}
+        self._deferred = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def get(self, device_id: str):
+        """
+        Get the cached online status.
+
+        :param device_id: device id
+        :return: True; False; None if unknown
+        """
+        with self._lock:
+            entry = self._status.get(device_id)
+
+        return None if entry is None else entry[0]
+
+    def is_offline(self, device_id: str) -> bool:
+        """
+        Check if commands to the device should be skipped.
+
+        :param device_id: device id
+        :return: True if the device went offline less than offline_ttl seconds ago
+        """
+        with self._lock:
+            entry = self._status.get(device_id)
+
+        if entry is None or entry[0]:
+            return False
+
+        return monotonic() - entry[1] <= self.offline_ttl
+
+    def set(self, device_id: str, online: bool):
+        """
+        Update the online status of a device.
+        Listeners are called when a device with deferred commands is back online.
+
+        :param device_id: device id
+        :param online: state
+        """
+        self.update({device_id: online})
+
+    def update(self, statuses: dict):
+        """
+        Update the online status of many devices.
+
+        :param statuses: {device_id: online}
+        """
+        now = monotonic()
+        back_online = []
+
+        with self._lock:
+            for device_id, online in statuses.items():
+                self._status[device_id] = (bool(online), now)
+                if online and device_id in self._deferred:
+                    back_online.append(device_id)
+            listeners = list(self._listeners)
+
+        for device_id in back_online:
+            for listener in listeners:
+                listener(device_id)
+
+    def on_online(self, listener):
+        """
+        Call a function when a device with deferred commands is back online.
+
+        :param listener: function(device_id)
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def defer_commands(self, device_id: str, commands: list):
+        """
+        Queue commands until the device is back online.
+        Values replace queued values of the same code.
+
+        :param device_id: device id
+        :param commands: list of {"code": ..., "value": ...} dicts
+        """
+        now = monotonic()
+
+        with self._lock:
+            queued = self._deferred.setdefault(device_id, OrderedDict())
+            for item in commands:
+                queued.pop(item["code"], None)
+                queued[item["code"]] = (now, item["value"])
+
+    def take_commands(self, device_id: str, commands: list = ()) -> list:
+        """
+        Take the deferred commands of a device, merged with new commands.
+
+        :param device_id: device id
+        :param commands: new commands, their values win
+        :return: list of {"code": ..., "value": ...} dicts
+        """
+        with self._lock:
+            queued = self._deferred.pop(device_id, None)
+
+        if queued is None:
+            return list(commands)
+
+        if self.replay_ttl is not None:
+            oldest = monotonic() - self.replay_ttl
+            queued = OrderedDict(
+                (code_name, entry)
+                for code_name, entry in queued.items()
+                if entry[0] >= oldest
+            )
+
+        for item in commands:
+            queued.pop(item["code"], None)
+            queued[item["code"]] = (None, item["value"])
+
+        return [
+            {"code": code_name, "value": value}
+            for code_name, (_, value) in queued.items()
+        ]
+
+    def deferred(self, device_id: str = None) -> dict:
+        """
+        Get the deferred commands.
+
+        :param device_id: only this device. Default: all devices
+        :return: {device_id: {code: value}}
+        """
+        with self._lock:
+            return {
+                key: {code_name: value for code_name, (_, value) in queued.items()}
+                for key, queued in self._deferred.items()
+                if device_id in (None, key)
+            }
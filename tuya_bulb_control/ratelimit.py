@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import random
+import threading
+from time import monotonic, sleep
+
+# HTTP statuses worth retrying: throttled or a transient server error
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+# API response code of a throttled request: request frequency is too high
+THROTTLE_CODE = 40000309
+THROTTLE_CODES = frozenset([THROTTLE_CODE])
+
+# Seconds between evictions of idle device buckets
+DEFAULT_SWEEP_INTERVAL = 60
+
+
+class TokenBucket:
+    """
+    Token bucket limiter, safe to share between threads.
+
+    :param rate: tokens added per second
+    :param burst: bucket size. Default: max(1, rate)
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        if rate <= 0:
+            raise ValueError(f"{rate} -> The rate must be greater than 0")
+
+        self.rate = rate
+        self.burst = max(1.0, rate) if burst is None else burst
+        self._tokens = self.burst
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token, going into debt if the bucket is empty.
+
+        :return: seconds to wait before the token may be used
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refilled(self, now: float = None) -> bool:
+        """
+        Check if the bucket is full again, so replacing it with a new one
+        changes nothing.
+
+        :param now: monotonic() time. Default: now
+        :return: state
+        """
+        now = monotonic() if now is None else now
+        with self._lock:
+            return self._tokens + (now - self._updated) * self.rate >= self.burst
+
+    def acquire(self) -> float:
+        """
+        Take a token, blocking until it is available.
+
+        :return: seconds waited
+        """
+        wait = self.reserve()
+        if wait > 0:
+            sleep(wait)
+
+        return wait
+
+
+class RateLimiter:
+    """
+    Client-side limit of the request rate, per project and per device.
+    Device buckets that have been idle long enough to refill are evicted,
+    so a large fleet does not keep a bucket per device forever.
+
+    :param rate: requests per second for the whole project. None == no limit
+    :param burst: project bucket size. Default: max(1, rate)
+    :param device_rate: requests per second for a single device. None == no limit
+    :param device_burst: device bucket size. Default: max(1, device_rate)
+    :param sweep_interval: min seconds between evictions of idle device buckets
+    """
+
+    def __init__(
+        self,
+        rate: float = None,
+        burst: float = None,
+        device_rate: float = None,
+        device_burst: float = None,
+        sweep_interval: float = DEFAULT_SWEEP_INTERVAL,
+    ):
+        self._project = None if rate is None else TokenBucket(rate, burst)
+        self._device_rate = device_rate
+        self._device_burst = device_burst
+        self._devices = {}
+        self._sweep_interval = sweep_interval
+        self._next_sweep = monotonic() + sweep_interval
+        self._lock = threading.Lock()
+
+        self._waiting = 0
+        self._acquired = 0
+        self._delayed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _device_bucket(self, device_id: str) -> TokenBucket:
+        with self._lock:
+            now = monotonic()
+            if now >= self._next_sweep:
+                self._devices = {
+                    key: item
+                    for key, item in self._devices.items()
+                    if not item.refilled(now)
+                }
+                self._next_sweep = now + self._sweep_interval
+
+            bucket = self._devices.get(device_id)
+            if bucket is None:
+                bucket = TokenBucket(self._device_rate, self._device_burst)
+                self._devices[device_id] = bucket
+
+        return bucket
+
+    def acquire(self, device_id: str = None) -> float:
+        """
+        Block until a request may be sent.
+
+        :param device_id: also respect the limit of this device
+        :return: seconds waited
+        """
+        wait = 0.0
+        if device_id is not None and self._device_rate is not None:
+            wait = self._device_bucket(device_id).reserve()
+        if self._project is not None:
+            wait = max(wait, self._project.reserve())
+
+        with self._lock:
+            self._acquired += 1
+            if wait > 0:
+                self._waiting += 1
+                self._delayed += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+
+        if wait > 0:
+            try:
+                sleep(wait)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+
+        return wait
+
+    def stats(self) -> dict:
+        """
+        Limiter statistics.
+
+        :return: dict with keys
+            queue_depth - requests waiting right now
+            devices - device buckets kept
+            acquired - requests let through
+            delayed - requests that had to wait
+            total_wait, max_wait, mean_wait - seconds
+        """
+        with self._lock:
+            return {
+                "queue_depth": self._waiting,
+                "devices": len(self._devices),
+                "acquired": self._acquired,
+                "delayed": self._delayed,
+                "total_wait": self._total_wait,
+                "max_wait": self._max_wait,
+                "mean_wait": self._total_wait / self._acquired
+                if self._acquired
+                else 0.0,
+            }
+
+
+class RetryPolicy:
+    """
+    Retry throttled and failed requests with jittered exponential backoff.
+
+    A request is retried on a connection error, on an HTTP status from
+    statuses, or on an API response whose code is in throttle_codes.
+    A response still throttled after the last retry raises
+    tuya_bulb_control.exceptions.RateLimited.
+
+    :param retries: max number of retries. 0 == never retry
+    :param backoff: base delay in seconds
+    :param max_backoff: max delay in seconds
+    :param statuses: HTTP statuses to retry
+    :param throttle_codes: API response codes to retry. Default: THROTTLE_CODES
+    """
+
+    def __init__(
+        self,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 10,
+        statuses=RETRY_STATUSES,
+        throttle_codes=THROTTLE_CODES,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        self.throttle_codes = frozenset(throttle_codes)
+
+    def delay(self, attempt: int) -> float:
+        """
+        Delay before a retry, "full jitter" strategy.
+
+        :param attempt: number of the retry, from 0
+        :return: seconds
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def is_throttled(self, response: dict) -> bool:
+        """
+        Check if an API response reports throttling.
+
+        :param response: response dict
+        :return: state
+        """
+        if response.get("success", True):
+            return False
+
+        return response.get("code") in self.throttle_codes
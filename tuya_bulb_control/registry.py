@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+from array import array
+from itertools import compress
+
+# Max devices per page of the device list
+PAGE_SIZE = 100
+
+# Indexed columns, stored as positions in a table of distinct values
+_COLUMNS = ("product_id", "category", "room")
+
+_BITS = bytes.maketrans(b"01", b"\0\1")
+
+
+def _bitset(positions: list) -> int:
+    """
+    Int with the bits of the positions set.
+    """
+    if not positions:
+        return 0
+
+    buffer = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+
+    return int.from_bytes(buffer, "little")
+
+
+class Device:
+    """
+    Record of one registry device.
+
+    :param id: device id
+    :param name: device name
+    :param product_id: product id
+    :param category: category. Example: dj
+    :param online: online status
+    :param room: room name, see tuya_bulb_control.DeviceRegistry.load_rooms()
+    """
+
+    __slots__ = ("id", "name", "product_id", "category", "online", "room")
+
+    def __init__(
+        self,
+        id: str,
+        name: str = None,
+        product_id: str = None,
+        category: str = None,
+        online: bool = False,
+        room: str = None,
+    ):
+        self.id = id
+        self.name = name
+        self.product_id = product_id
+        self.category = category
+        self.online = online
+        self.room = room
+
+    def __repr__(self):
+        return f"Device({self.id!r}, {self.name!r}, online={self.online!r})"
+
+
+class DeviceRegistry:
+    """
+    Devices of the account, indexed by room, product, category, capability
+    and online status.
+
+    Devices are stored by column: ids and names in lists, other values as
+    positions in a table of distinct values. Every index entry is an int
+    used as a bitset over device positions, so selectors resolve with a
+    few bitwise operations and memory grows with the devices, not the
+    indexes.
+
+    Example:
+        registry = DeviceRegistry(bulb)
+        registry.refresh()
+        registry.load_capabilities()
+        registry.select(online=True, capability="colour_data_v2")
+
+    :param bulb: tuya_bulb_control.Bulb instance
+    """
+
+    def __init__(self, bulb):
+        self._bulb = bulb
+        self._lock = threading.Lock()
+        self._clear()
+        # {product_id: set of function codes}
+        self._product_codes = {}
+
+    def _clear(self):
+        self._ids = []
+        self._positions = {}
+        self._names = []
+        self._values = {column: [None] for column in _COLUMNS}
+        self._value_positions = {column: {None: 0} for column in _COLUMNS}
+        self._columns = {column: array("I") for column in _COLUMNS}
+        self._indexes = {column: {} for column in _COLUMNS}
+        self._capabilities = {}
+        self._online = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self._positions
+
+    def __iter__(self):
+        return iter(list(self._ids))
+
+    def refresh(self, page_size: int = PAGE_SIZE) -> int:
+        """
+        Load the device list of the account, replacing the registry devices.
+        Rooms of devices that are still there are kept.
+
+        :param page_size: devices per request, max 100
+        :return: number of devices
+        """
+        devices = []
+        last_row_key = None
+
+        while True:
+            query = f"size={page_size}"
+            if last_row_key:
+                query = f"last_row_key={last_row_key}&{query}"
+            result = self._bulb._get(f"/iot-01/associated-users/devices?{query}")[
+                "result"
+            ]
+
+            devices.extend(result.get("devices", []))
+            last_row_key = result.get("last_row_key")
+            if not result.get("has_more") or not last_row_key:
+                break
+
+        with self._lock:
+            rooms = {
+                device_id: self._value("room", position)
+                for device_id, position in self._positions.items()
+            }
+            self._clear()
+            online = []
+
+            # Columns first and the indexes in one pass at the end,
+            # setting bits one device at a time is quadratic
+            for device in devices:
+                device_id = device["id"]
+                if device_id in self._positions:
+                    continue
+
+                position = len(self._ids)
+                self._positions[device_id] = position
+                self._ids.append(device_id)
+                self._names.append(device.get("name"))
+                for column, value in (
+                    ("product_id", device.get("product_id")),
+                    ("category", device.get("category")),
+                    ("room", rooms.get(device_id)),
+                ):
+                    self._columns[column].append(self._intern(column, value))
+                if device.get("online"):
+                    online.append(position)
+
+            self._reindex(online)
+
+        tracker = self._bulb._online_tracker
+        if tracker is not None:
+            tracker.update(
+                {device["id"]: bool(device.get("online")) for device in devices}
+            )
+
+        return len(self._ids)
+
+    def add(self, device: dict, room: str = None):
+        """
+        Add or replace a device.
+
+        :param device: device dict of the device list. Example: {"id": ..., "product_id": ..., "online": True}
+        :param room: room name. Default: keep the room of a known device
+        """
+        with self._lock:
+            self._add(device, room)
+
+    def load_rooms(self, home_id) -> int:
+        """
+        Set the rooms of the devices from a home.
+
+        :param home_id: home id
+        :return: number of devices with a room
+        """
+        rooms = self._bulb._get(f"/homes/{home_id}/rooms")["result"].get("rooms", [])
+        count = 0
+
+        for room in rooms:
+            devices = self._bulb._get(
+                f"/homes/{home_id}/rooms/{room['room_id']}/devices"
+            )["result"]
+            with self._lock:
+                for device in devices:
+                    if device["id"] in self._positions:
+                        self._set("room", self._positions[device["id"]], room["name"])
+                        count += 1
+
+        return count
+
+    def load_capabilities(self) -> int:
+        """
+        Index the functions of the devices.
+        Devices of one product share functions, so one device per product is asked.
+
+        :return: number of products
+        """
+        with self._lock:
+            products = {
+                product_id: self._ids[mask.bit_length() - 1]
+                for product_id, mask in self._indexes["product_id"].items()
+                if product_id not in self._product_codes
+            }
+
+        for product_id, device_id in products.items():
+            functions = self._bulb.functions(device_id=device_id)
+            with self._lock:
+                self._product_codes[product_id] = {item["code"] for item in functions}
+                self._index_capabilities(product_id)
+
+        return len(self._product_codes)
+
+    def get(self, device_id: str) -> Device:
+        """
+        Get a device.
+
+        :param device_id: device id
+        :raise KeyError: if the device is not in the registry
+        :return: tuya_bulb_control.registry.Device
+        """
+        with self._lock:
+            position = self._positions[device_id]
+            return Device(
+                id=device_id,
+                name=self._names[position],
+                product_id=self._value("product_id", position),
+                category=self._value("category", position),
+                online=bool(self._online >> position & 1),
+                room=self._value("room", position),
+            )
+
+    def set_online(self, device_id: str, online: bool):
+        """
+        Update the online status of a device, e.g. from push events.
+        Also updates the online tracker of the bulb.
+
+        :param device_id: device id
+        :param online: state
+        """
+        with self._lock:
+            position = self._positions.get(device_id)
+            if position is not None and online:
+                self._online |= 1 << position
+            elif position is not None:
+                self._online &= ~(1 << position)
+
+        tracker = self._bulb._online_tracker
+        if tracker is not None:
+            tracker.set(device_id, online)
+
+    def select(
+        self,
+        room: str = None,
+        product_id: str = None,
+        category: str = None,
+        capability=None,
+        online: bool = None,
+    ) -> list:
+        """
+        Get the devices matching every given filter.
+
+        :param room: room name
+        :param product_id: product id
+        :param category: category. Example: dj
+        :param capability: function code, or a list of codes that all must be supported
+        :param online: online status
+        :return: list of device ids
+        """
+        with self._lock:
+            mask = self._mask(room, product_id, category, capability, online)
+            # One byte per device, lowest bit first
+            selected = bin(mask)[:1:-1].encode("ascii").translate(_BITS)
+
+            return list(compress(self._ids, selected))
+
+    def count(
+        self,
+        room: str = None,
+        product_id: str = None,
+        category: str = None,
+        capability=None,
+        online: bool = None,
+    ) -> int:
+        """
+        Count the devices matching every given filter, see select().
+
+        :return: number of devices
+        """
+        with self._lock:
+            mask = self._mask(room, product_id, category, capability, online)
+
+        if hasattr(mask, "bit_count"):
+            # Python 3.10+
+            return mask.bit_count()
+
+        return bin(mask).count("1")
+
+    def _mask(self, room, product_id, category, capability, online) -> int:
+        """
+        Bitset of the devices matching every given filter. Call with the lock held.
+        """
+        mask = (1 << len(self._ids)) - 1
+
+        for column, value in (
+            ("room", room),
+            ("product_id", product_id),
+            ("category", category),
+        ):
+            if value is not None:
+                mask &= self._indexes[column].get(value, 0)
+
+        if capability is not None:
+            codes = [capability] if isinstance(capability, str) else capability
+            for code_name in codes:
+                mask &= self._capabilities.get(code_name, 0)
+
+        if online is not None:
+            mask &= self._online if online else ~self._online
+
+        return mask
+
+    def _value(self, column: str, position: int):
+        return self._values[column][self._columns[column][position]]
+
+    def _set(self, column: str, position: int, value):
+        """
+        Set a column value of a device and move it between index entries.
+        """
+        bit = 1 << position
+        index = self._indexes[column]
+
+        old = self._value(column, position)
+        if old is not None:
+            index[old] &= ~bit
+            if not index[old]:
+                del index[old]
+
+        self._columns[column][position] = self._intern(column, value)
+        if value is not None:
+            index[value] = index.get(value, 0) | bit
+
+    def _intern(self, column: str, value) -> int:
+        """
+        Position of a value in the table of distinct values of a column.
+        """
+        value_position = self._value_positions[column].get(value)
+        if value_position is None:
+            value_position = len(self._values[column])
+            self._values[column].append(value)
+            self._value_positions[column][value] = value_position
+
+        return value_position
+
+    def _reindex(self, online: list):
+        """
+        Build every index from the columns.
+
+        :param online: positions of the online devices
+        """
+        for column in _COLUMNS:
+            groups = {}
+            for position, value_position in enumerate(self._columns[column]):
+                if value_position:
+                    groups.setdefault(value_position, []).append(position)
+
+            values = self._values[column]
+            self._indexes[column] = {
+                values[value_position]: _bitset(positions)
+                for value_position, positions in groups.items()
+            }
+
+        self._online = _bitset(online)
+        self._capabilities = {}
+        for product_id in self._product_codes:
+            self._index_capabilities(product_id)
+
+    def _add(self, device: dict, room: str = None):
+        device_id = device["id"]
+        position = self._positions.get(device_id)
+
+        if position is None:
+            position = len(self._ids)
+            self._positions[device_id] = position
+            self._ids.append(device_id)
+            self._names.append(None)
+            for column in _COLUMNS:
+                self._columns[column].append(0)
+        else:
+            # Replaced device, clear the bits of its old values
+            bit = ~(1 << position)
+            self._online &= bit
+            for code_name, mask in self._capabilities.items():
+                self._capabilities[code_name] = mask & bit
+
+        bit = 1 << position
+        self._names[position] = device.get("name")
+        self._set("product_id", position, device.get("product_id"))
+        self._set("category", position, device.get("category"))
+        if room is not None:
+            self._set("room", position, room)
+
+        if device.get("online"):
+            self._online |= bit
+        for code_name in self._product_codes.get(device.get("product_id"), ()):
+            self._capabilities[code_name] = self._capabilities.get(code_name, 0) | bit
+
+    def _index_capabilities(self, product_id: str):
+        mask = self._indexes["product_id"].get(product_id, 0)
+        for code_name in self._product_codes[product_id]:
+            self._capabilities[code_name] = self._capabilities.get(code_name, 0) | mask
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+from hashlib import sha1
+from .exceptions import FunctionNotSupported, ValueNotInRange
+
+
+class Validator:
+    """
+    Validator of a function without constraints, e.g. of type String or Raw.
+
+    :param code_name: function name
+    """
+
+    __slots__ = ("code_name",)
+
+    def __init__(self, code_name: str):
+        self.code_name = code_name
+
+    def allows(self, value) -> bool:
+        """
+        :param value: device value
+        :return: True if the device accepts the value
+        """
+        return True
+
+    def describe(self) -> str:
+        """
+        :return: accepted values, for error messages
+        """
+        return "any value"
+
+    def check(self, value):
+        """
+        :param value: device value
+        :raise tuya_bulb_control.exceptions.ValueNotInRange: if the value is not accepted
+        :return: value
+        """
+        if not self.allows(value):
+            raise ValueNotInRange(
+                target=f"{self.code_name}={value!r}",
+                msg=f"The value must be {self.describe()}",
+            )
+
+        return value
+
+
+class BooleanValidator(Validator):
+    __slots__ = ()
+
+    def allows(self, value) -> bool:
+        return isinstance(value, bool)
+
+    def describe(self) -> str:
+        return "true or false"
+
+
+class EnumValidator(Validator):
+    """
+    :param code_name: function name
+    :param values: accepted values, in schema order
+    """
+
+    __slots__ = ("range", "_members")
+
+    def __init__(self, code_name: str, values):
+        super().__init__(code_name)
+        self.range = tuple(values)
+        self._members = frozenset(self.range)
+
+    def allows(self, value) -> bool:
+        try:
+            return value in self._members
+        except TypeError:
+            return False
+
+    def describe(self) -> str:
+        return "one of " + "; ".join(str(item) for item in self.range)
+
+
+class IntegerValidator(Validator):
+    """
+    :param code_name: function name
+    :param min: smallest device value
+    :param max: largest device value
+    :param step: distance between accepted values, counted from min
+    :param scale: the value is value / 10 ** scale in the unit of the function
+    """
+
+    __slots__ = ("min", "max", "step", "scale")
+
+    def __init__(
+        self, code_name: str, min: int, max: int, step: int = 1, scale: int = 0
+    ):
+        super().__init__(code_name)
+        self.min = min
+        self.max = max
+        self.step = step or 1
+        self.scale = scale
+
+    def allows(self, value) -> bool:
+        return (
+            isinstance(value, int)
+            and not isinstance(value, bool)
+            and self.min <= value <= self.max
+            and (value - self.min) % self.step == 0
+        )
+
+    def describe(self) -> str:
+        if self.step == 1:
+            return f"in range {self.min}-{self.max}"
+
+        return f"in range {self.min}-{self.max}, step {self.step}"
+
+    def percent_range(self) -> tuple:
+        """
+        :return: (smallest, largest) percentage accepted by from_percent()
+        """
+        return -(-self.min * 100 // self.max) if self.max else 0, 100
+
+    def from_percent(self, percent: float) -> int:
+        """
+        Convert a percentage of max to a device value, rounded to the step.
+        Example: 50 -> 500 for the range 10-1000
+
+        :param percent: percentage
+        :raise tuya_bulb_control.exceptions.ValueNotInRange: if the percentage is out of range
+        :return: device value
+        """
+        low, high = self.percent_range()
+        if not low <= percent <= high:
+            raise ValueNotInRange(
+                target=percent, msg=f"The value not in range {low}-{high}"
+            )
+
+        value = (
+            self.min
+            + round((percent * self.max / 100 - self.min) / self.step) * self.step
+        )
+
+        return min(max(value, self.min), self.max)
+
+
+class JsonValidator(Validator):
+    """
+    Validator of a json function with integer fields, e.g. colour_data_v2.
+
+    :param code_name: function name
+    :param fields: {key: tuya_bulb_control.schema.IntegerValidator}
+    """
+
+    __slots__ = ("fields",)
+
+    def __init__(self, code_name: str, fields: dict):
+        super().__init__(code_name)
+        self.fields = fields
+
+    def allows(self, value) -> bool:
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                return False
+
+        return (
+            isinstance(value, dict)
+            and value.keys() == self.fields.keys()
+            and all(self.fields[key].allows(item) for key, item in value.items())
+        )
+
+    def describe(self) -> str:
+        return (
+            "{"
+            + ", ".join(
+                f"{key}: {item.describe()}" for key, item in self.fields.items()
+            )
+            + "}"
+        )
+
+
+def _integer(code_name: str, values: dict) -> IntegerValidator:
+    return IntegerValidator(
+        code_name,
+        min=int(values["min"]),
+        max=int(values["max"]),
+        step=int(values.get("step", 1)),
+        scale=int(values.get("scale", 0)),
+    )
+
+
+def compile_function(function: dict) -> Validator:
+    """
+    Build the validator of a function from its schema.
+
+    :param function: item of tuya_bulb_control.Bulb.functions()
+    :return: validator, accepting any value for unknown types
+    """
+    code_name = function.get("code")
+    values = function.get("values") or {}
+
+    try:
+        if isinstance(values, str):
+            values = json.loads(values)
+
+        kind = function.get("type")
+        if kind == "Boolean":
+            return BooleanValidator(code_name)
+        if kind == "Enum":
+            return EnumValidator(code_name, values["range"])
+        if kind == "Integer":
+            return _integer(code_name, values)
+        if kind == "Json" and values:
+            return JsonValidator(
+                code_name,
+                {
+                    key: _integer(f"{code_name}.{key}", item)
+                    for key, item in values.items()
+                },
+            )
+    except (ValueError, KeyError, TypeError, AttributeError):
+        # Malformed schema, let the device decide
+        pass
+
+    return Validator(code_name)
+
+
+def fingerprint(functions: list) -> str:
+    """
+    Identity of a functions schema, equal for devices of the same product.
+
+    :param functions: tuya_bulb_control.Bulb.functions() list
+    :return: hexdigest string
+    """
+    text = json.dumps(functions, sort_keys=True, separators=(",", ":"))
+
+    return sha1(text.encode("utf-8")).hexdigest()
+
+
+class Schema:
+    """
+    Validators of every function of a device, compiled once.
+
+    :param functions: tuya_bulb_control.Bulb.functions() list
+    :param fingerprint: fingerprint() of the functions, if already known
+    """
+
+    __slots__ = ("validators", "fingerprint")
+
+    def __init__(self, functions: list, fingerprint: str = None):
+        self.validators = {
+            item.get("code"): compile_function(item) for item in functions
+        }
+        self.fingerprint = fingerprint
+
+    def __contains__(self, code_name: str) -> bool:
+        return code_name in self.validators
+
+    def get(self, code_name: str) -> Validator:
+        """
+        :param code_name: function name
+        :raise tuya_bulb_control.exceptions.FunctionNotSupported: if function not supported
+        :return: validator
+        """
+        try:
+            return self.validators[code_name]
+        except KeyError:
+            raise FunctionNotSupported(target=code_name)
+
+    def validate(self, code_name: str, value):
+        """
+        :param code_name: function name
+        :param value: device value
+        :raise tuya_bulb_control.exceptions.FunctionNotSupported: if function not supported
+        :raise tuya_bulb_control.exceptions.ValueNotInRange: if the value is not accepted
+        :return: value
+        """
+        return self.get(code_name).check(value)
+
+
+# Usual ranges of the integer codes, used when the schema is not known
+DEFAULTS = {
+    "bright_value": IntegerValidator("bright_value", min=25, max=255),
+    "temp_value": IntegerValidator("temp_value", min=25, max=255),
+    "countdown_1": IntegerValidator("countdown_1", min=0, max=86400),
+    "bright_value_v2": IntegerValidator("bright_value_v2", min=10, max=1000),
+    "temp_value_v2": IntegerValidator("temp_value_v2", min=0, max=1000),
+}
+
+
+def check_value(code_name: str, value, schema: Schema = None):
+    """
+    Check a value against the schema of a code, or against its usual range
+    if the schema does not describe the code.
+
+    :param code_name: function name
+    :param value: device value
+    :param schema: device schema. Default: the usual range of the code
+    :raise tuya_bulb_control.exceptions.ValueNotInRange: if the value is not accepted
+    :return: value
+    """
+    validator = None if schema is None else schema.validators.get(code_name)
+    if validator is None:
+        validator = DEFAULTS.get(code_name)
+
+    return value if validator is None else validator.check(value)
+
+
+def _integer_validator(code_name: str, schema: Schema = None) -> IntegerValidator:
+    """
+    :param code_name: function name of an integer code
+    :param schema: device schema. Default: the usual range of the code
+    :return: validator from the schema, or of the usual range if the schema
+        does not describe the code
+    """
+    validator = None if schema is None else schema.validators.get(code_name)
+    if not isinstance(validator, IntegerValidator):
+        validator = DEFAULTS[code_name]
+
+    return validator
+
+
+def percent_value(code_name: str, percent: float, schema: Schema = None) -> int:
+    """
+    Convert a percentage to the device value of a code, by the schema range.
+
+    :param code_name: function name. Example: bright_value_v2
+    :param percent: percentage of the max value
+    :param schema: device schema. Default: the usual range of the code
+    :raise tuya_bulb_control.exceptions.ValueNotInRange: if the percentage is out of range
+    :return: device value
+    """
+    return _integer_validator(code_name, schema).from_percent(percent)
+
+
+class SchemaCache:
+    """
+    Compiled schemas, shared by every device of a product.
+
+    A schema is compiled once per distinct functions list, found by its
+    fingerprint, so validating a value costs a dict lookup. With a registry,
+    or products given to assign(), schemas are also kept by product id and a
+    device of a known product is validated without requesting its functions.
+
+    :param registry: tuya_bulb_control.DeviceRegistry with the product ids of devices
+    """
+
+    def __init__(self, registry=None):
+        self._registry = registry
+        # {fingerprint: Schema}
+        self._schemas = {}
+        # {product_id: Schema}
+        self._products = {}
+        # {device_id: product_id}
+        self._device_products = {}
+        # {device_id: (functions, Schema)}, skips the fingerprint of known lists
+        self._devices = {}
+        self._lock = threading.Lock()
+
+        self.compiled = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._schemas)
+
+    def assign(self, products: dict):
+        """
+        Set the product ids of devices.
+
+        :param products: {device_id: product_id}
+        """
+        with self._lock:
+            self._device_products.update(products)
+
+    def product(self, device_id: str):
+        """
+        :param device_id: device id
+        :return: product id, or None if unknown
+        """
+        with self._lock:
+            product_id = self._device_products.get(device_id)
+
+        if product_id is None and self._registry is not None:
+            if device_id in self._registry:
+                product_id = self._registry.get(device_id).product_id
+
+        return product_id
+
+    def compile(self, functions: list, device_id: str = None) -> Schema:
+        """
+        Get the compiled schema of a functions list.
+
+        :param functions: tuya_bulb_control.Bulb.functions() list
+        :param device_id: device the functions belong to
+        :return: schema
+        """
+        with self._lock:
+            entry = self._devices.get(device_id)
+        if entry is not None and entry[0] is functions:
+            return entry[1]
+
+        key = fingerprint(functions)
+        with self._lock:
+            schema = self._schemas.get(key)
+
+        if schema is None:
+            schema = Schema(functions, key)
+            with self._lock:
+                schema = self._schemas.setdefault(key, schema)
+                self.compiled += 1
+
+        if device_id is not None:
+            product_id = self.product(device_id)
+            with self._lock:
+                self._devices[device_id] = (functions, schema)
+                if product_id is not None:
+                    self._products[product_id] = schema
+
+        return schema
+
+    def get(self, device_id: str):
+        """
+        Get the schema of a device from its product, without any request.
+
+        :param device_id: device id
+        :return: schema, or None if the product has none yet
+        """
+        with self._lock:
+            entry = self._devices.get(device_id)
+        if entry is not None:
+            return entry[1]
+
+        product_id = self.product(device_id)
+        if product_id is None:
+            return None
+
+        with self._lock:
+            return self._products.get(product_id)
+
+    def lookup(self, device_id: str, functions_cache):
+        """
+        Get the schema of a device from its cached functions, or else from its
+        product, without any request.
+
+        :param device_id: device id
+        :param functions_cache: tuya_bulb_control.cache.FunctionsCache of the client
+        :return: schema, or None if not known
+        """
+        functions = functions_cache.get(device_id)
+        if functions is not None:
+            return self.compile(functions, device_id)
+
+        return self.get(device_id)
+
+    def invalidate(self, device_id: str = None):
+        """
+        Drop compiled schemas, e.g. after a firmware update.
+
+        :param device_id: drop only the schema of this device and its product.
+            Default: drop everything
+        """
+        product_id = None if device_id is None else self.product(device_id)
+
+        with self._lock:
+            if device_id is None:
+                self._schemas.clear()
+                self._products.clear()
+                self._devices.clear()
+                return
+
+            self._devices.pop(device_id, None)
+            if product_id is not None:
+                self._products.pop(product_id, None)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+from time import time
+
+# Codes restored by default, in the order they are sent. The switch goes
+# last, so a bulb that was off is not left on by the other values.
+RESTORE_CODES = (
+    "work_mode",
+    "bright_value",
+    "bright_value_v2",
+    "temp_value",
+    "temp_value_v2",
+    "colour_data",
+    "colour_data_v2",
+    "scene_data",
+    "scene_data_v2",
+    "switch_led",
+)
+
+FORMAT_VERSION = 1
+
+
+class Snapshot:
+    """
+    Captured state of many devices.
+
+    Stored compactly: a table of codes, a table of distinct states as value
+    lists in code order, and the state position of every device. Bulbs in
+    the same state, the usual case in a building, share one entry.
+
+    :param states: {device_id: {code: value}}
+    :param taken_at: unix time of the capture. Default: now
+    """
+
+    __slots__ = ("codes", "states", "devices", "taken_at")
+
+    def __init__(self, states: dict = None, taken_at: float = None):
+        self.codes = []
+        self.states = []
+        self.devices = {}
+        self.taken_at = time() if taken_at is None else taken_at
+
+        code_positions = {}
+        state_positions = {}
+
+        for device_id, values in (states or {}).items():
+            for code_name in values:
+                if code_name not in code_positions:
+                    code_positions[code_name] = len(self.codes)
+                    self.codes.append(code_name)
+
+            state = [None] * len(self.codes)
+            for code_name, value in values.items():
+                state[code_positions[code_name]] = value
+            # Codes added by later devices are missing, not None, so equal
+            # states captured before and after them match
+            while state and state[-1] is None:
+                state.pop()
+
+            # Values are json types, so their json text identifies the state
+            key = json.dumps(state, sort_keys=True)
+            if key not in state_positions:
+                state_positions[key] = len(self.states)
+                self.states.append(state)
+            self.devices[device_id] = state_positions[key]
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self.devices
+
+    def get(self, device_id: str) -> dict:
+        """
+        Get the captured state of a device.
+
+        :param device_id: device id
+        :raise KeyError: if the device is not in the snapshot
+        :return: {code: value} dict
+        """
+        state = self.states[self.devices[device_id]]
+
+        return {
+            code_name: value
+            for code_name, value in zip(self.codes, state)
+            if value is not None
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "version": FORMAT_VERSION,
+            "taken_at": self.taken_at,
+            "codes": self.codes,
+            "states": self.states,
+            "devices": self.devices,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{data.get('version')} -> Unknown snapshot version")
+
+        snapshot = cls(taken_at=data["taken_at"])
+        snapshot.codes = list(data["codes"])
+        snapshot.states = [list(item) for item in data["states"]]
+        snapshot.devices = dict(data["devices"])
+
+        return snapshot
+
+    def dumps(self) -> str:
+        """
+        :return: compact json text
+        """
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, text: str):
+        """
+        :param text: json text of dumps()
+        :return: snapshot
+        """
+        return cls.from_dict(json.loads(text))
+
+
+def restore_commands(values: dict, codes=RESTORE_CODES) -> list:
+    """
+    Get the commands that restore captured values.
+
+    :param values: {code: value} of a device
+    :param codes: codes to restore, in the order they are sent
+    :return: list of {"code": ..., "value": ...} dicts
+    """
+    commands = []
+
+    for code_name in codes:
+        if code_name not in values:
+            continue
+        value = values[code_name]
+
+        # The status endpoint reports json values as strings
+        if isinstance(value, str) and value.startswith("{"):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+
+        commands.append({"code": code_name, "value": value})
+
+    return commands
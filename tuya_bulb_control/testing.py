@@ -0,0 +1,868 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import hmac
+import json
+import socket
+import struct
+import threading
+from base64 import b64encode
+from collections import Counter, OrderedDict, deque
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from itertools import count
+from socketserver import ThreadingMixIn
+from time import monotonic, sleep, time
+from ._crypto import aes_encrypt, require_aes
+from ._signing import generate_signature, generate_string_to_sign
+from .events import EventSource, decode_message
+from .exceptions import MessageError
+from .local import (
+    CONTROL,
+    CONTROL_NEW,
+    DP_QUERY,
+    DP_QUERY_NEW,
+    HEART_BEAT,
+    SESS_KEY_NEG_FINISH,
+    SESS_KEY_NEG_RES,
+    SESS_KEY_NEG_START,
+    STATUS,
+    VERSIONS,
+    decode_payload,
+    encode_payload,
+    pack_message,
+    read_message,
+)
+from .ratelimit import THROTTLE_CODE
+
+
+class FakeLocalDevice:
+    """
+    Local stand-in for a device speaking the Tuya local protocol.
+    For tests of tuya_bulb_control.local.LocalDevice without hardware.
+
+    Example:
+        with FakeLocalDevice(local_key="0123456789abcdef", version="3.4") as fake:
+            device = LocalDevice("fake", fake.host, fake.local_key, "3.4", fake.port)
+
+    :param local_key: 16 characters local key
+    :param version: protocol version. 3.1; 3.3; 3.4
+    :param dps: initial data points. Example: {"20": True}
+    :param host: address to listen on
+    :param port: port to listen on. Default: any free port
+    """
+
+    def __init__(
+        self,
+        local_key: str = "0123456789abcdef",
+        version: str = "3.3",
+        dps: dict = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        require_aes("FakeLocalDevice")
+        if version not in VERSIONS:
+            raise ValueError(f"{version} -> The version must be one of {VERSIONS}")
+
+        self.local_key = local_key
+        self.version = version
+        self.dps = {"20": False, "21": "white", "22": 1000} if dps is None else dps
+        self.received = []
+        self.connections = 0
+
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self._server.listen()
+        self.host, self.port = self._server.getsockname()[:2]
+        self._connections = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._fault = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Accept connections in a background thread.
+        """
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop accepting connections and drop the open ones, like a device
+        going off the network.
+        """
+        for item in [self._server] + list(self._connections):
+            try:
+                # Wakes up the threads blocked on the socket, close() alone does not
+                item.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._server.close()
+
+    def corrupt_next(self, fault: str):
+        """
+        Corrupt the next reply to a query or control command.
+
+        :param fault: checksum - invalid checksum or HMAC; payload - invalid json
+        """
+        with self._lock:
+            self._fault = fault
+
+    def _take_fault(self):
+        with self._lock:
+            fault, self._fault = self._fault, None
+
+        return fault
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            self._connections.add(connection)
+            threading.Thread(
+                target=self._serve, args=(connection,), daemon=True
+            ).start()
+
+    def _serve(self, connection: socket.socket):
+        key = self.local_key.encode("latin-1")
+        session_key = None
+        local_nonce = None
+        remote_nonce = os.urandom(16)
+
+        def send(seqno, cmd, data, retcode=0, fault=None):
+            current = session_key or key
+            if fault == "payload":
+                data = b"{not json"
+            payload = encode_payload(self.version, current, cmd, data) if data else b""
+            message = pack_message(
+                seqno,
+                cmd,
+                struct.pack(">I", retcode) + payload,
+                hmac_key=current if self.version == "3.4" else None,
+            )
+            if fault == "checksum":
+                # Flip a bit of the last checksum byte, before the suffix
+                message = message[:-5] + bytes([message[-5] ^ 1]) + message[-4:]
+            try:
+                connection.sendall(message)
+            except OSError:
+                # Dropped by stop(), the next read ends the connection
+                pass
+
+        with connection:
+            while True:
+                current = session_key or key
+                try:
+                    message = read_message(
+                        connection,
+                        hmac_key=current if self.version == "3.4" else None,
+                        retcode=False,
+                    )
+                except (OSError, ValueError):
+                    self._connections.discard(connection)
+                    return
+
+                data = decode_payload(self.version, current, message.payload)
+                self.received.append((message.cmd, data))
+
+                if message.cmd == SESS_KEY_NEG_START:
+                    local_nonce = data[:16]
+                    send(
+                        message.seqno,
+                        SESS_KEY_NEG_RES,
+                        remote_nonce + hmac.new(key, local_nonce, sha256).digest(),
+                    )
+                elif message.cmd == SESS_KEY_NEG_FINISH:
+                    nonce = bytes(a ^ b for a, b in zip(local_nonce, remote_nonce))
+                    session_key = aes_encrypt(key, nonce, padding=False)[:16]
+                elif message.cmd in (DP_QUERY, DP_QUERY_NEW):
+                    with self._lock:
+                        dps = dict(self.dps)
+                    body = {"dps": dps}
+                    if self.version == "3.4":
+                        body = {"protocol": 4, "data": {"dps": dps}}
+                    send(
+                        message.seqno,
+                        message.cmd,
+                        json.dumps(body).encode(),
+                        fault=self._take_fault(),
+                    )
+                elif message.cmd in (CONTROL, CONTROL_NEW):
+                    body = json.loads(data)
+                    dps = body.get("dps") or body["data"]["dps"]
+                    with self._lock:
+                        self.dps.update(dps)
+                    send(message.seqno, message.cmd, b"", fault=self._take_fault())
+                    send(0, STATUS, json.dumps({"dps": dps}).encode())
+                elif message.cmd == HEART_BEAT:
+                    send(message.seqno, HEART_BEAT, b"")
+
+
+class FakeBroker:
+    """
+    In-process stand-in for the Tuya message service.
+    Messages are encrypted like the service does and decrypted by the source,
+    messages not confirmed are delivered again after a reconnect.
+
+    Example:
+        broker = FakeBroker()
+        with Subscriber(broker.source(), state_cache=cache) as subscriber:
+            broker.publish("device_id", {"switch_led": True})
+
+    :param secret_key: project secret key
+    """
+
+    def __init__(self, secret_key: str = "0123456789abcdef0123456789abcdef"):
+        require_aes("FakeBroker")
+
+        self.secret_key = secret_key
+        self.acked = []
+        self.connections = 0
+
+        self._pending = deque()
+        self._unacked = OrderedDict()
+        self._next_id = 0
+        self._connected = False
+        self._condition = threading.Condition()
+
+    def publish(self, device_id: str, status: dict) -> int:
+        """
+        Publish a status change.
+
+        :param device_id: device id
+        :param status: {code: value} dict
+        :return: message id
+        """
+        t = int(time() * 1000)
+        return self._publish(
+            {
+                "devId": device_id,
+                "status": [
+                    {"code": code_name, "value": value, "t": t}
+                    for code_name, value in status.items()
+                ],
+            }
+        )
+
+    def publish_online(self, device_id: str, online: bool = True) -> int:
+        """
+        Publish a device going online or offline.
+
+        :param device_id: device id
+        :param online: state
+        :return: message id
+        """
+        return self._publish(
+            {
+                "devId": device_id,
+                "bizCode": "online" if online else "offline",
+                "ts": int(time() * 1000),
+            }
+        )
+
+    def publish_undecodable(self) -> int:
+        """
+        Publish a message that can't be decrypted, e.g. of another project.
+
+        :return: message id
+        """
+        return self._enqueue(os.urandom(32))
+
+    def disconnect(self):
+        """
+        Drop the connection of the source.
+        """
+        with self._condition:
+            self._connected = False
+            self._condition.notify_all()
+
+    def source(self) -> EventSource:
+        """
+        :return: tuya_bulb_control.events.EventSource connected to this broker
+        """
+        return _FakeBrokerSource(self)
+
+    def _publish(self, data: dict) -> int:
+        key = self.secret_key[8:24].encode("utf-8")
+
+        return self._enqueue(aes_encrypt(key, json.dumps(data).encode()))
+
+    def _enqueue(self, encrypted: bytes) -> int:
+        payload = {
+            "data": b64encode(encrypted).decode(),
+            "protocol": 4,
+            "pv": "2.0",
+            "t": int(time() * 1000),
+        }
+
+        with self._condition:
+            self._next_id += 1
+            self._pending.append(
+                {
+                    "messageId": self._next_id,
+                    "payload": b64encode(json.dumps(payload).encode()).decode(),
+                    "properties": {},
+                }
+            )
+            self._condition.notify_all()
+
+        return self._next_id
+
+
+class _FakeBrokerSource(EventSource):
+    def __init__(self, broker: FakeBroker):
+        self._broker = broker
+
+    def connect(self):
+        broker = self._broker
+        with broker._condition:
+            # Not confirmed messages go first, like a redelivery
+            broker._pending.extendleft(reversed(broker._unacked.values()))
+            broker._unacked.clear()
+            broker._connected = True
+            broker.connections += 1
+
+    def receive(self, timeout: float):
+        broker = self._broker
+        deadline = monotonic() + timeout
+
+        with broker._condition:
+            while broker._connected and not broker._pending:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return None
+                broker._condition.wait(remaining)
+
+            if not broker._connected:
+                raise ConnectionError("Disconnected")
+
+            message = broker._pending.popleft()
+            broker._unacked[message["messageId"]] = message
+
+        try:
+            data = decode_message(message, broker.secret_key)
+        except Exception as exc:
+            raise MessageError(target=message["messageId"], msg=str(exc))
+
+        return message["messageId"], data
+
+    def ack(self, message_id):
+        broker = self._broker
+        with broker._condition:
+            if broker._unacked.pop(message_id, None) is not None:
+                broker.acked.append(message_id)
+
+    def close(self):
+        self._broker.disconnect()
+
+
+# Functions of the devices of MockTuyaServer, a v2 colour bulb
+MOCK_FUNCTIONS = [
+    {"code": "switch_led", "type": "Boolean", "values": "{}"},
+    {
+        "code": "work_mode",
+        "type": "Enum",
+        "values": json.dumps({"range": ["white", "colour", "scene", "music"]}),
+    },
+    {
+        "code": "bright_value_v2",
+        "type": "Integer",
+        "values": json.dumps({"min": 10, "max": 1000, "scale": 0, "step": 1}),
+    },
+    {
+        "code": "temp_value_v2",
+        "type": "Integer",
+        "values": json.dumps({"min": 0, "max": 1000, "scale": 0, "step": 1}),
+    },
+    {
+        "code": "colour_data_v2",
+        "type": "Json",
+        "values": json.dumps(
+            {
+                "h": {"min": 0, "max": 360, "scale": 0, "step": 1},
+                "s": {"min": 0, "max": 1000, "scale": 0, "step": 1},
+                "v": {"min": 0, "max": 1000, "scale": 0, "step": 1},
+            }
+        ),
+    },
+    {
+        "code": "countdown_1",
+        "type": "Integer",
+        "values": json.dumps({"min": 0, "max": 86400, "scale": 0, "step": 1}),
+    },
+]
+
+# Seconds between checks for stop() in the server thread
+_POLL_INTERVAL = 0.05
+
+# Seconds the request timestamp may differ from the server clock
+_MAX_CLOCK_SKEW = 900
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real API
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, don't wait for delayed acks
+    disable_nagle_algorithm = True
+
+    def _handle(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+        status, response = self.server.mock._handle(
+            method, self.path, self.headers, body
+        )
+
+        data = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockTuyaServer:
+    """
+    Local stand-in for the Tuya OpenAPI, for tests and benchmarks.
+
+    Serves the token, device status, batch status, device details, functions,
+    commands and device group endpoints over HTTP. Signatures are checked like the real
+    API does. Latency, token expiry (code 1010), throttling and offline
+    devices (code 2001) can be injected.
+
+    Example:
+        with MockTuyaServer(devices={"device_id": {"switch_led": False}}) as server:
+            bulb = Bulb(
+                server.client_id, server.secret_key, "eu", "device_id",
+                base_url=server.base_url,
+            )
+
+    :param client_id: accepted client id
+    :param secret_key: accepted secret key
+    :param devices: {device_id: {code: value}}. Default: no devices
+    :param functions: functions of every device. Default: MOCK_FUNCTIONS
+    :param products: {device_id: product_id}. Default: mock_product for every device
+    :param latency: seconds added to every response, or function() returning them
+    :param token_ttl: seconds access tokens are valid
+    :param rate_limit: max requests per second, more are throttled. None == no limit
+    :param host: address to listen on
+    :param port: port to listen on. Default: any free port
+    """
+
+    def __init__(
+        self,
+        client_id: str = "mock_client_id",
+        secret_key: str = "mock_secret_key",
+        devices: dict = None,
+        functions: list = None,
+        products: dict = None,
+        latency=0.0,
+        token_ttl: int = 7200,
+        rate_limit: float = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.client_id = client_id
+        self.secret_key = secret_key
+        self.devices = {} if devices is None else devices
+        self.functions = MOCK_FUNCTIONS if functions is None else functions
+        self.products = {} if products is None else products
+        # {group_id: {"name": ..., "product_id": ..., "device_ids": [...]}}
+        self.groups = {}
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.rate_limit = rate_limit
+        self.offline = set()
+
+        # Requests by endpoint. Example: {"POST /devices/{device_id}/commands": 1}
+        self.requests = Counter()
+        self.throttled = 0
+        self.rejected = 0
+
+        # {access_token: expire_at}, {refresh_token: access_token}
+        self._tokens = {}
+        self._refresh_tokens = {}
+        self._allowance = None
+        self._allowance_at = monotonic()
+        self._group_ids = count(1)
+        self._lock = threading.Lock()
+
+        self._server = _ThreadingHTTPServer((host, port), _MockHandler)
+        self._server.mock = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        """
+        Address for tuya_bulb_control.Bulb(base_url=...).
+        """
+        return f"http://{self.host}:{self.port}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Serve requests in a background thread.
+        """
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(_POLL_INTERVAL,), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop serving requests.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def expire_tokens(self):
+        """
+        Invalidate every access token, the next requests get code 1010.
+        Refresh tokens stay valid.
+        """
+        with self._lock:
+            self._tokens.clear()
+
+    def reset_stats(self):
+        """
+        Reset the request counters.
+        """
+        with self._lock:
+            self.requests.clear()
+            self.throttled = 0
+            self.rejected = 0
+
+    @property
+    def total_requests(self) -> int:
+        with self._lock:
+            return sum(self.requests.values())
+
+    @staticmethod
+    def _error(code: int, msg: str) -> dict:
+        return {"success": False, "code": code, "msg": msg, "t": int(time() * 1000)}
+
+    @staticmethod
+    def _result(result) -> dict:
+        return {"success": True, "result": result, "t": int(time() * 1000)}
+
+    def _check_sign(self, method: str, path: str, headers, body: str, token: str):
+        t = headers.get("t") or ""
+        if not t.isdigit() or abs(time() - int(t) / 1000) > _MAX_CLOCK_SKEW:
+            return self._error(1013, "request time is invalid")
+
+        if headers.get("client_id") != self.client_id:
+            return self._error(1005, "clientId is invalid")
+
+        string_to_sign = generate_string_to_sign(method, body, {}, path)
+        expected = generate_signature(
+            self.client_id + token + t + string_to_sign, self.secret_key
+        )
+        if not hmac.compare_digest(expected, headers.get("sign") or ""):
+            return self._error(1004, "sign invalid")
+
+        return None
+
+    def _throttled(self) -> bool:
+        if self.rate_limit is None:
+            return False
+
+        with self._lock:
+            now = monotonic()
+            if self._allowance is None:
+                self._allowance = self.rate_limit
+            self._allowance = min(
+                self.rate_limit,
+                self._allowance + (now - self._allowance_at) * self.rate_limit,
+            )
+            self._allowance_at = now
+
+            if self._allowance < 1:
+                return True
+            self._allowance -= 1
+
+        return False
+
+    def _new_token(self) -> dict:
+        access_token = os.urandom(16).hex()
+        refresh_token = os.urandom(16).hex()
+
+        with self._lock:
+            self._tokens[access_token] = time() + self.token_ttl
+            self._refresh_tokens[refresh_token] = access_token
+
+        return self._result(
+            {
+                "access_token": access_token,
+                "refresh_token": refresh_token,
+                "expire_time": self.token_ttl,
+                "uid": "mock_uid",
+            }
+        )
+
+    def _handle(self, method: str, path: str, headers, body: str) -> tuple:
+        """
+        :return: (HTTP status, response dict)
+        """
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            sleep(latency)
+
+        route, params = self._route(method, path)
+        with self._lock:
+            self.requests[f"{method} {route}"] += 1
+
+        if self._throttled():
+            with self._lock:
+                self.throttled += 1
+            return 200, self._error(THROTTLE_CODE, "request frequency is too high")
+
+        response = self._dispatch(method, path, route, params, headers, body)
+        if not response["success"] and response["code"] in (1004, 1005, 1010, 1013):
+            with self._lock:
+                self.rejected += 1
+
+        return (404 if response.get("code") == 1108 else 200), response
+
+    @staticmethod
+    def _route(method: str, path: str) -> tuple:
+        """
+        :return: (route template, {name: value})
+        """
+        parts = path.split("?", 1)[0].split("/")[2:]
+
+        if parts[:1] == ["token"]:
+            if len(parts) == 2:
+                return "/token/{refresh_token}", {"refresh_token": parts[1]}
+            return "/token", {}
+
+        if parts == ["devices", "status"]:
+            query = dict(
+                item.split("=", 1) for item in path.split("?", 1)[-1].split("&") if item
+            )
+            return "/devices/status", {"device_ids": query.get("device_ids", "")}
+
+        if parts[:1] == ["devices"] and len(parts) == 2:
+            return "/devices/{device_id}", {"device_id": parts[1]}
+
+        if parts[:1] == ["devices"] and len(parts) == 3:
+            return f"/devices/{{device_id}}/{parts[2]}", {"device_id": parts[1]}
+
+        if parts[:1] == ["device-groups"] and len(parts) > 1:
+            route = "/".join(["/device-groups/{group_id}"] + parts[2:])
+            return route, {"group_id": parts[1]}
+
+        return "/" + "/".join(parts), {}
+
+    def _dispatch(self, method, path, route, params, headers, body) -> dict:
+        if route == "/token":
+            error = self._check_sign(method, path, headers, body, "")
+            if error is None and headers.get("secret") not in (None, self.secret_key):
+                error = self._error(1005, "secret is invalid")
+            return error or self._new_token()
+
+        if route == "/token/{refresh_token}":
+            error = self._check_sign(method, path, headers, body, "")
+            if error is not None:
+                return error
+            with self._lock:
+                access_token = self._refresh_tokens.pop(params["refresh_token"], None)
+                self._tokens.pop(access_token, None)
+            if access_token is None:
+                return self._error(1012, "refresh token is invalid")
+            return self._new_token()
+
+        access_token = headers.get("access_token") or ""
+        with self._lock:
+            expire_at = self._tokens.get(access_token)
+        if expire_at is None or expire_at < time():
+            return self._error(1010, "token invalid")
+
+        error = self._check_sign(method, path, headers, body, access_token)
+        if error is not None:
+            return error
+
+        device_id = params.get("device_id")
+        if device_id is not None and device_id not in self.devices:
+            return self._error(1106, "permission deny")
+
+        if method == "GET" and route == "/devices/status":
+            device_ids = [item for item in params["device_ids"].split(",") if item]
+            if len(device_ids) > 20:
+                return self._error(1109, "param is illegal")
+            return self._result(
+                [
+                    {"id": item, "status": self._status(item)}
+                    for item in device_ids
+                    if item in self.devices
+                ]
+            )
+
+        if method == "GET" and route == "/devices/{device_id}":
+            return self._result(
+                {
+                    "id": device_id,
+                    "name": device_id,
+                    "category": "dj",
+                    "product_id": self.products.get(device_id, "mock_product"),
+                    "online": device_id not in self.offline,
+                }
+            )
+
+        if method == "GET" and route == "/devices/{device_id}/status":
+            return self._result(self._status(device_id))
+
+        if method == "GET" and route == "/devices/{device_id}/functions":
+            return self._result({"category": "dj", "functions": self.functions})
+
+        if method == "POST" and route == "/devices/{device_id}/commands":
+            return self._commands(device_id, body)
+
+        if route.startswith("/device-groups"):
+            return self._device_groups(method, route, params, body)
+
+        return self._error(1108, "uri path invalid")
+
+    def _device_groups(self, method, route, params, body) -> dict:
+        try:
+            body = json.loads(body) if body else {}
+            device_ids = body.get("device_ids")
+            if isinstance(device_ids, str):
+                device_ids = [item for item in device_ids.split(",") if item]
+        except (ValueError, AttributeError):
+            return self._error(1109, "param is illegal")
+
+        if device_ids is not None and any(
+            item not in self.devices for item in device_ids
+        ):
+            return self._error(1106, "permission deny")
+
+        if method == "POST" and route == "/device-groups":
+            if not device_ids or any(
+                self.products.get(item, "mock_product") != body.get("product_id")
+                for item in device_ids
+            ):
+                return self._error(1109, "param is illegal")
+            with self._lock:
+                group_id = str(next(self._group_ids))
+                self.groups[group_id] = {
+                    "name": body.get("name"),
+                    "product_id": body["product_id"],
+                    "device_ids": device_ids,
+                }
+            return self._result({"id": group_id})
+
+        with self._lock:
+            group = self.groups.get(params.get("group_id"))
+        if group is None:
+            return self._error(1106, "permission deny")
+
+        if method == "GET" and route == "/device-groups/{group_id}":
+            return self._result(dict(group, id=params["group_id"]))
+
+        if method == "PUT" and route == "/device-groups/{group_id}":
+            with self._lock:
+                if device_ids is not None:
+                    group["device_ids"] = device_ids
+                if "name" in body:
+                    group["name"] = body["name"]
+            return self._result(True)
+
+        if method == "DELETE" and route == "/device-groups/{group_id}":
+            with self._lock:
+                self.groups.pop(params["group_id"], None)
+            return self._result(True)
+
+        if method == "POST" and route == "/device-groups/{group_id}/issued":
+            commands = body.get("functions")
+            error = self._check_commands(commands)
+            if error is not None:
+                return error
+            for device_id in group["device_ids"]:
+                # Offline members miss the command, like on the real API
+                if device_id not in self.offline:
+                    self._set_values(device_id, commands)
+            return self._result(True)
+
+        return self._error(1108, "uri path invalid")
+
+    def _status(self, device_id: str) -> list:
+        with self._lock:
+            values = dict(self.devices[device_id])
+
+        return [
+            {"code": code_name, "value": value} for code_name, value in values.items()
+        ]
+
+    def _commands(self, device_id: str, body: str) -> dict:
+        if device_id in self.offline:
+            return self._error(2001, "device is offline")
+
+        try:
+            commands = json.loads(body)["commands"]
+        except (ValueError, KeyError, TypeError):
+            return self._error(1109, "param is illegal")
+
+        error = self._check_commands(commands)
+        if error is not None:
+            return error
+
+        self._set_values(device_id, commands)
+
+        return self._result(True)
+
+    def _check_commands(self, commands) -> dict:
+        """
+        :return: error response, or None if every command is supported
+        """
+        codes = {item["code"] for item in self.functions}
+        if not commands or any(item.get("code") not in codes for item in commands):
+            return self._error(2008, "command or value not support")
+
+        return None
+
+    def _set_values(self, device_id: str, commands: list):
+        with self._lock:
+            values = self.devices[device_id]
+            for item in commands:
+                value = item["value"]
+                # The status endpoint reports json values as strings
+                values[item["code"]] = (
+                    json.dumps(value) if isinstance(value, dict) else value
+                )
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import threading
+from time import time
+from hashlib import sha256
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+# Renew the access token this many seconds before it expires
+DEFAULT_REFRESH_MARGIN = 300
+
+
+class Token:
+    """
+    Access token with its expiry time.
+
+    :param access_token: access token
+    :param refresh_token: refresh token
+    :param expire_at: unix time when the access token expires
+    :param uid: user id the token belongs to
+    """
+
+    __slots__ = ("access_token", "refresh_token", "expire_at", "uid")
+
+    def __init__(
+        self,
+        access_token: str,
+        refresh_token: str = None,
+        expire_at: float = None,
+        uid: str = None,
+    ):
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expire_at = expire_at
+        self.uid = uid
+
+    def __repr__(self):
+        return f"Token(expire_at={self.expire_at!r}, uid={self.uid!r})"
+
+    @classmethod
+    def from_result(cls, result: dict, received_at: float = None):
+        """
+        Create a token from the result of a token request.
+
+        :param result: response["result"] dict
+        :param received_at: unix time of the response. Default: now
+        :return: token
+        """
+        received_at = time() if received_at is None else received_at
+        expire_time = result.get("expire_time")
+
+        return cls(
+            access_token=result["access_token"],
+            refresh_token=result.get("refresh_token"),
+            expire_at=None if expire_time is None else received_at + expire_time,
+            uid=result.get("uid"),
+        )
+
+    def expires_in(self) -> float:
+        """
+        Seconds left until the access token expires.
+
+        :return: seconds, or infinity if the expiry time is unknown
+        """
+        if self.expire_at is None:
+            return float("inf")
+
+        return self.expire_at - time()
+
+    def to_dict(self) -> dict:
+        """
+        Serialisable form of the token.
+
+        :return: token dict
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """
+        Create a token from tuya_bulb_control.tokens.Token.to_dict()
+
+        :param data: token dict
+        :return: token
+        """
+        return cls(**data)
+
+
+class TokenStore:
+    """
+    Interface for token stores shared by many clients.
+
+    Tokens are keyed by (client_id, region_key, base_url), so clients of one
+    project talking to different API addresses do not share tokens.
+    lock(key) must return a context manager that is held while a token is
+    renewed, so only one renewal runs at a time for every user of the store.
+    """
+
+    def get(self, key: tuple):
+        """
+        Get the stored token.
+
+        :param key: (client_id, region_key, base_url)
+        :return: tuya_bulb_control.tokens.Token or None
+        """
+        raise NotImplementedError
+
+    def set(self, key: tuple, token: Token):
+        """
+        Store a token.
+
+        :param key: (client_id, region_key, base_url)
+        :param token: tuya_bulb_control.tokens.Token
+        """
+        raise NotImplementedError
+
+    def lock(self, key: tuple):
+        """
+        Lock held while the token of the key is renewed.
+
+        :param key: (client_id, region_key, base_url)
+        :return: context manager
+        """
+        raise NotImplementedError
+
+
+class MemoryTokenStore(TokenStore):
+    """
+    Token store shared by all clients of the process.
+    """
+
+    def __init__(self):
+        self._tokens = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        return self._tokens.get(key)
+
+    def set(self, key: tuple, token: Token):
+        self._tokens[key] = token
+
+    def lock(self, key: tuple):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+
+class FileTokenStore(MemoryTokenStore):
+    """
+    Token store shared by all processes of the host, e.g. gunicorn workers.
+    Every key is kept in its own file, renewals are serialised with flock().
+
+    :param path: directory for the token files
+    """
+
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise OSError("FileTokenStore requires fcntl, it is not available")
+
+        super().__init__()
+        self.path = path
+        os.makedirs(path, mode=0o700, exist_ok=True)
+
+    def _file(self, key: tuple) -> str:
+        name = sha256(":".join(key).encode()).hexdigest()
+        return os.path.join(self.path, name)
+
+    def get(self, key: tuple):
+        try:
+            with open(self._file(key) + ".json") as file:
+                return Token.from_dict(json.load(file))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def set(self, key: tuple, token: Token):
+        file_name = self._file(key) + ".json"
+        tmp = f"{file_name}.{os.getpid()}.tmp"
+
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as file:
+            json.dump(token.to_dict(), file)
+        os.replace(tmp, file_name)
+
+    @contextmanager
+    def lock(self, key: tuple):
+        with super().lock(key):
+            with open(self._file(key) + ".lock", "a") as file:
+                fcntl.flock(file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+
+
+_default_store = MemoryTokenStore()
+
+
+def default_token_store() -> MemoryTokenStore:
+    """
+    Get the process-wide in-memory token store used by default.
+
+    :return: token store
+    """
+    return _default_store
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = (3.05, 10)
+
+_shared_transports = {}
+_shared_lock = threading.Lock()
+
+
+class Transport:
+    """
+    Keep-alive HTTP transport for API requests.
+
+    Wraps a requests.Session with a connection pool, so consecutive requests
+    to the same host reuse warm TCP+TLS connections.
+    Any object with a compatible request() method can be passed to
+    tuya_bulb_control.Bulb(transport=...) instead.
+
+    :param pool_size: max number of kept-alive connections per host
+    :param timeout: seconds, or a (connect, read) tuple
+    :param session: use an existing requests.Session
+    """
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout=DEFAULT_TIMEOUT,
+        session: requests.Session = None,
+    ):
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+
+        self._session = session
+
+    def request(self, method: str, url: str, headers: dict, data: str = None):
+        """
+        Performs a request.
+
+        :param method: HTTP method. Example: GET; POST
+        :param url: full request url
+        :param headers: request headers
+        :param data: serialised request body
+        :return: response object with status_code and json()
+        """
+        return self._session.request(
+            method, url, headers=headers, data=data, timeout=self.timeout
+        )
+
+    def close(self):
+        """
+        Close all pooled connections.
+        """
+        self._session.close()
+
+
+def shared_transport(
+    region_key: str, pool_size: int = DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT
+) -> Transport:
+    """
+    Get the process-wide transport for a region.
+    Every call with the same arguments returns the same Transport,
+    so all Bulb instances of a region share one connection pool.
+
+    :param region_key: region key. Example: cn; us; eu; in
+    :param pool_size: max number of kept-alive connections
+    :param timeout: seconds, or a (connect, read) tuple
+    :return: shared transport
+    """
+    key = (region_key, pool_size, timeout)
+
+    with _shared_lock:
+        transport = _shared_transports.get(key)
+        if transport is None:
+            transport = Transport(pool_size=pool_size, timeout=timeout)
+            _shared_transports[key] = transport
+
+    return transport